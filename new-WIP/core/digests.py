@@ -0,0 +1,83 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+DIGESTS_FILE = "digests.json"
+SAVE_INTERVAL = 5.0   # seconds; put_many during a long digest run saves at most this often
+
+def chunk_key(text: str) -> str:
+    return hashlib.sha1(text.encode()).hexdigest()
+
+def format_digest(entry: Dict) -> str:
+    entities = ", ".join(entry.get("entities") or [])
+    return f"{entry['summary']} (Key: {entities})" if entities else entry["summary"]
+
+class DigestStore:
+    """
+    Short per-chunk lore digests (summary + key entities), keyed by a hash
+    of the chunk text so they survive index rebuilds and reordering. Stored
+    as one JSON file next to the vector index.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._digests: Dict[str, Dict] = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._digests)
+
+    def get(self, text: str) -> Optional[str]:
+        entry = self._digests.get(chunk_key(text))
+        return format_digest(entry) if entry else None
+
+    def missing(self, texts: Iterable[str]) -> List[str]:
+        return [t for t in texts if chunk_key(t) not in self._digests]
+
+    def put_many(self, entries: Dict[str, Dict]) -> None:
+        """
+        Add digests by chunk text; persisted at most every SAVE_INTERVAL.
+        """
+        with self._lock:
+            for text, entry in entries.items():
+                self._digests[chunk_key(text)] = entry
+            self._dirty = True
+            if time.monotonic() - self._saved_at >= SAVE_INTERVAL:
+                self._save()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            self._digests = json.loads(self.path.read_text())
+            logger.info("Loaded %d lore digests", len(self._digests))
+        except Exception as e:
+            logger.warning("Could not load lore digests %s: %s", self.path, e)
+
+    def _save(self) -> None:
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(self._digests))
+            os.replace(tmp, self.path)
+            self._dirty, self._saved_at = False, time.monotonic()
+        except Exception:
+            logger.exception("Failed to persist lore digests")
+
+digest_store = DigestStore(settings.vector_index_dir / DIGESTS_FILE)
@@ -1,31 +1,335 @@
+import json
 import logging
-from typing import List
+import socket
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
 
-from sentence_transformers import SentenceTransformer
+import numpy as np
+
+from .metrics import registry, timer
+from .settings import settings
 
 logger = logging.getLogger(__name__)
 
-_model = None
-for repo in ("intfloat/e5-small", "sentence-transformers/all-MiniLM-L6-v2"):
-    try:
-        _model = SentenceTransformer(repo, local_files_only=True)
-        logger.info("Loaded embedding model %s", repo)
-        break
-    except Exception:
-        logger.debug("Could not load %s", repo)
+EMBED_DIM = 384      # zero-vector width when no backend is available
+LOCAL_REPOS = ("intfloat/e5-small", "sentence-transformers/all-MiniLM-L6-v2")
+
+EMBED_SECONDS = registry.histogram("embed_seconds", "embed_texts latency per call")
+EMBED_TEXTS = registry.counter("embed_texts_total", "Texts embedded")
+EMBED_BATCH_SIZE = registry.histogram(
+    "embed_batch_size", "Texts per backend call after coalescing", (1, 2, 4, 8, 16, 32, 64, 128, 256),
+)
+
+# ——— Backends ——————————————————————————————————————————
+
+class EmbeddingBackend:
+    """
+    Turns texts into vectors. `name` identifies the model, so an index built
+    with one backend is never queried with another.
+    """
+    name: str = ""
+    dim: int = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        raise NotImplementedError
+
+class LocalBackend(EmbeddingBackend):
+    """
+    SentenceTransformer in this process. One model per process, shared by
+    every session; encode calls are serialized so concurrent sessions don't
+    oversubscribe torch's threads.
+    """
+
+    def __init__(self, model=None, name: str = "local"):
+        if model is None:
+            # imported here so processes on other backends never load torch
+            from sentence_transformers import SentenceTransformer
+            for repo in LOCAL_REPOS:
+                try:
+                    model = SentenceTransformer(repo, local_files_only=True)
+                    name = f"local:{repo}"
+                    logger.info("Loaded embedding model %s", repo)
+                    break
+                except Exception:
+                    logger.debug("Could not load %s", repo)
+            else:
+                raise RuntimeError("no local SentenceTransformer model found")
+        self.model = model
+        self.name = name
+        self.dim = model.get_sentence_embedding_dimension()
+        self._lock = threading.Lock()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        with self._lock:
+            return np.asarray(self.model.encode(texts, show_progress_bar=False, batch_size=64), dtype="float32")
+
+ONNX_MODEL, ONNX_INT8_MODEL, ONNX_META = "model.onnx", "model_int8.onnx", "meta.json"
+
+class OnnxBackend(EmbeddingBackend):
+    """
+    EMBEDDING_BACKEND=onnx: a SentenceTransformer exported by
+    tools/export_onnx.py, run with onnxruntime on CPU. Uses the dynamic int8
+    export unless ONNX_QUANTIZED is off; ONNX_THREADS sets the intra-op
+    threads (0 = onnxruntime's default, one per core). No torch needed.
+    """
+
+    def __init__(self, model_dir: Optional[Path] = None):
+        # imported here so only processes on this backend need onnxruntime
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_dir = Path(model_dir or settings.onnx_model_dir)
+        meta = json.loads((model_dir / ONNX_META).read_text())
+        path = model_dir / (ONNX_INT8_MODEL if settings.onnx_quantized else ONNX_MODEL)
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = settings.onnx_threads
+        opts.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(str(path), opts, providers=["CPUExecutionProvider"])
+        self.inputs = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(str(model_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(meta["max_length"])
+        self.tokenizer.enable_padding(pad_id=meta["pad_id"], pad_token=meta["pad_token"])
+        self.pooling, self.normalize = meta["pooling"], meta["normalize"]
+        # int8 and fp32 vectors differ, so an index built with one isn't queried with the other
+        self.name = f"onnx:{meta['name']}:{'int8' if settings.onnx_quantized else 'fp32'}"
+        self.dim = meta["dim"]
+        self._lock = threading.Lock()
+        logger.info("Loaded ONNX embedding model %s (%s)", meta["name"], path.name)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        # batch similar lengths together so little of each batch is padding
+        order = np.argsort([len(t) for t in texts], kind="stable")
+        out = np.empty((len(texts), self.dim), dtype="float32")
+        for start in range(0, len(texts), settings.embed_batch):
+            rows = order[start:start + settings.embed_batch]
+            out[rows] = self._encode([texts[i] for i in rows])
+        return out
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        enc = self.tokenizer.encode_batch(texts)
+        mask = np.array([e.attention_mask for e in enc], dtype="int64")
+        feed = {"input_ids": np.array([e.ids for e in enc], dtype="int64"), "attention_mask": mask}
+        if "token_type_ids" in self.inputs:
+            feed["token_type_ids"] = np.array([e.type_ids for e in enc], dtype="int64")
+        # one run at a time; the session already uses every intra-op thread
+        with self._lock:
+            hidden = self.session.run(None, feed)[0]
+        if self.pooling == "cls":
+            vecs = hidden[:, 0]
+        else:
+            weights = mask[:, :, None].astype("float32")
+            vecs = (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        if self.normalize:
+            vecs = vecs / np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+        return vecs.astype("float32")
+
+class _Request:
+    __slots__ = ("texts", "result", "error", "done")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.result: Optional[np.ndarray] = None
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+
+class Coalescer:
+    """
+    Merges concurrent `fn(texts)` calls into batches of up to `max_batch`
+    texts. The first caller waits `window` seconds for others to queue, then
+    runs batches until the queue is empty; everyone else just waits for
+    their slice of the result.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], np.ndarray], max_batch: int, window: float):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.window = window
+        self._lock = threading.Lock()
+        self._queue: List[_Request] = []
+        self._leading = False
 
-if _model is None:
-    logger.error("No embedding model loaded; RAG will fallback to zeros")
+    def __call__(self, texts: List[str]) -> np.ndarray:
+        req = _Request(texts)
+        with self._lock:
+            self._queue.append(req)
+            lead, self._leading = not self._leading, True
+        if lead:
+            if self.window:
+                time.sleep(self.window)
+            self._drain()
+        req.done.wait()
+        if req.error is not None:
+            raise req.error
+        return req.result
 
-EMBED_DIM = _model.get_sentence_embedding_dimension() if _model else 384
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    self._leading = False
+                    return
+                batch, size = [], 0
+                while self._queue and (not batch or size + len(self._queue[0].texts) <= self.max_batch):
+                    req = self._queue.pop(0)
+                    batch.append(req)
+                    size += len(req.texts)
+            EMBED_BATCH_SIZE.observe(size)
+            try:
+                out = self.fn([t for req in batch for t in req.texts])
+                start = 0
+                for req in batch:
+                    req.result = out[start:start + len(req.texts)]
+                    start += len(req.texts)
+            except BaseException as e:
+                for req in batch:
+                    req.error = e
+            for req in batch:
+                req.done.set()
+
+# ——— Shared worker ——————————————————————————————————————
+
+# Frames on the worker socket are a little-endian u32 length plus payload.
+# A request is a JSON list of texts; the reply is a JSON header
+# ({"n", "dim", "name"} or {"error"}) followed by n×dim float32s. An empty
+# request just returns the header. Frames over MAX_FRAME are refused before
+# their payload is read; a full reply (EMBED_BATCH × dim float32s) is far below it.
+_FRAME = struct.Struct("<I")
+MAX_FRAME = 8 << 20
+WORKER_TIMEOUT = 60.0
+
+def send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+def recv_frame(sock: socket.socket) -> bytes:
+    """
+    One frame's payload; ValueError (with the payload unread) if it is over MAX_FRAME.
+    """
+    (size,) = _FRAME.unpack(_recv_exact(sock, _FRAME.size))
+    if size > MAX_FRAME:
+        raise ValueError(f"frame of {size} bytes exceeds the {MAX_FRAME} byte limit")
+    return _recv_exact(sock, size)
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < size:
+        chunk = sock.recv(size - len(buf))
+        if not chunk:
+            raise ConnectionError("embedding worker closed the connection")
+        buf += chunk
+    return bytes(buf)
+
+class WorkerBackend(EmbeddingBackend):
+    """
+    EMBEDDING_BACKEND=worker: texts are embedded by the node's shared
+    services.embed_worker over EMBED_SOCKET, so this process loads no model.
+    Reports the worker's model name, so switching between local and worker
+    keeps the saved index. One connection per thread; a broken connection
+    (e.g. the worker restarted) is reopened once, a timeout is not retried.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = str(path or settings.embed_socket)
+        self._local = threading.local()
+        header, _ = self._call([])
+        self.name, self.dim = header["name"], header["dim"]
+
+    def _conn(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            # blocking connect: with a timeout set, a full backlog fails with EAGAIN at once
+            sock.connect(self.path)
+            sock.settimeout(WORKER_TIMEOUT)
+            self._local.sock = sock
+        return sock
+
+    def _call(self, texts: List[str]) -> Tuple[Dict, np.ndarray]:
+        for attempt in range(2):
+            sock = self._conn()
+            try:
+                send_frame(sock, json.dumps(texts).encode())
+                header, data = json.loads(recv_frame(sock)), recv_frame(sock)
+                break
+            except (ConnectionError, BrokenPipeError):
+                # the worker went away between calls; a fresh connection may reach its successor
+                self._drop(sock)
+                if attempt:
+                    raise
+            except (OSError, ValueError):
+                # a timeout (the worker is alive but slow) or an oversized reply:
+                # resending would only queue more work
+                self._drop(sock)
+                raise
+        if "error" in header:
+            raise RuntimeError(f"embedding worker: {header['error']}")
+        return header, np.frombuffer(data, dtype="float32").reshape(header["n"], header["dim"])
+
+    def _drop(self, sock: socket.socket) -> None:
+        # a half-read reply would desync the stream, so never reuse the socket
+        self._local.sock = None
+        sock.close()
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._call(texts)[1]
+
+# name → factory; services register the backends that need them (e.g. "ollama")
+_factories: Dict[str, Callable[[], EmbeddingBackend]] = {
+    "local": LocalBackend, "onnx": OnnxBackend, "worker": WorkerBackend,
+}
+_backend: Optional[EmbeddingBackend] = None
+_backend_lock = threading.Lock()
+_failed_at: Optional[float] = None
+RETRY_SECONDS = 60.0   # remote backends may come up after the app does
+
+def register_backend(name: str, factory: Callable[[], EmbeddingBackend]) -> None:
+    _factories[name] = factory
+
+def make_backend(name: str) -> EmbeddingBackend:
+    factory = _factories.get(name)
+    if factory is None:
+        raise RuntimeError(f"backend {name!r} is not registered")
+    return factory()
+
+def _cooling_down() -> bool:
+    return _failed_at is not None and time.monotonic() - _failed_at < RETRY_SECONDS
+
+def backend() -> Optional[EmbeddingBackend]:
+    """
+    The EMBEDDING_BACKEND instance, created on first use; None if it could
+    not be loaded (callers then get zero vectors, as before). A failed load
+    is retried after RETRY_SECONDS.
+    """
+    global _backend, _failed_at
+    if _backend is not None or _cooling_down():
+        return _backend
+    with _backend_lock:
+        if _backend is None and not _cooling_down():
+            try:
+                _backend = make_backend(settings.embedding_backend)
+                logger.info("Embedding backend %s (dim %d)", _backend.name, _backend.dim)
+            except Exception as e:
+                _failed_at = time.monotonic()
+                logger.error("No embedding backend loaded (%s); RAG will fallback to zeros", e)
+    return _backend
+
+def embedding_dim() -> int:
+    b = backend()
+    return b.dim if b else EMBED_DIM
 
 def embed_texts(texts: List[str]) -> List[List[float]]:
     if not texts:
         return []
-    if _model is None:
+    b = backend()
+    if b is None:
         return [[0.0]*EMBED_DIM for _ in texts]
+    EMBED_TEXTS.inc(len(texts))
     try:
-        return _model.encode(texts, show_progress_bar=False, batch_size=64).tolist()
+        with timer(EMBED_SECONDS):
+            return b.encode(texts).tolist()
     except Exception as e:
         logger.exception("Embed error: %s", e)
-        return [[0.0]*EMBED_DIM for _ in texts]
+        return [[0.0]*b.dim for _ in texts]
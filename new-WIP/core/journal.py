@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+import os
+import re
+import threading
+import time
+from dataclasses import fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import GameState
+from .rules import RulesState
+from .settings import settings
+from .story import EventLog
+
+logger = logging.getLogger(__name__)
+
+SUFFIX = ".jsonl"
+SESSION_ID = re.compile(r"[0-9a-f]{32}")     # uuid4().hex, as the UI mints them
+
+Snapshot = Dict[str, Any]
+
+def encode_fields(state: GameState) -> Snapshot:
+    return {f.name: _copy(getattr(state, f.name)) for f in fields(state) if f.name != "story"}
+
+def _copy(value: Any) -> Any:
+    # current_options is a list that GameRunner may mutate in place
+    if isinstance(value, RulesState):
+        return value.to_dict()
+    return list(value) if isinstance(value, list) else value
+
+def encode_state(state: GameState) -> Snapshot:
+    """
+    GameState as JSON-safe fields; the story is its binary form in base64.
+    """
+    data = encode_fields(state)
+    data["story"] = base64.b64encode(state.story.to_bytes()).decode()
+    return data
+
+def valid_session_id(session_id: str) -> bool:
+    return bool(SESSION_ID.fullmatch(session_id or ""))
+
+def journal_path(session_id: str, directory: Optional[Path] = None) -> Path:
+    """
+    The journal file for `session_id`; ValueError unless the id is a
+    uuid4 hex and the file resolves inside the journal directory.
+    """
+    if not valid_session_id(session_id):
+        raise ValueError(f"invalid session id {session_id!r}")
+    root = (directory or settings.journal_dir).resolve()
+    path = (root / f"{session_id}{SUFFIX}").resolve()
+    if path.parent != root:
+        raise ValueError(f"journal for {session_id!r} escapes {root}")
+    return path
+
+def decode_state(data: Snapshot) -> GameState:
+    data = dict(data)
+    story = data.pop("story", None)
+    return GameState(**data, story=EventLog.from_bytes(base64.b64decode(story)) if story else EventLog())
+
+class SessionJournal:
+    """
+    Append-only JSONL log of one session's game state.
+
+    Each line is one event:
+      {"t": "snapshot", "state": {...}, "party": {...}}   full state
+      {"t": "party", "party": {...}}                      party (re)created
+      {"t": "set", "fields": {...}}                       changed GameState fields
+      {"t": "story", "events": "<base64>", "reset": bool} new story events
+
+    `commit()` diffs the state against what was last written; the story is
+    append-only, so only events past the last commit are encoded and a turn
+    is usually one short line. Every `snapshot_every` events the file is
+    compacted to a single snapshot (tmp file + os.replace), which bounds a
+    resume to one snapshot plus a short tail. A torn last line from a crash
+    is dropped on load.
+    """
+
+    def __init__(self, session_id: str, directory: Optional[Path] = None, snapshot_every: Optional[int] = None):
+        self.session_id = session_id
+        self.path = journal_path(session_id, directory)
+        self.snapshot_every = snapshot_every or settings.journal_snapshot_every
+        self._lock = threading.Lock()
+        self._state: Snapshot = {}
+        self._party: Optional[Dict[str, Any]] = None
+        self._story: Optional[EventLog] = None
+        self._story_len = 0
+        self._events = 0
+
+    @staticmethod
+    def exists(session_id: str, directory: Optional[Path] = None) -> bool:
+        try:
+            return journal_path(session_id, directory).exists()
+        except ValueError:
+            return False
+
+    def load(self) -> Tuple[GameState, Optional[Dict[str, Any]]]:
+        """
+        Replay the journal; returns the GameState and the party (plain dicts).
+        """
+        state: Snapshot = {}
+        story = EventLog()
+        party: Optional[Dict[str, Any]] = None
+        events = 0
+        good_bytes = 0
+        with open(self.path, "rb") as f:
+            for raw in f:
+                try:
+                    ev = json.loads(raw)
+                except ValueError:
+                    logger.warning("Dropping torn journal tail in %s", self.path)
+                    break
+                good_bytes += len(raw)
+                events += 1
+                kind = ev.get("t")
+                if kind == "snapshot":
+                    snap = decode_state(ev["state"])
+                    state, story, party, events = encode_fields(snap), snap.story, ev.get("party"), 0
+                elif kind == "party":
+                    party = ev["party"]
+                elif kind == "set":
+                    state.update(ev["fields"])
+                elif kind == "story":
+                    if ev.get("reset"):
+                        story = EventLog()
+                    story.extend_bytes(base64.b64decode(ev["events"]))
+        if good_bytes < self.path.stat().st_size:
+            with open(self.path, "r+b") as f:
+                f.truncate(good_bytes)
+        game = GameState(**state, story=story)
+        with self._lock:
+            self._state = {k: _copy(v) for k, v in state.items()}
+            self._story, self._story_len = story, len(story)
+            self._party, self._events = party, events
+        return game, party
+
+    def commit(self, state: GameState, party: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Append whatever changed since the last commit.
+        """
+        with self._lock:
+            events: List[Dict[str, Any]] = []
+            if party is not None and party != self._party:
+                events.append({"t": "party", "party": party})
+                self._party = party
+            current = encode_fields(state)
+            changed = {k: v for k, v in current.items() if self._state.get(k) != v}
+            if changed:
+                events.append({"t": "set", "fields": changed})
+            story = state.story
+            reset = story is not self._story or len(story) < self._story_len
+            start = 0 if reset else self._story_len
+            if reset or len(story) > start:
+                chunk = base64.b64encode(story.to_bytes(start)).decode()
+                events.append({"t": "story", "events": chunk, "reset": reset})
+            if not events:
+                return
+            self._state = current
+            self._story, self._story_len = story, len(story)
+            self._events += len(events)
+            if self._events >= self.snapshot_every or not self.path.exists():
+                self._compact()
+            else:
+                self._append(events)
+
+    def delete(self) -> None:
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+            self._state, self._party, self._events = {}, None, 0
+            self._story, self._story_len = None, 0
+
+    def _append(self, events: List[Dict[str, Any]]) -> None:
+        data = "".join(json.dumps(ev, separators=(",", ":")) + "\n" for ev in events)
+        try:
+            with open(self.path, "a") as f:
+                f.write(data)
+                if settings.journal_fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+        except Exception:
+            logger.exception("Failed to append to journal %s", self.path)
+
+    def _compact(self) -> None:
+        state = GameState(**self._state, story=self._story or EventLog())
+        snapshot = {"t": "snapshot", "ts": time.time(), "state": encode_state(state), "party": self._party}
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            with open(tmp, "w") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+                if settings.journal_fsync:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self._events = 0
+        except Exception:
+            logger.exception("Failed to compact journal %s", self.path)
@@ -0,0 +1,67 @@
+from typing import List
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+class JsonStreamParser:
+    """
+    Incremental scanner for the first complete top-level JSON object/array
+    in a token stream. Text before the opening bracket (chatter, code fences)
+    is skipped; brackets inside strings are ignored.
+
+        p = JsonStreamParser()
+        for chunk in stream:
+            if p.feed(chunk):
+                break          # value complete — stop paying for tokens
+        data = json.loads(p.text)
+    """
+
+    def __init__(self, openers: str = "{["):
+        self.openers = openers
+        self.done = False
+        self._buf: List[str] = []
+        self._stack: List[str] = []
+        self._in_str = False
+        self._escaped = False
+
+    @property
+    def started(self) -> bool:
+        return bool(self._buf)
+
+    @property
+    def text(self) -> str:
+        return "".join(self._buf)
+
+    def feed(self, chunk: str) -> bool:
+        """
+        Consume `chunk`; return True once the top-level value has closed.
+        Anything after the closing bracket is dropped.
+        """
+        if self.done:
+            return True
+        start = 0
+        if not self._buf:
+            start = next((i for i, ch in enumerate(chunk) if ch in self.openers), -1)
+            if start < 0:
+                return False
+        stack = self._stack
+        for i in range(start, len(chunk)):
+            ch = chunk[i]
+            if self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch in _CLOSERS:
+                stack.append(_CLOSERS[ch])
+            elif stack and ch == stack[-1]:
+                stack.pop()
+                if not stack:
+                    self._buf.append(chunk[start:i + 1])
+                    self.done = True
+                    return True
+        self._buf.append(chunk[start:])
+        return False
@@ -0,0 +1,187 @@
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+RATE_BUCKETS = (1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 250)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _fmt_labels(key: LabelKey, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name, self.help = name, help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        k = _key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_key(labels), 0)
+
+    def total(self, **labels: Any) -> float:
+        """
+        Sum over every series whose labels include `labels`.
+        """
+        want = set(_key(labels))
+        return sum(v for k, v in self._values.items() if want.issubset(k))
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        for k, v in sorted(self._values.items()):
+            yield f"{self.name}{_fmt_labels(k)} {v}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"type": "counter", "values": [{"labels": dict(k), "value": v} for k, v in self._values.items()]}
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.buckets = name, help, buckets
+        # per label set: [bucket counts..., +Inf count], sum
+        self._series: Dict[LabelKey, Tuple[list, list]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        k = _key(labels)
+        with self._lock:
+            counts, total = self._series.setdefault(k, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[bisect_left(self.buckets, value)] += 1
+            total[0] += value
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(_key(labels))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        for k, (counts, total) in sorted(self._series.items()):
+            cum = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cum += c
+                le = 'le="%s"' % ("+Inf" if bound == float("inf") else repr(bound))
+                yield f"{self.name}_bucket{_fmt_labels(k, le)} {cum}"
+            yield f"{self.name}_sum{_fmt_labels(k)} {total[0]}"
+            yield f"{self.name}_count{_fmt_labels(k)} {cum}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "type": "histogram",
+            "buckets": list(self.buckets),
+            "series": [
+                {"labels": dict(k), "counts": list(counts), "sum": total[0], "count": sum(counts)}
+                for k, (counts, total) in self._series.items()
+            ],
+        }
+
+class Registry:
+    """
+    Process-wide metric store, rendered as Prometheus text or JSON.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str = "") -> Counter:
+        return self._get(name, lambda: Counter(name, help))
+
+    def histogram(self, name: str, help: str = "", buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(name, lambda: Histogram(name, help, buckets))
+
+    def _get(self, name: str, make):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = make()
+            return self._metrics[name]
+
+    def render_prometheus(self) -> str:
+        return "\n".join(line for m in self._metrics.values() for line in m.render()) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: m.to_dict() for name, m in self._metrics.items()}
+
+    def dump_json(self, path) -> None:
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+registry = Registry()
+
+@contextmanager
+def timer(hist: Histogram, **labels: Any):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        hist.observe(time.perf_counter() - start, **labels)
+
+def timed(hist: Histogram, **labels: Any):
+    """
+    Decorator form of `timer`.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(hist, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return deco
+
+# ——— /metrics endpoint ———————————————————————————————————
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.startswith("/metrics.json"):
+            body, ctype = json.dumps(registry.to_dict()).encode(), "application/json"
+        elif self.path.startswith("/metrics"):
+            body, ctype = registry.render_prometheus().encode(), "text/plain; version=0.0.4"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics: " + format, *args)
+
+_server: Optional[ThreadingHTTPServer] = None
+
+def start_metrics_server(port: int, host: str = "0.0.0.0") -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics (Prometheus) and /metrics.json on `port` (idempotent; 0 disables).
+    """
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        # another Streamlit process on this node already owns the port
+        logger.warning("Metrics server not started on :%d: %s", port, e)
+        return None
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    logger.info("Metrics on http://%s:%d/metrics", host, port)
+    return _server
@@ -2,15 +2,24 @@ from __future__ import annotations
 from dataclasses import dataclass, field
 from typing import List, Literal, Optional
 
+from .rules import RulesState
+from .story import EventLog
+
 @dataclass
 class GameState:
     """
     Tracks the current turn, phase, narrative history, available options,
-    and most recent player choice.
+    most recent player choice, and the party's mechanical state.
     """
     turn: int = 0
     phase: Literal["start", "intro", "choice", "dm_response"] = "start"
     intro_text: Optional[str] = None
-    story: List[str] = field(default_factory=list)         # DM and Player lines
+    story: EventLog = field(default_factory=EventLog)      # DM, player and party events
     current_options: List[str] = field(default_factory=list)
     last_choice: Optional[str] = None
+    rules: RulesState = field(default_factory=RulesState)
+
+    def __post_init__(self):
+        # journal snapshots carry the rules as a plain dict
+        if isinstance(self.rules, dict):
+            self.rules = RulesState.from_dict(self.rules)
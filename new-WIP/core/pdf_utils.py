@@ -1,7 +1,7 @@
 import logging
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import Callable, List, Optional
 
 import pdfplumber
 
@@ -26,8 +26,11 @@ def extract_text_from_pdf(pdf_path: Path) -> List[str]:
         logger.exception("PDF read error %s: %s", pdf_path, e)
     return pages
 
-def load_all_pdf_texts() -> List[str]:
-    files = list_pdfs()
+def load_pdf_texts(files: List[Path], on_file: Optional[Callable[[Path], None]] = None) -> List[str]:
+    """
+    Page texts of `files`, extracted in parallel; `on_file` is called as each
+    file finishes (for progress reporting).
+    """
     if not files:
         return []
     texts: List[str] = []
@@ -39,4 +42,9 @@ def load_all_pdf_texts() -> List[str]:
                 texts.extend(fut.result())
             except Exception as e:
                 logger.error("Error %s: %s", p, e)
+            if on_file:
+                on_file(p)
     return texts
+
+def load_all_pdf_texts() -> List[str]:
+    return load_pdf_texts(list_pdfs())
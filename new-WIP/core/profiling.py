@@ -0,0 +1,112 @@
+import cProfile
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+from types import FrameType
+from typing import Optional
+
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+
+_active = threading.local()
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class StackSampler:
+    """
+    Samples one thread's Python stack on a timer and aggregates the stacks
+    into collapsed format ("outer;inner;leaf count"), ready for flamegraph.pl
+    or speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def __enter__(self) -> "StackSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame: Optional[FrameType] = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def write_collapsed(self, path: Path) -> None:
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextmanager
+def profile_phase(phase: str):
+    """
+    Profile the enclosed block and write `<phase>-<timestamp>.collapsed`
+    (sampled stacks) and, in "cprofile" mode, a `.prof` file alongside.
+    """
+    out_dir = settings.profile_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = out_dir / f"{phase}-{time.strftime('%Y%m%d-%H%M%S')}-{threading.get_ident()}"
+    prof = cProfile.Profile() if settings.profile_mode == "cprofile" else None
+    t0 = time.perf_counter()
+    with StackSampler(threading.get_ident()) as sampler:
+        if prof:
+            try:
+                prof.enable()
+            except ValueError:
+                # another phase is already being traced in this process
+                prof = None
+        try:
+            yield
+        finally:
+            if prof:
+                prof.disable()
+    try:
+        sampler.write_collapsed(stem.with_suffix(".collapsed"))
+        if prof:
+            prof.dump_stats(stem.with_suffix(".prof"))
+        logger.info("Profiled %s in %.2fs -> %s.*", phase, time.perf_counter() - t0, stem)
+    except Exception:
+        logger.exception("Failed to write profile for %s", phase)
+
+def profiled(phase: str):
+    """
+    Wrap a function in `profile_phase` when PROFILE_MODE is not "off".
+    Disabled, the cost is one settings lookup per call.
+    """
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            # a phase called from inside another phase lands in the outer profile
+            if settings.profile_mode == "off" or getattr(_active, "phase", None):
+                return fn(*args, **kwargs)
+            _active.phase = phase
+            try:
+                with profile_phase(phase):
+                    return fn(*args, **kwargs)
+            finally:
+                _active.phase = None
+        return wrapper
+    return deco
@@ -0,0 +1,272 @@
+from __future__ import annotations
+
+import copy
+import random
+import re
+from dataclasses import asdict, dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from .story import EventKind, EventLog
+
+ABILITIES = ("str", "dex", "con", "int", "wis", "cha")
+
+# hit die and primary ability per class; unknown classes fall back to DEFAULT_CLASS
+CLASS_TABLE: Dict[str, Tuple[int, str]] = {
+    "barbarian": (12, "str"), "fighter": (10, "str"), "paladin": (10, "str"),
+    "ranger": (10, "dex"), "rogue": (8, "dex"), "monk": (8, "dex"),
+    "bard": (8, "cha"), "cleric": (8, "wis"), "druid": (8, "wis"),
+    "warlock": (8, "cha"), "sorcerer": (6, "cha"), "wizard": (6, "int"),
+}
+DEFAULT_CLASS = (8, "str")
+
+# first keyword found in a choice decides the check; order matters
+CHECKS: List[Tuple[Tuple[str, ...], str, int]] = [
+    (("attack", "fight", "strike", "charge", "battle"), "str", 13),
+    (("sneak", "hide", "steal", "dodge", "climb", "flee", "run"), "dex", 12),
+    (("persuade", "parley", "negotiate", "bargain", "talk", "convince"), "cha", 12),
+    (("inspect", "search", "investigate", "study", "read", "examine"), "int", 11),
+    (("listen", "track", "sense", "watch", "scout", "look"), "wis", 11),
+    (("force", "lift", "break", "push", "endure"), "con", 13),
+]
+CONSUMABLES: Dict[str, str] = {"potion": "2d4+2", "ration": "1d4", "herb": "1d4"}
+USE_WORDS = ("use", "drink", "quaff", "eat", "consume", "apply", "chew")   # "buy a potion" uses none
+REST_WORDS = ("rest", "recover", "camp", "sleep")
+FAIL_DAMAGE = "1d6"
+SUMMARY_ITEMS = 3
+RULES_SPEAKER = "Rules"
+
+_WORD = re.compile(r"[a-z]+")
+_VOWELS = frozenset("aeiou")
+_DICE = re.compile(r"^\s*(\d*)d(\d+)\s*([+-]\s*\d+)?\s*$", re.IGNORECASE)
+
+def parse_dice(expr: str) -> Tuple[int, int, int]:
+    """
+    "2d6+1" → (2, 6, 1). Raises ValueError on anything else.
+    """
+    m = _DICE.match(expr)
+    if not m:
+        raise ValueError(f"bad dice expression: {expr!r}")
+    count, sides, bonus = m.groups()
+    return int(count or 1), int(sides), int(bonus.replace(" ", "")) if bonus else 0
+
+def modifier(score: int) -> int:
+    return (score - 10) // 2
+
+@lru_cache(maxsize=None)
+def inflections(word: str) -> FrozenSet[str]:
+    """
+    `word` and its regular -s/-ed/-ing forms ("study" → studies, studied,
+    studying; "run" → running), so keywords match whole words: "run" is not
+    in "rune", nor "rest" in "forest".
+    """
+    forms = {word}
+    consonant_y = len(word) > 1 and word[-1] == "y" and word[-2] not in _VOWELS
+    if word.endswith(("s", "x", "z", "ch", "sh")):
+        forms.add(word + "es")
+    elif consonant_y:
+        forms.add(word[:-1] + "ies")
+    else:
+        forms.add(word + "s")
+    if word.endswith("e"):
+        forms |= {word + "d", (word if word.endswith("ee") else word[:-1]) + "ing"}
+    elif consonant_y:
+        forms |= {word[:-1] + "ied", word + "ing"}
+    elif _doubles(word):
+        forms |= {word + word[-1] + "ed", word + word[-1] + "ing"}
+    else:
+        forms |= {word + "ed", word + "ing"}
+    return frozenset(forms)
+
+def _doubles(word: str) -> bool:
+    # one-syllable consonant-vowel-consonant words double the last letter: stop → stopped
+    return (
+        len(word) >= 3 and word[-1] not in _VOWELS and word[-1] not in "wxy"
+        and word[-2] in _VOWELS and word[-3] not in _VOWELS
+        and len(re.findall("[aeiou]+", word)) == 1
+    )
+
+@dataclass
+class CharacterSheet:
+    """
+    Mechanical state for one party member; the narrative lives on Character.
+    """
+    name: str
+    klass: str
+    hp: int
+    max_hp: int
+    ac: int
+    abilities: Dict[str, int]
+    inventory: List[str] = field(default_factory=list)
+
+    @property
+    def down(self) -> bool:
+        return self.hp <= 0
+
+    def mod(self, ability: str) -> int:
+        return modifier(self.abilities.get(ability, 10))
+
+    def find_item(self, word: str) -> Optional[str]:
+        word = word.lower()
+        return next((it for it in self.inventory if word in it.lower()), None)
+
+    def summary(self) -> str:
+        items = ", ".join(self.inventory[:SUMMARY_ITEMS])
+        more = f" +{len(self.inventory) - SUMMARY_ITEMS}" if len(self.inventory) > SUMMARY_ITEMS else ""
+        return f"{self.name} ({self.klass}) HP {self.hp}/{self.max_hp} AC {self.ac}; {items}{more}"
+
+@dataclass
+class Outcome:
+    """
+    What the rules decided for one choice; `text` goes into the story.
+    """
+    text: str
+    rolls: int
+    hp: Dict[str, int] = field(default_factory=dict)           # member → new HP
+    removed: Dict[str, str] = field(default_factory=dict)      # member → item used up
+
+@dataclass
+class RulesState:
+    """
+    Deterministic mechanics for a party: dice come from a seeded RNG keyed by
+    the roll count, so replaying a journal or speculating on a branch yields
+    exactly the rolls the live game will make.
+    """
+    seed: int = 0
+    rolls: int = 0
+    sheets: Dict[str, CharacterSheet] = field(default_factory=dict)
+
+    @classmethod
+    def for_party(cls, party: Dict[str, Any], seed: Optional[int] = None) -> "RulesState":
+        rules = cls(seed=random.randrange(2**31) if seed is None else seed)
+        for member, char in party.items():
+            rules.sheets[member] = rules._new_sheet(member, char)
+        return rules
+
+    def _new_sheet(self, member: str, char: Any) -> CharacterSheet:
+        klass = str(getattr(char, "class_", "") or "Adventurer")
+        hit_die, primary = CLASS_TABLE.get(klass.strip().lower(), DEFAULT_CLASS)
+        # 4d6 drop lowest, best score into the class's primary ability
+        scores = sorted((sum(sorted(self._dice(4, 6))[1:]) for _ in ABILITIES), reverse=True)
+        order = [primary] + [a for a in ABILITIES if a != primary]
+        abilities = dict(zip(order, scores))
+        max_hp = max(1, hit_die + modifier(abilities["con"]))
+        ac = 10 + modifier(abilities["dex"]) + (3 if hit_die >= 10 else 1)
+        return CharacterSheet(
+            name=getattr(char, "name", member), klass=klass, hp=max_hp, max_hp=max_hp, ac=ac,
+            abilities=abilities, inventory=list(getattr(char, "items", []) or []),
+        )
+
+    # ——— Dice ——————————————————————————————————————————
+
+    def _dice(self, count: int, sides: int) -> List[int]:
+        rng = random.Random(f"{self.seed}:{self.rolls}")
+        self.rolls += 1
+        return [rng.randint(1, sides) for _ in range(count)]
+
+    def roll(self, expr: str) -> int:
+        count, sides, bonus = parse_dice(expr)
+        return sum(self._dice(count, sides)) + bonus
+
+    def check(self, member: str, ability: str, dc: int) -> Tuple[int, int, bool]:
+        """
+        d20 + ability modifier against `dc`; returns (die, total, success).
+        """
+        die = self._dice(1, 20)[0]
+        total = die + self.sheets[member].mod(ability)
+        return die, total, die == 20 or (die != 1 and total >= dc)
+
+    # ——— Resolution ————————————————————————————————————
+
+    def resolve(self, choice: str) -> Optional[Outcome]:
+        """
+        Decide the mechanics of `choice` without changing any sheet (only the
+        roll counter moves, and it is restored). `apply()` commits the result.
+        """
+        alive = {m: s for m, s in self.sheets.items() if not s.down}
+        if not alive:
+            return None
+        start = self.rolls
+        try:
+            return self._resolve(choice.lower(), alive)
+        finally:
+            self.rolls = start
+
+    def _resolve(self, text: str, alive: Dict[str, CharacterSheet]) -> Optional[Outcome]:
+        tokens = set(_WORD.findall(text))
+
+        def says(*words: str) -> bool:
+            return any(not tokens.isdisjoint(inflections(w)) for w in words)
+
+        for word, heal in CONSUMABLES.items():
+            if not (says(word) and says(*USE_WORDS)):
+                continue
+            holder = next((m for m, s in alive.items() if s.find_item(word)), None)
+            if holder is None:
+                continue
+            sheet = alive[holder]
+            new_hp = min(sheet.max_hp, sheet.hp + self.roll(heal))
+            item = sheet.find_item(word)
+            return Outcome(
+                text=f"{sheet.name} uses {item}: HP {new_hp}/{sheet.max_hp}.",
+                rolls=self.rolls, hp={holder: new_hp}, removed={holder: item},
+            )
+        if says(*REST_WORDS):
+            hp = {m: min(s.max_hp, s.hp + self.roll("1d4")) for m, s in alive.items()}
+            return Outcome(text="The party rests and recovers some HP.", rolls=self.rolls, hp=hp)
+        for words, ability, dc in CHECKS:
+            if says(*words):
+                break
+        else:
+            return None
+        member = max(alive, key=lambda m: alive[m].mod(ability))
+        sheet = alive[member]
+        die, total, ok = self.check(member, ability, dc)
+        text = f"{sheet.name} {ability.upper()} check: {die}{sheet.mod(ability):+d} = {total} vs DC {dc}, "
+        if ok:
+            return Outcome(text=text + "success.", rolls=self.rolls)
+        new_hp = max(0, sheet.hp - self.roll(FAIL_DAMAGE))
+        down = " and is down" if new_hp == 0 else ""
+        return Outcome(
+            text=text + f"failure; {sheet.name} takes damage (HP {new_hp}/{sheet.max_hp}){down}.",
+            rolls=self.rolls, hp={member: new_hp},
+        )
+
+    def apply(self, outcome: Outcome) -> None:
+        self.rolls = outcome.rolls
+        for member, hp in outcome.hp.items():
+            self.sheets[member].hp = hp
+        for member, item in outcome.removed.items():
+            inv = self.sheets[member].inventory
+            if item in inv:
+                inv.remove(item)
+
+    # ——— Prompts & persistence ————————————————————————————
+
+    def summary(self, members: Optional[List[str]] = None) -> str:
+        """
+        One compact line per party member, for prompts.
+        """
+        names = members or list(self.sheets)
+        return " | ".join(self.sheets[m].summary() for m in names if m in self.sheets)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"seed": self.seed, "rolls": self.rolls, "sheets": {m: asdict(s) for m, s in self.sheets.items()}}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "RulesState":
+        return cls(
+            seed=data.get("seed", 0), rolls=data.get("rolls", 0),
+            sheets={m: CharacterSheet(**copy.deepcopy(s)) for m, s in data.get("sheets", {}).items()},
+        )
+
+def record_choice(story: EventLog, rules: RulesState, turn: int, choice: str) -> Optional[Outcome]:
+    """
+    Append the player's choice and, if the rules resolve it, the outcome.
+    """
+    story.append(turn, "Player", EventKind.CHOICE, choice)
+    outcome = rules.resolve(choice)
+    if outcome is not None:
+        rules.apply(outcome)
+        story.append(turn, RULES_SPEAKER, EventKind.RULES, outcome.text)
+    return outcome
@@ -1,5 +1,6 @@
 import logging
 from pathlib import Path
+from typing import List, Literal, Optional
 
 from pydantic_settings import BaseSettings
 from pydantic import HttpUrl
@@ -8,13 +9,51 @@ logger = logging.getLogger(__name__)
 
 class Settings(BaseSettings):
     ollama_host: HttpUrl = "http://localhost:11434"
+    ollama_hosts: List[str] = []      # JSON list; overrides ollama_host when set
+    ollama_health_interval: float = 10.0
+    ollama_host_cooldown: float = 30.0
     ollama_model: str = "gemma3:4b"
+    dm_model: Optional[str] = None        # defaults to ollama_model
+    player_model: Optional[str] = None    # defaults to ollama_model
+    dm_keep_alive: str = "30m"
+    player_keep_alive: str = "30m"
+    prewarm_models: bool = True
+    ollama_num_parallel: int = 4      # match the server's OLLAMA_NUM_PARALLEL
+    scheduler_max_queue: int = 64
+    scheduler_shed_after: float = 30.0  # seconds of estimated wait before low-priority work is refused
     pdf_folder: Path = Path("pdf")
     vector_index_dir: Path = Path("vector_index")
+    cache_dir: Path = Path("cache")
+    embedding_backend: Literal["local", "onnx", "ollama", "worker"] = "local"
+    embedding_model: str = "nomic-embed-text"   # Ollama model for the ollama backend
+    embed_socket: Path = Path("cache/embed.sock")   # shared embedding worker (services.embed_worker)
+    onnx_model_dir: Path = Path("models/onnx")      # written by tools/export_onnx.py
+    onnx_quantized: bool = True         # use the dynamic int8 export
+    onnx_threads: int = 0               # intra-op threads; 0 = one per core
+    embed_batch: int = 64               # texts per backend embedding request
+    embed_coalesce_ms: float = 5.0      # wait for concurrent embed calls to share a request
+    enable_journal: bool = True
+    journal_dir: Path = Path("journal")
+    journal_snapshot_every: int = 50  # events between compactions
+    journal_fsync: bool = False
+    session_idle_seconds: float = 900.0   # evict live sessions idle this long
+    session_memory_budget_mb: int = 256   # evict least-recently-used sessions past this
     turn_limit: int = 10
+    turn_workers: int = 8
+    log_window_turns: int = 5         # adventure log turns rendered before "show earlier"
     chunk_size: int = 500
     chunk_overlap: int = 50
     enable_rag: bool = True
+    enable_lore_digests: bool = False  # summarize chunks at ingest; retrieve returns digests
+    digest_batch: int = 4              # chunks per digest LLM call
+    metrics_port: int = 0             # serve /metrics and /metrics.json; 0 disables
+    profile_mode: Literal["off", "sample", "cprofile"] = "off"
+    profile_dir: Path = Path("profiles")
+    enable_speculation: bool = False
+    enable_ai_party: bool = False
+    party_batch: bool = True
+    enable_character_pool: bool = False
+    character_pool_size: int = 12
 
     class Config:
         env_file = ".env"
@@ -23,7 +62,7 @@ class Settings(BaseSettings):
 settings = Settings()
 
 # Ensure data dirs exist
-for folder in (settings.pdf_folder, settings.vector_index_dir):
+for folder in (settings.pdf_folder, settings.vector_index_dir, settings.cache_dir, settings.journal_dir):
     try:
         folder.mkdir(parents=True, exist_ok=True)
     except Exception:
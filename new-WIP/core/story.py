@@ -0,0 +1,190 @@
+import struct
+import sys
+from enum import IntEnum
+from typing import Dict, Iterator, List, Optional
+
+MAGIC = b"EVL1"
+_HEADER = struct.Struct("<4sHI")       # magic, speakers, events
+_EVENT = struct.Struct("<IHBIII")      # turn, speaker, kind, offset, length, tokens
+_NAME_LEN = struct.Struct("<H")
+# slotted instance + its list slot + two index entries
+_EVENT_BYTES = 120
+
+class EventKind(IntEnum):
+    INTRO = 0      # DM's opening narration
+    NARRATION = 1  # DM turn
+    CHOICE = 2     # the human player's pick
+    ACTION = 3     # an AI party member's action
+    RULES = 4      # a mechanical outcome resolved by core.rules
+
+class StoryEvent:
+    """
+    One entry in the adventure log. The text lives in the owning EventLog's
+    arena at [offset, offset + length).
+    """
+    __slots__ = ("turn", "speaker", "kind", "offset", "length", "tokens")
+
+    def __init__(self, turn: int, speaker: int, kind: EventKind, offset: int, length: int, tokens: int):
+        self.turn = turn
+        self.speaker = speaker
+        self.kind = kind
+        self.offset = offset
+        self.length = length
+        self.tokens = tokens
+
+    def __repr__(self) -> str:
+        return f"StoryEvent(turn={self.turn}, speaker={self.speaker}, kind={self.kind.name}, tokens={self.tokens})"
+
+def estimate_tokens(text: str) -> int:
+    # ~4 chars per token for English; good enough for prompt budgeting
+    return max(1, len(text) // 4) if text else 0
+
+class EventLog:
+    """
+    Append-only adventure log indexed by turn and speaker.
+
+    Texts are concatenated into one arena string and events are slotted
+    records pointing into it, so a session holds one large string instead of
+    one object per line and nothing is re-split to find who said what.
+    `to_bytes()`/`from_bytes()` give a compact binary form for persistence.
+    """
+
+    def __init__(self):
+        self._arena = ""
+        self._events: List[StoryEvent] = []
+        self._speakers: List[str] = []
+        self._speaker_ids: Dict[str, int] = {}
+        self._by_turn: Dict[int, List[int]] = {}
+        self._by_speaker: Dict[int, List[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._events)
+
+    def __iter__(self) -> Iterator[StoryEvent]:
+        return iter(self._events)
+
+    def __getitem__(self, i: int) -> StoryEvent:
+        return self._events[i]
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, EventLog):
+            return NotImplemented
+        return self.to_bytes() == other.to_bytes()
+
+    def append(
+        self,
+        turn: int,
+        speaker: str,
+        kind: EventKind,
+        text: str,
+        tokens: Optional[int] = None,
+    ) -> StoryEvent:
+        sid = self._speaker_ids.get(speaker)
+        if sid is None:
+            sid = self._speaker_ids[speaker] = len(self._speakers)
+            self._speakers.append(speaker)
+        # rebind to a local so CPython can grow the arena in place
+        arena, self._arena = self._arena, ""
+        offset = len(arena)
+        arena += text
+        self._arena = arena
+        ev = StoryEvent(turn, sid, kind, offset, len(text), estimate_tokens(text) if tokens is None else tokens)
+        idx = len(self._events)
+        self._events.append(ev)
+        self._by_turn.setdefault(turn, []).append(idx)
+        self._by_speaker.setdefault(sid, []).append(idx)
+        return ev
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Rough in-memory size, for session memory budgeting.
+        """
+        return sys.getsizeof(self._arena) + len(self._events) * _EVENT_BYTES
+
+    def text(self, ev: StoryEvent) -> str:
+        return self._arena[ev.offset:ev.offset + ev.length]
+
+    def speaker(self, ev: StoryEvent) -> str:
+        return self._speakers[ev.speaker]
+
+    def line(self, ev: StoryEvent) -> str:
+        """
+        "Speaker: text" as prompts see it; the intro is bare narration.
+        """
+        text = self.text(ev)
+        return text if ev.kind == EventKind.INTRO else f"{self._speakers[ev.speaker]}: {text}"
+
+    def last(self) -> Optional[StoryEvent]:
+        return self._events[-1] if self._events else None
+
+    def for_turn(self, turn: int) -> List[StoryEvent]:
+        return [self._events[i] for i in self._by_turn.get(turn, ())]
+
+    def by_speaker(self, speaker: str) -> List[StoryEvent]:
+        sid = self._speaker_ids.get(speaker)
+        return [] if sid is None else [self._events[i] for i in self._by_speaker[sid]]
+
+    def tail_text(self, n: int) -> str:
+        """
+        The last `n` events as prompt lines joined by spaces.
+        """
+        return " ".join(self.line(ev) for ev in self._events[-n:]) if n > 0 else ""
+
+    def fork(self) -> "EventLog":
+        """
+        Independent copy for speculative branches; the arena string is shared.
+        """
+        log = EventLog.__new__(EventLog)
+        log._arena = self._arena
+        log._events = list(self._events)
+        log._speakers = list(self._speakers)
+        log._speaker_ids = dict(self._speaker_ids)
+        log._by_turn = {t: list(ix) for t, ix in self._by_turn.items()}
+        log._by_speaker = {s: list(ix) for s, ix in self._by_speaker.items()}
+        return log
+
+    # ——— Serialization ——————————————————————————————————
+
+    def to_bytes(self, start: int = 0) -> bytes:
+        """
+        Binary encoding of events[start:]; offsets are rebased so the chunk
+        decodes on its own.
+        """
+        events = self._events[start:]
+        base = events[0].offset if events else 0
+        parts = [_HEADER.pack(MAGIC, len(self._speakers), len(events))]
+        for name in self._speakers:
+            raw = name.encode()
+            parts.append(_NAME_LEN.pack(len(raw)) + raw)
+        parts.extend(
+            _EVENT.pack(ev.turn, ev.speaker, ev.kind, ev.offset - base, ev.length, ev.tokens)
+            for ev in events
+        )
+        parts.append(self._arena[base:].encode())
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "EventLog":
+        log = cls()
+        log.extend_bytes(data)
+        return log
+
+    def extend_bytes(self, data: bytes) -> None:
+        """
+        Append events encoded by `to_bytes()` (of this log or another).
+        """
+        magic, n_speakers, n_events = _HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("not an event log")
+        pos = _HEADER.size
+        names: List[str] = []
+        for _ in range(n_speakers):
+            (size,) = _NAME_LEN.unpack_from(data, pos)
+            pos += _NAME_LEN.size
+            names.append(data[pos:pos + size].decode())
+            pos += size
+        records = [_EVENT.unpack_from(data, pos + i * _EVENT.size) for i in range(n_events)]
+        arena = data[pos + n_events * _EVENT.size:].decode()
+        for turn, speaker, kind, offset, length, tokens in records:
+            self.append(turn, names[speaker], EventKind(kind), arena[offset:offset + length], tokens)
@@ -1,14 +1,19 @@
+import json
 import logging
+import os
 import pickle
 import re
+import threading
 from pathlib import Path
-from typing import List
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
 
 import hnswlib
 import numpy as np
 
+from .digests import digest_store
 from .pdf_utils import load_all_pdf_texts
-from .embeddings import embed_texts, EMBED_DIM
+from .embeddings import EMBED_DIM, LOCAL_REPOS, backend, embed_texts, embedding_dim
+from .metrics import registry, timed, timer
 from .settings import settings
 
 logger = logging.getLogger(__name__)
@@ -31,76 +36,247 @@ def semantic_truncate(text: str, max_chars: int) -> str:
 
 INDEX_FILE = "hnsw_index.bin"
 TEXTS_FILE = "texts.pkl"
+META_FILE = "index_meta.json"   # embedder, dimension and PDF mtimes the index was built from
+LEGACY_META = {"embedder": "local", "dim": EMBED_DIM}   # indexes saved before META_FILE
+EMBED_BATCH = 256   # texts per embed call while indexing; bounds cancel latency
 
-_index: hnswlib.Index | None = None
-_texts: List[str] = []
+class IndexHandle(NamedTuple):
+    """
+    An index, the texts its labels point into and the embedder that built
+    it. Handles are immutable and replaced wholesale on rebuild, so a reader
+    holding one never sees a half-built index.
+    """
+    index: hnswlib.Index
+    texts: List[str]
+    embedder: str = ""
+
+class BuildCancelled(Exception):
+    pass
+
+_handle: Optional[IndexHandle] = None
+_generation = 0                     # bumped on every swap
+_build_lock = threading.Lock()      # one build/load at a time per process
+_mtime_lock = threading.Lock()
 _last_mtimes: dict[str, float] = {}
 
+RETRIEVE_SECONDS = registry.histogram("rag_retrieve_seconds", "retrieve() latency, embedding included")
+BUILD_INDEX_SECONDS = registry.histogram("rag_build_index_seconds", "build_index() duration (load or rebuild)")
+
+def _pdf_mtimes() -> Dict[str, float]:
+    return {pdf.name: pdf.stat().st_mtime for pdf in settings.pdf_folder.glob("*.pdf")}
+
+def _stale(covered: Dict[str, float]) -> bool:
+    """
+    True if a PDF is new or changed since an index covering `covered` was built.
+    """
+    return any(covered.get(name, -1.0) < m for name, m in _pdf_mtimes().items())
+
 def _needs_rebuild() -> bool:
-    rebuild = False
-    for pdf in settings.pdf_folder.glob("*.pdf"):
-        m = pdf.stat().st_mtime
-        if pdf.name not in _last_mtimes or _last_mtimes[pdf.name] < m:
-            _last_mtimes[pdf.name] = m
-            rebuild = True
-    return rebuild
+    """
+    True if a PDF is new or changed since the live index was installed.
+    Only reads; `_record_mtimes` is called when an index goes live.
+    """
+    with _mtime_lock:
+        covered = dict(_last_mtimes)
+    return _stale(covered)
 
-def build_index() -> None:
+def _record_mtimes(mtimes: Dict[str, float]) -> None:
+    with _mtime_lock:
+        _last_mtimes.clear()
+        _last_mtimes.update(mtimes)
+
+def current_index() -> Optional[IndexHandle]:
+    return _handle
+
+def _swap(handle: IndexHandle) -> IndexHandle:
+    global _handle, _generation
+    _handle = handle
+    _generation += 1
+    return handle
+
+@timed(BUILD_INDEX_SECONDS)
+def build_index() -> Optional[IndexHandle]:
     """
-    Load or (re)build the HNSW index of PDF embeddings.
+    Load or (re)build the HNSW index of PDF embeddings and swap it in.
+    Concurrent callers wait for the build in progress and share its result.
     """
-    global _index, _texts
-    docs = load_all_pdf_texts()
-    if not docs:
+    seen = _generation
+    with _build_lock:
+        if _generation != seen and _handle is not None:
+            return _handle
+        return _build()
+
+def _build() -> Optional[IndexHandle]:
+    mtimes = _pdf_mtimes()      # before reading, so a PDF added mid-build still triggers one
+    if not mtimes:
         logger.info("No PDFs to index.")
-        return
+        return _handle
 
     idx_dir = settings.vector_index_dir
     idx_path = idx_dir / INDEX_FILE
     txts_path = idx_dir / TEXTS_FILE
 
-    # Load existing
-    if idx_path.exists() and txts_path.exists() and not _needs_rebuild():
+    # Load existing, if it covers every PDF as it is now (a restart starts with no _last_mtimes)
+    saved = _saved_meta()
+    covered = saved.get("mtimes") or {}
+    if idx_path.exists() and txts_path.exists() and not _stale(covered) and _meta_matches(saved):
         try:
-            _texts = pickle.loads(txts_path.read_bytes())
-            _index = hnswlib.Index(space='l2', dim=EMBED_DIM)
-            _index.load_index(str(idx_path))
-            logger.info("Loaded vector index (%d entries)", _index.get_current_count())
-            return
+            texts = pickle.loads(txts_path.read_bytes())
+            index = hnswlib.Index(space='l2', dim=saved["dim"])
+            index.load_index(str(idx_path))
+            logger.info("Loaded vector index (%d entries)", index.get_current_count())
+            _record_mtimes(covered)
+            b = backend()
+            return _swap(IndexHandle(index, texts, b.name if b else saved["embedder"]))
         except Exception as e:
             logger.warning("Could not load index: %s. Rebuilding.", e)
 
-    # Build new index
-    embs = embed_texts(docs)
+    if backend() is None:
+        # an index of zero vectors would stay live after the backend comes up
+        logger.info("No embedding backend; not building the vector index")
+        return _handle
+    docs = load_all_pdf_texts()
+    if not docs:
+        logger.info("No text in the PDFs to index.")
+        return _handle
+    return _install(index_texts(docs), mtimes)
+
+def _embedder_meta() -> Dict[str, Any]:
+    b = backend()
+    return {"embedder": b.name if b else "none", "dim": embedding_dim()}
+
+def _outdated(handle: IndexHandle) -> bool:
+    """
+    True if the live index was built by another embedder than the current
+    one, e.g. it was loaded before a remote backend came up.
+    """
+    if backend() is None:
+        return False
+    return {"embedder": handle.embedder, "dim": handle.index.dim} != _embedder_meta()
+
+def _saved_meta() -> Dict[str, Any]:
+    """
+    {embedder, dim, mtimes} of the saved index; LEGACY_META (no mtimes, so
+    it is rebuilt once) if it predates the meta file, {} if unreadable.
+    """
+    path = settings.vector_index_dir / META_FILE
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return dict(LEGACY_META)
+    except Exception as e:
+        logger.warning("Could not read %s: %s", path, e)
+        return {}
+
+def _meta_matches(saved: Dict[str, Any]) -> bool:
+    """
+    True if the saved index can be loaded and queried as it is: built by the
+    current embedding backend, at the current width.
+    """
+    embedder, dim = saved.get("embedder"), saved.get("dim")
+    if not embedder or not isinstance(dim, int):
+        return False
+    b = backend()
+    if b is None:
+        # nothing to rebuild with; keep serving what's saved, at its own width
+        return True
+    if embedder == LEGACY_META["embedder"]:
+        # built by the first local SentenceTransformer found, all EMBED_DIM wide
+        same = b.name in {f"local:{repo}" for repo in LOCAL_REPOS}
+    else:
+        same = embedder == b.name
+    if not same or dim != b.dim:
+        logger.warning("Saved index was built with %s (dim %s), backend is %s (dim %d); rebuilding",
+                       embedder, dim, b.name, b.dim)
+        return False
+    return True
+
+def index_texts(
+    docs: List[str],
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    cancelled: Optional[Callable[[], bool]] = None,
+) -> IndexHandle:
+    """
+    Embed `docs` in batches and build an HNSW index over them, without
+    touching the live index. `on_progress(done, total)` runs after each
+    batch; `cancelled()` is polled between batches. Raises RuntimeError if
+    no embedding backend is loaded.
+    """
+    b = backend()
+    if b is None:
+        raise RuntimeError("no embedding backend loaded; refusing to index zero vectors")
+    embs: List[List[float]] = []
+    for start in range(0, len(docs), EMBED_BATCH):
+        if cancelled and cancelled():
+            raise BuildCancelled()
+        embs.extend(embed_texts(docs[start:start + EMBED_BATCH]))
+        if on_progress:
+            on_progress(len(embs), len(docs))
     arr = np.array(embs, dtype="float32")
-    _index = hnswlib.Index(space='l2', dim=arr.shape[1])
-    _index.init_index(max_elements=len(arr), ef_construction=200, M=16)
-    _index.add_items(arr, np.arange(len(arr)))
-    _index.set_ef(50)
-    _texts = docs
+    index = hnswlib.Index(space='l2', dim=arr.shape[1])
+    index.init_index(max_elements=len(arr), ef_construction=200, M=16)
+    index.add_items(arr, np.arange(len(arr)))
+    index.set_ef(50)
+    return IndexHandle(index, docs, b.name)
+
+def install_index(handle: IndexHandle, before_swap: Optional[Callable[[], None]] = None) -> IndexHandle:
+    """
+    Save `handle` and make it the live index. `before_swap` runs under the
+    build lock first (e.g. to move newly ingested PDFs into place), so no
+    reader ever triggers a rebuild for files the new index already covers.
+    """
+    with _build_lock:
+        if before_swap:
+            before_swap()
+        return _install(handle)
 
+def _install(handle: IndexHandle, mtimes: Optional[Dict[str, float]] = None) -> IndexHandle:
+    """
+    Save `handle`, swap it in and record the PDF mtimes it covers (default:
+    the PDFs present now), in memory and in META_FILE for the next process.
+    """
+    idx_dir = settings.vector_index_dir
+    mtimes = _pdf_mtimes() if mtimes is None else mtimes
     try:
-        with open(txts_path, "wb") as f:
-            pickle.dump(_texts, f)
-        _index.save_index(str(idx_path))
-        logger.info("Built and saved vector index (%d chunks)", len(_texts))
+        tmp_txts, tmp_idx = idx_dir / f"{TEXTS_FILE}.tmp", idx_dir / f"{INDEX_FILE}.tmp"
+        tmp_meta = idx_dir / f"{META_FILE}.tmp"
+        with open(tmp_txts, "wb") as f:
+            pickle.dump(handle.texts, f)
+        handle.index.save_index(str(tmp_idx))
+        meta = {"embedder": handle.embedder, "dim": handle.index.dim, "mtimes": mtimes}
+        tmp_meta.write_text(json.dumps(meta))
+        os.replace(tmp_txts, idx_dir / TEXTS_FILE)
+        os.replace(tmp_idx, idx_dir / INDEX_FILE)
+        os.replace(tmp_meta, idx_dir / META_FILE)
+        logger.info("Built and saved vector index (%d chunks)", len(handle.texts))
     except Exception as e:
         logger.exception("Failed to save index: %s", e)
+    _record_mtimes(mtimes)
+    return _swap(handle)
 
-def retrieve(query: str, k: int = 3) -> List[str]:
+def retrieve(query: str, k: int = 3, digests: Optional[bool] = None) -> List[str]:
     """
-    Return the top-k PDF text chunks for `query`, if RAG is enabled.
+    Return the top-k PDF text chunks for `query`, if RAG is enabled. With
+    digests (default: ENABLE_LORE_DIGESTS) each chunk that has a lore digest
+    is returned as the digest instead of its raw text.
     """
     if not settings.enable_rag:
         return []
-    global _index, _texts
-    if _index is None or _needs_rebuild():
-        build_index()
+    handle = _handle
+    if handle is None or _needs_rebuild() or _outdated(handle):
+        handle = build_index()
+    if handle is None:
+        return []
 
     try:
-        q_emb = np.array(embed_texts([query]), dtype="float32")
-        labels, _ = _index.knn_query(q_emb, k=k)
-        return [ _texts[i] for i in labels[0] ]
+        with timer(RETRIEVE_SECONDS):
+            q_emb = np.array(embed_texts([query]), dtype="float32")
+            labels, _ = handle.index.knn_query(q_emb, k=min(k, len(handle.texts)))
+            texts = [handle.texts[i] for i in labels[0]]
+        use_digests = settings.enable_lore_digests if digests is None else digests
+        if use_digests:
+            texts = [digest_store.get(t) or t for t in texts]
+        return texts
     except Exception as e:
         logger.exception("Retrieve error for %r: %s", query, e)
         return []
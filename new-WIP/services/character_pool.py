@@ -0,0 +1,102 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Deque, List
+
+from core.settings import settings
+from services.ollama_client import Priority, ollama_client, request_context
+from services.rag_utils import Character, generate_characters_sync
+
+logger = logging.getLogger(__name__)
+
+POOL_FILE = "character_pool.json"
+REFILL_BATCH = 4
+IDLE_POLL_SECONDS = 2.0
+
+class CharacterPool:
+    """
+    Bounded, disk-persisted queue of validated characters.
+
+    A daemon worker tops the pool up whenever Ollama is idle, so party
+    creation can be served from memory. `take()` never blocks on the LLM;
+    it returns fewer characters than asked for when the pool runs dry.
+    """
+
+    def __init__(self, path: Path, capacity: int):
+        self.path = path
+        self.capacity = capacity
+        self._chars: Deque[Character] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: threading.Thread | None = None
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._chars)
+
+    def take(self, n: int) -> List[Character]:
+        with self._lock:
+            chars = [self._chars.popleft() for _ in range(min(n, len(self._chars)))]
+            self._save()
+        self._wake.set()
+        return chars
+
+    def put(self, chars: List[Character]) -> None:
+        with self._lock:
+            self._chars.extend(chars)
+            self._save()
+
+    def start(self) -> None:
+        """
+        Start the refill worker (idempotent).
+        """
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._refill_loop, name="character-pool", daemon=True)
+            self._worker.start()
+
+    def _refill_loop(self) -> None:
+        while True:
+            missing = self.capacity - len(self._chars)
+            if missing <= 0:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+            if not ollama_client.is_idle():
+                self._wake.wait(IDLE_POLL_SECONDS)
+                self._wake.clear()
+                continue
+            try:
+                with request_context(Priority.BACKGROUND):
+                    chars = generate_characters_sync(min(missing, REFILL_BATCH))
+                self.put(chars)
+                logger.info("Character pool refilled to %d/%d", len(self._chars), self.capacity)
+            except Exception as e:
+                logger.warning("Character pool refill failed: %s", e)
+                self._wake.wait(IDLE_POLL_SECONDS)
+                self._wake.clear()
+
+    def _load(self) -> None:
+        if not self.path.exists():
+            return
+        try:
+            for entry in json.loads(self.path.read_text()):
+                self._chars.append(Character.model_validate(entry))
+            logger.info("Loaded %d pooled characters", len(self._chars))
+        except Exception as e:
+            logger.warning("Could not load character pool %s: %s", self.path, e)
+
+    def _save(self) -> None:
+        data = [c.model_dump(by_alias=True) for c in self._chars]
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
+        except Exception:
+            logger.exception("Failed to persist character pool")
+
+character_pool = CharacterPool(settings.cache_dir / POOL_FILE, settings.character_pool_size)
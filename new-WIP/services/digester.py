@@ -0,0 +1,83 @@
+import logging
+import threading
+from typing import Dict, List
+
+from core.digests import digest_store
+from core.metrics import registry
+from core.settings import settings
+from core.utils import current_index
+from services.ollama_client import Priority, ollama_client, request_context
+from services.rag_utils import generate_digests_sync
+
+logger = logging.getLogger(__name__)
+
+IDLE_POLL_SECONDS = 2.0
+RESCAN_SECONDS = 60.0    # also picks up indexes loaded lazily by retrieve()
+
+DIGESTS_WRITTEN = registry.counter("lore_digests_total", "Lore digests generated")
+
+class LoreDigester:
+    """
+    Background worker that writes a lore digest for every indexed chunk
+    that lacks one.
+
+    Runs at BACKGROUND priority and only while Ollama is idle, `digest_batch`
+    chunks per call. `notify()` after an index swap wakes it early; chunks
+    whose digest fails are left for the next pass rather than retried in a
+    loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker: threading.Thread | None = None
+
+    def start(self) -> None:
+        """
+        Start the worker (idempotent; no-op unless ENABLE_LORE_DIGESTS).
+        """
+        if not settings.enable_lore_digests:
+            return
+        with self._lock:
+            if self._worker and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._loop, name="lore-digester", daemon=True)
+            self._worker.start()
+
+    def notify(self) -> None:
+        self.start()
+        self._wake.set()
+
+    def pending(self) -> int:
+        handle = current_index()
+        return len(digest_store.missing(handle.texts)) if handle else 0
+
+    def _loop(self) -> None:
+        while True:
+            handle = current_index()
+            todo = digest_store.missing(handle.texts) if handle else []
+            if todo:
+                self._digest_pass(todo)
+            digest_store.flush()
+            self._wake.wait(RESCAN_SECONDS)
+            self._wake.clear()
+
+    def _digest_pass(self, todo: List[str]) -> None:
+        logger.info("Digesting %d lore chunks", len(todo))
+        batch = max(1, settings.digest_batch)
+        for start in range(0, len(todo), batch):
+            while not ollama_client.is_idle():
+                self._wake.wait(IDLE_POLL_SECONDS)
+                self._wake.clear()
+            chunks = todo[start:start + batch]
+            try:
+                with request_context(Priority.BACKGROUND):
+                    digests = generate_digests_sync(chunks)
+            except Exception as e:
+                logger.warning("Lore digest batch failed: %s", e)
+                continue
+            done: Dict[str, Dict] = {c: d for c, d in zip(chunks, digests) if d}
+            digest_store.put_many(done)
+            DIGESTS_WRITTEN.inc(len(done))
+
+lore_digester = LoreDigester()
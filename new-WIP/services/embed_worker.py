@@ -0,0 +1,140 @@
+"""
+Shared embedding worker: one embedding model per node, served over a Unix
+socket to every app process with EMBEDDING_BACKEND=worker.
+
+    python -m services.embed_worker [--socket cache/embed.sock] [--backend local|onnx]
+
+Each connection gets a thread; all of them feed one Coalescer, so
+concurrent embed_texts calls from different processes are encoded together
+in batches of up to EMBED_BATCH texts instead of each process loading and
+warming its own model.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from core.embeddings import Coalescer, EmbeddingBackend, make_backend, recv_frame, send_frame
+from core.metrics import registry, start_metrics_server
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+WORKER_REQUESTS = registry.counter("embed_worker_requests_total", "Requests served by the embedding worker")
+
+def _parse_request(frame: bytes) -> List[str]:
+    """
+    A request frame as a list of texts; ValueError for anything else.
+    """
+    try:
+        texts = json.loads(frame)
+    except ValueError as e:     # JSONDecodeError and bad UTF-8 alike
+        raise ValueError(f"request is not JSON: {e}") from None
+    if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+        raise ValueError("request must be a JSON list of strings")
+    return texts
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        server: EmbedWorker = self.server
+        while True:
+            try:
+                frame = recv_frame(self.request)
+            except ValueError as e:
+                # the oversized payload is still in the stream, so reply and hang up
+                WORKER_REQUESTS.inc()
+                logger.warning("Bad request from embedding client: %s", e)
+                self._reply({"error": str(e)}, b"")
+                return
+            except (ConnectionError, OSError):
+                return
+            WORKER_REQUESTS.inc()
+            try:
+                texts = _parse_request(frame)
+            except ValueError as e:
+                logger.warning("Bad request from embedding client: %s", e)
+                header, data = {"error": str(e)}, b""
+            else:
+                try:
+                    vecs = server.encode(texts) if texts else np.zeros((0, server.backend.dim), dtype="float32")
+                    header = {"n": len(vecs), "dim": server.backend.dim, "name": server.backend.name}
+                    data = np.ascontiguousarray(vecs, dtype="float32").tobytes()
+                except Exception as e:
+                    logger.exception("Embedding %d texts failed", len(texts))
+                    header, data = {"error": str(e)}, b""
+            if not self._reply(header, data):
+                return
+
+    def _reply(self, header: Dict[str, Any], data: bytes) -> bool:
+        try:
+            send_frame(self.request, json.dumps(header).encode())
+            send_frame(self.request, data)
+        except OSError:
+            return False
+        return True
+
+class EmbedWorker(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128    # every app thread holds its own connection
+
+    def __init__(self, path: Path, backend: EmbeddingBackend):
+        _claim(path)
+        super().__init__(str(path), _Handler)
+        self.backend = backend
+        self.encode = Coalescer(backend.encode, settings.embed_batch, settings.embed_coalesce_ms / 1000)
+
+    def server_close(self) -> None:
+        super().server_close()
+        Path(self.server_address).unlink(missing_ok=True)
+
+def _claim(path: Path) -> None:
+    """
+    Remove a socket left by a dead worker; refuse if a live one answers.
+    """
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(str(path))
+    except OSError:
+        path.unlink()
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"an embedding worker is already serving {path}")
+
+def serve(path: Optional[Path] = None, backend: Optional[EmbeddingBackend] = None) -> EmbedWorker:
+    """
+    Bind the worker (not yet serving); call serve_forever() on the result.
+    """
+    backend = backend or make_backend("local")
+    worker = EmbedWorker(path or settings.embed_socket, backend)
+    logger.info("Embedding worker on %s (%s, dim %d)", worker.server_address, backend.name, backend.dim)
+    return worker
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--socket", type=Path, default=settings.embed_socket)
+    ap.add_argument("--backend", choices=("local", "onnx"), default="local", help="embedding backend the worker runs")
+    ap.add_argument("--metrics-port", type=int, default=0, help="serve worker metrics; 0 disables")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    start_metrics_server(args.metrics_port)
+    worker = serve(args.socket, make_backend(args.backend))
+    try:
+        worker.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        worker.server_close()
+        logger.info("Embedding worker stopped (pid %d)", os.getpid())
+
+if __name__ == "__main__":
+    main()
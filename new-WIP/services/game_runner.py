@@ -1,56 +1,164 @@
+import contextvars
 import logging
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
 
+from core.journal import SessionJournal
 from core.models import GameState
+from core.profiling import profiled
+from core.rules import RulesState, record_choice
+from core.settings import settings
+from core.story import EventKind, EventLog
+from services.character_pool import character_pool
 from services.rag_utils import (
-    generate_party_sync,
+    Character,
+    generate_characters_sync,
     start_adventure_sync,
     generate_options_sync,
-    dm_turn_sync,
+    dm_turn_response,
+    player_generate_sync,
+    player_prompt,
 )
+from services.speculation import DMSpeculator
 
 logger = logging.getLogger(__name__)
 
+PARTY_SIZE = 4
+
+# Shared across sessions so AI player turns never exceed the server's slots.
+_player_exe = ThreadPoolExecutor(max_workers=settings.ollama_num_parallel, thread_name_prefix="player-turn")
+
 class GameRunner:
-    def __init__(self):
+    def __init__(self, session_id: Optional[str] = None):
         self.party: Dict[str, object] | None = None
         self.state: GameState = GameState()
+        self.speculator: DMSpeculator | None = DMSpeculator() if settings.enable_speculation else None
+        self.journal: SessionJournal | None = (
+            SessionJournal(session_id) if session_id and settings.enable_journal else None
+        )
+        if settings.enable_character_pool:
+            character_pool.start()
+
+    @classmethod
+    def resume(cls, session_id: str) -> Optional["GameRunner"]:
+        """
+        Rebuild a session from its journal (no LLM calls); None if there is none.
+        """
+        if not settings.enable_journal or not SessionJournal.exists(session_id):
+            return None
+        runner = cls(session_id)
+        try:
+            runner.state, party = runner.journal.load()
+            if party:
+                runner.party = {name: Character.model_validate(c) for name, c in party.items()}
+        except Exception as e:
+            logger.warning("Could not resume session %s: %s", session_id, e)
+            return None
+        logger.info("Resumed session %s at turn %d (%s)", session_id, runner.state.turn, runner.state.phase)
+        return runner
 
+    def _checkpoint(self, party_changed: bool = False) -> None:
+        if not self.journal:
+            return
+        party = None
+        if party_changed and self.party:
+            party = {name: c.model_dump(by_alias=True) for name, c in self.party.items()}
+        self.journal.commit(self.state, party)
+
+    @profiled("new_party")
     def new_party(self) -> Dict[str, object]:
-        self.party = generate_party_sync()
-        self.state = GameState(turn=0, phase="start")
+        # Serve from the warm pool first; only the shortfall is generated live.
+        chars = character_pool.take(PARTY_SIZE) if settings.enable_character_pool else []
+        if len(chars) < PARTY_SIZE:
+            logger.info("Character pool short by %d; generating live", PARTY_SIZE - len(chars))
+            chars += generate_characters_sync(PARTY_SIZE - len(chars))
+        self.party = {f"Player {i+1}": c for i, c in enumerate(chars)}
+        self.state = GameState(turn=0, phase="start", rules=RulesState.for_party(self.party))
+        self._checkpoint(party_changed=True)
         logger.info("Party generated: %s", list(self.party.keys()))
         return self.party
 
-    def start_adventure(self) -> GameState:
+    @profiled("start_adventure")
+    def start_adventure(self, on_token: Optional[Callable[[str], None]] = None) -> GameState:
         if not self.party:
             raise RuntimeError("Generate party first.")
-        intro = start_adventure_sync(self.party)
+        intro = start_adventure_sync(self.party, on_token)
         self.state.turn = 1
         self.state.phase = "intro"
         self.state.intro_text = intro
-        self.state.story = [intro]
+        self.state.story = EventLog()
+        self.state.story.append(1, "DM", EventKind.INTRO, intro)
+        self._checkpoint()
         return self.state
 
+    @profiled("request_options")
     def request_options(self) -> GameState:
         if self.state.phase not in ("intro", "dm_response"):
             raise RuntimeError("Cannot request options now.")
         opts = generate_options_sync(self.state.__dict__)
         self.state.current_options = opts
         self.state.phase = "choice"
+        self._checkpoint()
+        # AI party turns land between the choice and the DM, so branches can't be predicted
+        if self.speculator and not settings.enable_ai_party:
+            self.speculator.start(self.state.__dict__, opts)
         return self.state
 
     def process_player_choice(self, idx: int) -> GameState:
         opts = self.state.current_options
         choice = opts[idx]
         self.state.last_choice = choice
-        self.state.story.append(f"Player: {choice}")
+        record_choice(self.state.story, self.state.rules, self.state.turn, choice)
         self.state.phase = "dm_response"
         return self.state
 
-    def run_dm_turn(self) -> GameState:
-        dm_text = dm_turn_sync(self.state.__dict__)
-        self.state.story.append(f"DM: {dm_text}")
+    @profiled("run_party_round")
+    def run_party_round(self) -> GameState:
+        """
+        Run every AI party member's turn concurrently. Retrieval for the next
+        player happens while earlier players are generating; actions are
+        appended in party order once all are done.
+        """
+        if not self.party:
+            raise RuntimeError("Generate party first.")
+        snapshot = dict(self.state.__dict__, story=self.state.story.fork())
+        futures = [
+            (name, _player_exe.submit(
+                contextvars.copy_context().run, player_generate_sync, player_prompt(snapshot, name, info)
+            ))
+            for name, info in self.party.items()
+        ]
+        for name, fut in futures:
+            try:
+                self.state.story.append(self.state.turn, name, EventKind.ACTION, fut.result())
+            except Exception as e:
+                logger.warning("Player turn for %s failed: %s", name, e)
+        return self.state
+
+    @profiled("run_dm_turn")
+    def run_dm_turn(self, on_token: Optional[Callable[[str], None]] = None) -> GameState:
+        resp = None
+        if self.speculator:
+            resp = self.speculator.commit(self.state.__dict__, self.state.last_choice)
+            if resp is not None and on_token:
+                on_token(resp.response)
+        if resp is None:
+            resp = dm_turn_response(self.state.__dict__, on_token)
+        dm_text = getattr(resp, "response", "").strip()
+        self.state.story.append(
+            self.state.turn, "DM", EventKind.NARRATION, dm_text, getattr(resp, "eval_count", None) or None,
+        )
         self.state.turn += 1
+        # the choice, party actions and DM reply land as one journal entry
+        self._checkpoint()
         # stay in dm_response until UI moves back to request_options()
         return self.state
+
+    def play_turn(self, idx: int, on_token: Optional[Callable[[str], None]] = None) -> GameState:
+        """
+        Full turn after the player picks option `idx`: AI party (if enabled), then DM.
+        """
+        self.process_player_choice(idx)
+        if settings.enable_ai_party:
+            self.run_party_round()
+        return self.run_dm_turn(on_token)
@@ -0,0 +1,196 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Literal, Optional, Tuple
+
+from core.metrics import registry
+from core.pdf_utils import list_pdfs, load_pdf_texts
+from core.settings import settings
+from core.utils import BuildCancelled, index_texts, install_index
+from services.digester import lore_digester
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "manifest.json"
+INCOMING_DIR = "incoming"
+
+INGEST_SECONDS = registry.histogram("ingest_job_seconds", "PDF ingestion job duration")
+INGEST_SKIPPED = registry.counter("ingest_skipped_total", "Uploaded PDFs skipped as unchanged")
+
+@dataclass
+class IngestJob:
+    """
+    One background index rebuild covering a batch of uploaded PDFs.
+    """
+    id: str
+    files: Dict[str, str] = field(default_factory=dict)    # name → sha256
+    status: Literal["queued", "running", "done", "cancelled", "error"] = "queued"
+    stage: str = "queued"
+    done: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "cancelled", "error")
+
+    @property
+    def progress(self) -> float:
+        return self.done / self.total if self.total else 0.0
+
+class IngestService:
+    """
+    Hashes uploads, skips ones already indexed, and rebuilds the index on a
+    single background worker.
+
+    New files are staged under cache_dir until their job finishes; they are
+    moved into pdf_folder and the new index is swapped in under the index
+    build lock, so retrieval keeps serving the old index meanwhile and never
+    starts a rebuild of its own. Uploads arriving while a job is still
+    queued are folded into it.
+    """
+
+    def __init__(self):
+        self._exe = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, IngestJob] = {}
+        self._manifest_path = settings.vector_index_dir / MANIFEST_FILE
+        self._manifest: Dict[str, str] = self._load_manifest()
+
+    def jobs(self) -> List[IngestJob]:
+        return sorted(self._jobs.values(), key=lambda j: j.submitted_at)
+
+    def active(self) -> List[IngestJob]:
+        return [j for j in self.jobs() if not j.finished]
+
+    def submit(self, uploads: List[Tuple[str, bytes]]) -> Optional[IngestJob]:
+        """
+        Stage the uploads that are new or changed; returns the job that will
+        index them, or None when every file is already indexed or pending.
+        """
+        with self._lock:
+            known = set(self._manifest.values())
+            for job in self._jobs.values():
+                if not job.finished:
+                    known.update(job.files.values())
+            fresh: Dict[str, Tuple[str, bytes]] = {}
+            for name, data in uploads:
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in known:
+                    INGEST_SKIPPED.inc()
+                    continue
+                known.add(digest)
+                fresh[Path(name).name] = (digest, data)
+            if not fresh:
+                return None
+            job = next((j for j in self._jobs.values() if j.status == "queued"), None)
+            new_job = job is None
+            if new_job:
+                job = IngestJob(id=uuid.uuid4().hex[:8])
+                self._jobs[job.id] = job
+            staging = self._staging(job)
+            staging.mkdir(parents=True, exist_ok=True)
+            for name, (digest, data) in fresh.items():
+                (staging / name).write_bytes(data)
+                job.files[name] = digest
+        if new_job:
+            self._exe.submit(self._run, job)
+        logger.info("Ingest job %s: %d new PDFs", job.id, len(fresh))
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        return True
+
+    def _staging(self, job: IngestJob) -> Path:
+        return settings.cache_dir / INCOMING_DIR / job.id
+
+    def _run(self, job: IngestJob) -> None:
+        t0 = time.perf_counter()
+        with self._lock:
+            job.status = "running"      # closes the job to new uploads
+            staged = [self._staging(job) / name for name in job.files]
+        try:
+            if job.cancel_event.is_set():
+                raise BuildCancelled()
+            existing = [p for p in list_pdfs() if p.name not in job.files]
+            files = existing + staged
+            self._stage(job, "extracting", 0, len(files))
+            docs = load_pdf_texts(files, on_file=lambda _p: self._advance(job))
+            if job.cancel_event.is_set():
+                raise BuildCancelled()
+            if not docs:
+                raise ValueError("no text could be extracted from the PDFs")
+            self._stage(job, "embedding", 0, len(docs))
+            handle = index_texts(
+                docs,
+                on_progress=lambda done, total: self._stage(job, "embedding", done, total),
+                cancelled=job.cancel_event.is_set,
+            )
+            self._stage(job, "swapping", 0, 1)
+            install_index(handle, before_swap=lambda: self._publish(job, staged))
+            self._finish(job, "done")
+            lore_digester.notify()
+            logger.info("Ingest job %s indexed %d chunks from %d PDFs", job.id, len(docs), len(files))
+        except BuildCancelled:
+            self._finish(job, "cancelled")
+            logger.info("Ingest job %s cancelled", job.id)
+        except Exception as e:
+            logger.exception("Ingest job %s failed", job.id)
+            self._finish(job, "error", str(e))
+        finally:
+            shutil.rmtree(self._staging(job), ignore_errors=True)
+            INGEST_SECONDS.observe(time.perf_counter() - t0)
+
+    def _finish(self, job: IngestJob, status: str, error: Optional[str] = None) -> None:
+        # finished_at first: readers treat a terminal status as having one
+        job.finished_at = time.time()
+        job.error = error
+        job.status, job.stage = status, status
+
+    def _stage(self, job: IngestJob, stage: str, done: int, total: int) -> None:
+        job.stage, job.done, job.total = stage, done, total
+
+    def _advance(self, job: IngestJob) -> None:
+        job.done += 1
+
+    def _publish(self, job: IngestJob, staged: List[Path]) -> None:
+        settings.pdf_folder.mkdir(parents=True, exist_ok=True)
+        for path in staged:
+            shutil.move(str(path), settings.pdf_folder / path.name)
+        with self._lock:
+            self._manifest.update(job.files)
+            self._save_manifest()
+
+    def _load_manifest(self) -> Dict[str, str]:
+        try:
+            return json.loads(self._manifest_path.read_text())
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.warning("Could not read ingest manifest %s: %s", self._manifest_path, e)
+            return {}
+
+    def _save_manifest(self) -> None:
+        tmp = self._manifest_path.with_suffix(".tmp")
+        try:
+            tmp.write_text(json.dumps(self._manifest, indent=2))
+            os.replace(tmp, self._manifest_path)
+        except Exception:
+            logger.exception("Failed to persist ingest manifest")
+
+ingest_service = IngestService()
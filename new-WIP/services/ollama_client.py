@@ -1,47 +1,467 @@
 import logging
-from typing import Any, Dict, List
-from requests.exceptions import ConnectionError
-from tenacity import retry, wait_exponential, stop_after_attempt, retry_if_exception_type
-from ollama import (
-    chat as ollama_chat,
-    generate as ollama_generate,
-    embed as ollama_embed,
-    list as ollama_list_models,
-    show as ollama_show,
-    pull as ollama_pull,
-    push as ollama_push,
-    create as ollama_create,
-    copy as ollama_copy,
-    delete as ollama_delete,
-    ps as ollama_ps,
-)
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import Any, Callable, Deque, Dict, Iterator, List, Literal, Optional, Set, Tuple
+import httpx
+from requests.exceptions import ConnectionError as RequestsConnectionError
+from tenacity import RetryCallState, retry, wait_exponential, stop_after_attempt, retry_if_exception_type
+from ollama import Client
 from ollama._types import ResponseError
+import numpy as np
+from core.embeddings import Coalescer, EmbeddingBackend, register_backend
+from core.metrics import RATE_BUCKETS, registry
 from core.settings import settings
 
 logger = logging.getLogger(__name__)
 
+# Errors that mean "this host is unreachable" rather than "bad request".
+# ollama raises the builtin ConnectionError; streams surface raw httpx errors.
+_HOST_ERRORS = (ConnectionError, RequestsConnectionError, httpx.TransportError)
+
+# ——— Instrumentation ———————————————————————————————————
+
+NS = 1e9
+
+LLM_REQUEST = registry.histogram("llm_request_seconds", "Wall time of an Ollama call, including queueing")
+LLM_TTFT = registry.histogram("llm_ttft_seconds", "Time to first token")
+LLM_LOAD = registry.histogram("llm_load_seconds", "Model load time reported by Ollama")
+LLM_PROMPT_EVAL = registry.histogram("llm_prompt_eval_seconds", "Prompt evaluation time reported by Ollama")
+LLM_TPS = registry.histogram("llm_tokens_per_second", "Generation throughput", RATE_BUCKETS)
+LLM_TOKENS = registry.counter("llm_tokens_total", "Prompt and generated tokens")
+LLM_RETRIES = registry.counter("llm_retries_total", "Retried Ollama calls")
+
+def _observe(call: str, resp: Any, elapsed: float, ttft: Optional[float] = None, chunks: int = 0) -> None:
+    """
+    Record wall time plus Ollama's own timings/counts for one call. Streams
+    closed early have no final stats; their chunk count stands in for tokens.
+    """
+    LLM_REQUEST.observe(elapsed, call=call)
+    load = getattr(resp, "load_duration", None) or 0
+    prompt_eval = getattr(resp, "prompt_eval_duration", None) or 0
+    eval_dur = getattr(resp, "eval_duration", None) or 0
+    eval_count = getattr(resp, "eval_count", None) or chunks
+    if ttft is None and (load or prompt_eval):
+        ttft = (load + prompt_eval) / NS
+    if ttft is not None:
+        LLM_TTFT.observe(ttft, call=call)
+    if load:
+        LLM_LOAD.observe(load / NS, call=call)
+    if prompt_eval:
+        LLM_PROMPT_EVAL.observe(prompt_eval / NS, call=call)
+    if eval_count and eval_dur:
+        LLM_TPS.observe(eval_count / (eval_dur / NS), call=call)
+    LLM_TOKENS.inc(getattr(resp, "prompt_eval_count", None) or 0, call=call, kind="prompt")
+    LLM_TOKENS.inc(eval_count, call=call, kind="eval")
+
+def _count_retry(retry_state: RetryCallState) -> None:
+    err = retry_state.outcome.exception() if retry_state.outcome else None
+    # call sites name themselves with call=; otherwise label by method (chat, embed, ...)
+    call = retry_state.kwargs.get("call") or retry_state.fn.__name__
+    LLM_RETRIES.inc(call=call, reason=type(err).__name__)
+
+STREAM_ATTEMPTS = 3
+PULL_POLL_SECONDS = 0.5
+
 _retry = retry(
-    retry=retry_if_exception_type((ResponseError, ConnectionError)),
+    retry=retry_if_exception_type((ResponseError,) + _HOST_ERRORS),
     wait=wait_exponential(min=1, max=5),
     stop=stop_after_attempt(3),
+    before_sleep=_count_retry,
     reraise=True,
 )
 
+# ——— Request scheduling ————————————————————————————————
+
+class Priority(IntEnum):
+    INTERACTIVE = 0   # a player is waiting on this
+    BACKGROUND = 1    # pool refills, digests, summaries
+    SPECULATIVE = 2   # may be thrown away
+
+class SchedulerBusy(RuntimeError):
+    """Raised when a request is shed instead of queued."""
+
+class ModelUnavailable(RuntimeError):
+    """Raised when the model is missing on a host and is being pulled in the background."""
+
+_request_ctx: ContextVar[Tuple[Priority, str]] = ContextVar(
+    "ollama_request", default=(Priority.INTERACTIVE, "")
+)
+
+@contextmanager
+def request_context(priority: Priority = Priority.INTERACTIVE, session: str = ""):
+    """
+    Tag every Ollama call made inside the block with a priority and session.
+    Thread pools don't inherit context; wrap the submitted callable instead.
+    """
+    token = _request_ctx.set((priority, session))
+    try:
+        yield
+    finally:
+        _request_ctx.reset(token)
+
+MAX_MODEL_BATCH = 8
+
+class _Ticket:
+    __slots__ = ("model", "granted", "shed")
+
+    def __init__(self, model: str):
+        self.model = model
+        self.granted = False
+        self.shed = False
+
+class RequestScheduler:
+    """
+    Admission control in front of one Ollama backend.
+
+    At most `max_in_flight` requests run at once. Waiting requests are served
+    by priority, round-robin across sessions within a priority, except that
+    requests for the model that ran last are preferred (up to
+    `MAX_MODEL_BATCH` in a row) so one model's batch runs before the server
+    swaps weights. The queue is
+    bounded: a full queue sheds the lowest-priority waiter to make room, and
+    non-interactive work is refused outright when its estimated wait exceeds
+    `shed_after` seconds.
+    """
+
+    def __init__(self, max_in_flight: int, max_queue: int, shed_after: float):
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.shed_after = shed_after
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._queues: Dict[Priority, "OrderedDict[str, Deque[_Ticket]]"] = {p: OrderedDict() for p in Priority}
+        self._service_time = 2.0  # EWMA seconds per request
+        self._last_model = ""
+        self._model_run = 0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def idle(self) -> bool:
+        return self._in_flight == 0 and self._queued == 0
+
+    def estimated_wait(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        """
+        Seconds a new request at `priority` would wait for a slot.
+        """
+        ahead = sum(len(q) for p in Priority if p <= priority for q in self._queues[p].values())
+        backlog = max(0, self._in_flight + ahead + 1 - self.max_in_flight)
+        return backlog * self._service_time / self.max_in_flight
+
+    @contextmanager
+    def slot(self, model: str = ""):
+        priority, session = _request_ctx.get()
+        self._acquire(priority, session, model)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(time.monotonic() - start)
+
+    def _acquire(self, priority: Priority, session: str, model: str) -> None:
+        with self._cond:
+            if priority > Priority.INTERACTIVE and self.estimated_wait(priority) > self.shed_after:
+                raise SchedulerBusy(f"shed {priority.name.lower()} request (est. wait {self.estimated_wait(priority):.0f}s)")
+            if self._queued >= self.max_queue and not self._shed_lowest(below=priority):
+                raise SchedulerBusy("request queue full")
+            ticket = _Ticket(model)
+            self._queues[priority].setdefault(session, deque()).append(ticket)
+            self._queued += 1
+            self._dispatch()
+            while not (ticket.granted or ticket.shed):
+                self._cond.wait()
+            if ticket.shed:
+                raise SchedulerBusy("request shed for higher-priority work")
+
+    def _release(self, elapsed: float) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._service_time = 0.8 * self._service_time + 0.2 * elapsed
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        granted = False
+        while self._in_flight < self.max_in_flight and self._queued:
+            ticket = self._pop_next()
+            ticket.granted = True
+            self._in_flight += 1
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def _pop_next(self) -> _Ticket:
+        for p in Priority:
+            sessions = self._queues[p]
+            if not sessions:
+                continue
+            session = next(iter(sessions))
+            if self._model_run < MAX_MODEL_BATCH:
+                # keep the resident model busy before switching to another one
+                session = next((s for s, q in sessions.items() if q[0].model == self._last_model), session)
+            tickets = sessions[session]
+            ticket = tickets.popleft()
+            if tickets:
+                sessions.move_to_end(session)   # round-robin between sessions
+            else:
+                del sessions[session]
+            self._queued -= 1
+            if ticket.model == self._last_model:
+                self._model_run += 1
+            else:
+                self._last_model, self._model_run = ticket.model, 1
+            return ticket
+        raise RuntimeError("dispatch with empty queue")
+
+    def _shed_lowest(self, below: Priority) -> bool:
+        for p in reversed(Priority):
+            if p <= below:
+                return False
+            sessions = self._queues[p]
+            if not sessions:
+                continue
+            session = next(reversed(sessions))
+            tickets = sessions[session]
+            tickets.pop().shed = True
+            if not tickets:
+                del sessions[session]
+            self._queued -= 1
+            self._cond.notify_all()
+            return True
+        return False
+
+# ——— Background pulls ——————————————————————————————————
+
+@dataclass
+class PullJob:
+    model: str
+    host: str
+    status: Literal["pulling", "done", "error"] = "pulling"
+    completed: int = 0
+    total: int = 0
+    error: Optional[str] = None
+
+    @property
+    def progress(self) -> float:
+        return self.completed / self.total if self.total else 0.0
+
+# ——— Host pool —————————————————————————————————————————
+
+class _Host:
+    """
+    One Ollama server: a persistent client, its own scheduler and health state.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.client = Client(host=url)
+        self.scheduler = RequestScheduler(
+            max_in_flight=settings.ollama_num_parallel,
+            max_queue=settings.scheduler_max_queue,
+            shed_after=settings.scheduler_shed_after,
+        )
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.resident: Set[str] = set()   # models loaded according to ps()
+
+    @property
+    def load(self) -> int:
+        return self.scheduler.in_flight + self.scheduler.queued
+
+    def available(self, now: float) -> bool:
+        return self.healthy or now >= self.ejected_until
+
+# ——— Client ————————————————————————————————————————————
+
 class OllamaClient:
     """
     Thin wrapper around Ollama’s HTTP API—separates chat vs generate.
+
+    Requests are routed across a pool of hosts (OLLAMA_HOSTS, else
+    OLLAMA_HOST): hosts that already have the model resident win, then the
+    one with the fewest requests in flight. Unreachable hosts are ejected for
+    a cooldown; a background thread polls ps() to track health and loaded
+    models. Chat/generate calls go through the chosen host's scheduler.
     """
 
-    @_retry
-    def chat(self, messages: List[Dict[str, Any]], stream: bool=False) -> Any:
+    def __init__(self, hosts: Optional[List[str]] = None):
+        urls = hosts or settings.ollama_hosts or [str(settings.ollama_host)]
+        self.hosts = [_Host(u.rstrip("/")) for u in urls]
+        self._monitor: threading.Thread | None = None
+        self._monitor_lock = threading.Lock()
+        self.pulls: Dict[Tuple[str, str], PullJob] = {}
+
+    @property
+    def in_flight(self) -> int:
+        """Number of chat/generate calls currently running across all hosts."""
+        return sum(h.scheduler.in_flight for h in self.hosts)
+
+    def is_idle(self) -> bool:
+        return all(h.scheduler.idle() for h in self.hosts)
+
+    def estimated_wait(self, priority: Priority = Priority.INTERACTIVE) -> float:
+        return min(h.scheduler.estimated_wait(priority) for h in self._available())
+
+    # ——— routing / health ———
+
+    def _available(self) -> List[_Host]:
+        now = time.monotonic()
+        # if every host is ejected, try them all rather than fail outright
+        return [h for h in self.hosts if h.available(now)] or self.hosts
+
+    def _pick(self, model: str) -> _Host:
+        self._ensure_monitor()
+        return min(self._available(), key=lambda h: (model not in h.resident, h.load))
+
+    def _eject(self, host: _Host, err: Exception) -> None:
+        if host.healthy:
+            logger.warning("Ollama host %s unreachable (%s); ejecting for %.0fs",
+                           host.url, err, settings.ollama_host_cooldown)
+        host.healthy = False
+        host.ejected_until = time.monotonic() + settings.ollama_host_cooldown
+
+    @contextmanager
+    def _routed(self, model: str, scheduled: bool = True):
+        host = self._pick(model)
+        slot = host.scheduler.slot(model) if scheduled else nullcontext()
+        with slot:
+            try:
+                yield host
+            except _HOST_ERRORS as e:
+                self._eject(host, e)
+                raise
+        host.healthy = True
+        if scheduled:
+            # only generate/chat load `model`; embeds and the like say nothing about residency
+            host.resident.add(model)
+
+    def _stream(self, model: str, call: str, start: Callable[[Client], Iterator[Any]]) -> Iterator[Any]:
+        # Streams open lazily, so hold the slot until drained or closed.
+        # Failures before the first chunk are retried (on another host if
+        # this one was ejected); after that, a retry would duplicate output.
+        t0 = time.perf_counter()
+        ttft, chunks, last = None, 0, None
         try:
-            return ollama_chat(model=settings.ollama_model, messages=messages, stream=stream)
-        except ResponseError as e:
-            if e.status_code == 404:
-                logger.warning("Model not found, pulling...")
-                ollama_pull(model=settings.ollama_model)
-                return ollama_chat(model=settings.ollama_model, messages=messages, stream=stream)
-            raise
+            for attempt in range(1, STREAM_ATTEMPTS + 1):
+                try:
+                    with self._routed(model) as host:
+                        try:
+                            for chunk in start(host.client):
+                                if ttft is None:
+                                    ttft = time.perf_counter() - t0
+                                chunks += 1
+                                last = chunk
+                                yield chunk
+                        except ResponseError as e:
+                            if e.status_code == 404:
+                                raise self._missing(host, model) from e
+                            raise
+                    return
+                except (ResponseError,) + _HOST_ERRORS as e:
+                    if chunks or attempt == STREAM_ATTEMPTS:
+                        raise
+                    LLM_RETRIES.inc(call=call, reason=type(e).__name__)
+                    time.sleep(min(2 ** (attempt - 1), 5))
+        finally:
+            if chunks:
+                _observe(call, last, time.perf_counter() - t0, ttft, chunks)
+
+    def pull_in_background(self, model: str, host: Optional[_Host] = None) -> List[PullJob]:
+        """
+        Start (or return the running) pull of `model` on `host`, or on every
+        host. Progress is tracked in `self.pulls`; nothing blocks on it.
+        """
+        jobs = []
+        for h in [host] if host else self.hosts:
+            with self._monitor_lock:
+                job = self.pulls.get((h.url, model))
+                if job is None or job.status == "error":
+                    job = self.pulls[(h.url, model)] = PullJob(model=model, host=h.url)
+                    threading.Thread(target=self._run_pull, args=(h, job), name=f"pull-{model}", daemon=True).start()
+            jobs.append(job)
+        return jobs
+
+    def _run_pull(self, host: _Host, job: PullJob) -> None:
+        try:
+            for part in host.client.pull(job.model, stream=True):
+                job.completed = getattr(part, "completed", None) or job.completed
+                job.total = getattr(part, "total", None) or job.total
+            job.status = "done"
+            logger.info("Pulled %s on %s", job.model, host.url)
+        except Exception as e:
+            job.error = str(e)
+            job.status = "error"
+            logger.warning("Pull of %s on %s failed: %s", job.model, host.url, e)
+
+    def _missing(self, host: _Host, model: str) -> ModelUnavailable:
+        job = self.pull_in_background(model, host)[0]
+        logger.warning("Model %s not found on %s; pulling in background", model, host.url)
+        return ModelUnavailable(f"Model {model} is being downloaded ({job.progress:.0%}); try again shortly.")
+
+    def check_health(self) -> None:
+        """
+        Poll every host once: refresh resident models, eject or restore.
+        """
+        for host in self.hosts:
+            try:
+                resp = host.client.ps()
+            except Exception as e:
+                self._eject(host, e)
+                continue
+            host.resident = {m.model for m in resp.models if m.model}
+            if not host.healthy:
+                logger.info("Ollama host %s is back", host.url)
+            host.healthy = True
+
+    def _ensure_monitor(self) -> None:
+        if self._monitor or settings.ollama_health_interval <= 0:
+            return
+        with self._monitor_lock:
+            if self._monitor:
+                return
+            self._monitor = threading.Thread(target=self._monitor_loop, name="ollama-health", daemon=True)
+            self._monitor.start()
+
+    def _monitor_loop(self) -> None:
+        while True:
+            self.check_health()
+            time.sleep(settings.ollama_health_interval)
+
+    # ——— inference ———
+
+    @_retry
+    def chat(
+        self,
+        messages: List[Dict[str, Any]],
+        stream: bool=False,
+        model: Optional[str]=None,
+        keep_alive: Any=None,
+        call: str="chat",
+    ) -> Any:
+        model = model or settings.ollama_model
+        kwargs = dict(model=model, messages=messages, keep_alive=keep_alive)
+        if stream:
+            return self._stream(model, call, lambda c: c.chat(stream=True, **kwargs))
+        t0 = time.perf_counter()
+        with self._routed(model) as host:
+            try:
+                resp = host.client.chat(**kwargs)
+            except ResponseError as e:
+                if e.status_code == 404:
+                    raise self._missing(host, model) from e
+                raise
+        _observe(call, resp, time.perf_counter() - t0)
+        return resp
 
     @_retry
     def generate(
@@ -51,54 +471,118 @@ class OllamaClient:
         max_tokens: int=150,
         temperature: float=0.8,
         stream: bool=False,
+        format: Any=None,
+        model: Optional[str]=None,
+        keep_alive: Any=None,
+        call: str="generate",
     ) -> Any:
-        opts = {"temperature": temperature, "num_predict": max_tokens}
-        try:
-            return ollama_generate(
-                model=settings.ollama_model,
-                prompt=prompt,
-                suffix=suffix,
-                options=opts,
-                stream=stream,
-            )
-        except ResponseError as e:
-            if e.status_code == 404:
-                logger.warning("Model not found, pulling...")
-                ollama_pull(model=settings.ollama_model)
-                return ollama_generate(
-                    model=settings.ollama_model,
-                    prompt=prompt,
-                    suffix=suffix,
-                    options=opts,
-                    stream=stream,
-                )
-            raise
-
-    def embed(self, inputs: List[str]) -> Any:
-        return ollama_embed(model=settings.ollama_model, input=inputs)
+        """
+        `format` is passed straight to Ollama: "json" or a JSON schema dict
+        constrains decoding so the response always parses. `model` and
+        `keep_alive` default to OLLAMA_MODEL and the server's own setting.
+        `call` labels the metrics (character, intro, dm, options, player).
+        """
+        model = model or settings.ollama_model
+        kwargs = dict(
+            model=model,
+            prompt=prompt,
+            suffix=suffix,
+            options={"temperature": temperature, "num_predict": max_tokens},
+            format=format,
+            keep_alive=keep_alive,
+        )
+        if stream:
+            # Errors surface while iterating; callers handle them per chunk.
+            return self._stream(model, call, lambda c: c.generate(stream=True, **kwargs))
+        t0 = time.perf_counter()
+        with self._routed(model) as host:
+            try:
+                resp = host.client.generate(**kwargs)
+            except ResponseError as e:
+                if e.status_code == 404:
+                    raise self._missing(host, model) from e
+                raise
+        _observe(call, resp, time.perf_counter() - t0)
+        return resp
+
+    @_retry
+    def embed(self, inputs: List[str], model: Optional[str] = None) -> Any:
+        """
+        Batched /api/embed; `model` defaults to EMBEDDING_MODEL. Embeddings
+        bypass the generation scheduler, they are short and don't hold a slot.
+        """
+        model = model or settings.embedding_model
+        with self._routed(model, scheduled=False) as host:
+            try:
+                return host.client.embed(model=model, input=inputs)
+            except ResponseError as e:
+                if e.status_code == 404:
+                    raise self._missing(host, model) from e
+                raise
+
+    # ——— model management (first host, except pull which fans out) ———
+
+    @property
+    def _primary(self) -> Client:
+        return self._available()[0].client
 
     def list_models(self) -> Any:
-        return ollama_list_models()
+        return self._primary.list()
 
     def show(self, model: str) -> Any:
-        return ollama_show(model)
+        return self._primary.show(model)
 
-    def pull(self, model: str) -> Any:
-        return ollama_pull(model, stream=True)
+    def pull(self, model: str) -> Iterator[List[PullJob]]:
+        """
+        Pull `model` on every host in parallel; yields the jobs every
+        PULL_POLL_SECONDS until all of them have finished.
+        """
+        jobs = self.pull_in_background(model)
+        while True:
+            yield jobs
+            if all(job.status != "pulling" for job in jobs):
+                return
+            time.sleep(PULL_POLL_SECONDS)
 
     def push(self, model: str) -> Any:
-        return ollama_push(model, insecure=True, stream=True)
+        return self._primary.push(model, insecure=True, stream=True)
 
     def create(self, **kwargs: Any) -> Any:
-        return ollama_create(**kwargs)
+        return self._primary.create(**kwargs)
 
     def copy(self, src: str, dst: str) -> Any:
-        return ollama_copy(src, dst)
+        return self._primary.copy(src, dst)
 
     def delete(self, model: str) -> Any:
-        return ollama_delete(model)
+        return self._primary.delete(model)
 
     def ps(self) -> Any:
-        return ollama_ps()
+        return self._primary.ps()
 
 ollama_client = OllamaClient()
+
+# ——— Embedding backend —————————————————————————————————
+
+class OllamaEmbedder(EmbeddingBackend):
+    """
+    EMBEDDING_BACKEND=ollama: EMBEDDING_MODEL served by Ollama. Concurrent
+    embed_texts calls are coalesced into one /api/embed request of up to
+    EMBED_BATCH texts, so the app process never loads torch.
+    """
+
+    def __init__(self):
+        self.name = f"ollama:{settings.embedding_model}"
+        self._coalesce = Coalescer(self._embed, settings.embed_batch, settings.embed_coalesce_ms / 1000)
+        self.dim = len(self._embed(["dimension probe"])[0])
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        out = []
+        for start in range(0, len(texts), settings.embed_batch):
+            resp = ollama_client.embed(texts[start:start + settings.embed_batch])
+            out.extend(resp["embeddings"])
+        return np.asarray(out, dtype="float32")
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self._coalesce(texts)
+
+register_backend("ollama", OllamaEmbedder)
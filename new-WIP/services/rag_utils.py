@@ -1,13 +1,16 @@
 import json
 import logging
 import re
-from typing import Dict, List
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional
 
 from pydantic import BaseModel, Field, ValidationError
-from tenacity import retry, stop_after_attempt, wait_fixed
+from tenacity import RetryCallState, retry, retry_if_exception_type, stop_after_attempt, wait_fixed
 
+from core.json_stream import JsonStreamParser
 from core.utils import retrieve, last_sentences
-from services.ollama_client import ollama_client
+from services.ollama_client import LLM_RETRIES, ollama_client
+from services.residency import role_options
 from core.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -24,13 +27,105 @@ class Character(BaseModel):
 
     model_config = {"populate_by_name": True}
 
+CHARACTER_SCHEMA = Character.model_json_schema(by_alias=True)
+
+OPTIONS_SCHEMA = {
+    "type": "array",
+    "items": {"type": "string"},
+    "minItems": 3,
+    "maxItems": 3,
+}
+
+# ——— Retry counters ————————————————————————————————————
+
+# Calls/retries/fallbacks per structured generation; calls / successes is the
+# number of LLM requests we pay per character.
+generation_stats: Counter = Counter()
+
+def _count_retry(retry_state: RetryCallState) -> None:
+    generation_stats["character_retries"] += 1
+    LLM_RETRIES.inc(call="character", reason="parse")
+
+def party_schema(n: int) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "characters": {
+                "type": "array",
+                "items": CHARACTER_SCHEMA,
+                "minItems": n,
+                "maxItems": n,
+            },
+        },
+        "required": ["characters"],
+    }
+
+def digest_schema(n: int) -> Dict[str, Any]:
+    return {
+        "type": "object",
+        "properties": {
+            "digests": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "summary": {"type": "string"},
+                        "entities": {"type": "array", "items": {"type": "string"}, "maxItems": 6},
+                    },
+                    "required": ["summary", "entities"],
+                },
+                "minItems": n,
+                "maxItems": n,
+            },
+        },
+        "required": ["digests"],
+    }
+
 # ——— JSON extraction ——————————————————————————————————
 
-def _extract_json(raw: str) -> str:
-    # Strip fences (case-insensitive), then grab first {...} non-greedily
+def _extract_json(raw: str, openers: str = "{[") -> str:
+    """
+    Return the first balanced JSON object/array in `raw` (fences and chatter
+    around it are ignored). Brackets inside strings are skipped, so nested
+    objects survive. Falls back to the stripped input if nothing balances.
+    """
     cleaned = re.sub(r"```(?:json)?\s*", "", raw.strip(), flags=re.IGNORECASE)
-    m = re.search(r"\{.*?\}", cleaned, flags=re.DOTALL)
-    return m.group(0) if m else cleaned
+    parser = JsonStreamParser(openers)
+    parser.feed(cleaned)
+    return parser.text if parser.started else cleaned
+
+def _generate_json(
+    prompt: str,
+    schema: Dict[str, Any],
+    max_tokens: int,
+    temperature: float,
+    openers: str = "{[",
+    role: str = "dm",
+    call: str = "generate",
+) -> str:
+    """
+    Stream a schema-constrained generation and hang up as soon as the first
+    top-level JSON value is complete; trailing tokens are never generated.
+    """
+    parser = JsonStreamParser(openers)
+    stream = ollama_client.generate(
+        prompt=prompt,
+        max_tokens=max_tokens,
+        temperature=temperature,
+        stream=True,
+        format=schema,
+        call=call,
+        **role_options(role),
+    )
+    try:
+        for chunk in stream:
+            if parser.feed(getattr(chunk, "response", "") or ""):
+                if not getattr(chunk, "done", False):
+                    generation_stats["json_early_stops"] += 1
+                break
+    finally:
+        stream.close()
+    return parser.text
 
 # ——— Generation params ——————————————————————————————————
 
@@ -39,9 +134,17 @@ CHAR_PROMPT = (
     "Output exactly one JSON object with keys: name, race, class, backstory, items, personality.\n"
     "USER: Generate one unique character."
 )
-CHAR_MAX = 200
+CHAR_MAX = 300
 CHAR_TEMP = 0.7
 
+PARTY_PROMPT = (
+    "SYSTEM: You are a D&D character creator. "
+    "Output exactly one JSON object with key characters: an array of {n} characters, "
+    "each with keys: name, race, class, backstory, items, personality. "
+    "Every character must have a different name, race and class.\n"
+    "USER: Generate a party of {n} unique adventurers."
+)
+
 DM_INTRO_PROMPT = (
     "SYSTEM: You are the Dungeon Master. "
     "Describe a scene (200–300 words) and end with a clear challenge.\n"
@@ -49,7 +152,8 @@ DM_INTRO_PROMPT = (
 )
 DM_TURN_PROMPT = (
     "SYSTEM: You are the Dungeon Master. Continue the narrative (150–250 words), "
-    "summarizing what happened and presenting the next challenge.\n"
+    "summarizing what happened and presenting the next challenge. "
+    "Dice, HP and items are already resolved by the Rules lines; narrate those outcomes, never invent rolls.\n"
     "USER: {context}"
 )
 DM_MAX = 300
@@ -69,64 +173,201 @@ OPTIONS_PROMPT = (
 OPTIONS_MAX = 150
 OPTIONS_TEMP = 0.6
 
+DIGEST_PROMPT = (
+    "SYSTEM: You condense D&D lore for a game master. For each numbered passage, "
+    "write a summary of at most 40 words and list up to 6 key entities (people, places, "
+    "items, monsters). Output one JSON object with key digests: an array of {n} objects "
+    "with keys summary and entities, in passage order.\n"
+    "USER: {passages}"
+)
+DIGEST_INPUT_CHARS = 2000   # per passage; whole PDF pages can be much longer
+DIGEST_MAX = 90             # tokens per passage
+DIGEST_TEMP = 0.2
+
 # ——— Character generation with retry ——————————————————————
 
-@retry(stop=stop_after_attempt(3), wait=wait_fixed(1), reraise=True)
+# only parse failures are retried here; transport errors were already retried
+# by the client, and a busy scheduler or missing model won't fix itself in 1s
+@retry(
+    retry=retry_if_exception_type((ValidationError, json.JSONDecodeError)),
+    stop=stop_after_attempt(3), wait=wait_fixed(1), before_sleep=_count_retry, reraise=True,
+)
 def generate_character_sync() -> Character:
-    resp = ollama_client.generate(
-        prompt=CHAR_PROMPT,
-        max_tokens=CHAR_MAX,
-        temperature=CHAR_TEMP
-    )
-    raw = getattr(resp, "response", "") or ""
-    js = _extract_json(raw)
+    generation_stats["character_calls"] += 1
+    raw = _generate_json(CHAR_PROMPT, CHARACTER_SCHEMA, CHAR_MAX, CHAR_TEMP, "{", role="player", call="character")
     try:
-        data = json.loads(js)
-        return Character.model_validate(data)
-    except (json.JSONDecodeError, ValidationError) as e:
+        char = Character.model_validate_json(raw)
+    except ValidationError as e:
         logger.warning("Parse error (retrying): %s\nRaw: %s", e, raw)
         raise
+    generation_stats["characters"] += 1
+    return char
 
-def generate_party_sync() -> Dict[str, Character]:
-    return {f"Player {i+1}": generate_character_sync() for i in range(4)}
+def generate_party_batch_sync(n: int = 4) -> List[Character]:
+    """
+    Ask for `n` distinct characters in a single structured call. Entries that
+    are missing or fail validation are regenerated one by one.
+    """
+    generation_stats["party_batch_calls"] += 1
+    prompt = PARTY_PROMPT.format(n=n)
+    try:
+        raw = _generate_json(prompt, party_schema(n), CHAR_MAX * n, CHAR_TEMP, "{", role="player", call="character")
+    except Exception as e:
+        logger.warning("Party generation failed (generating one by one): %s", e)
+        raw = ""
+    try:
+        entries = json.loads(raw).get("characters", [])
+    except (json.JSONDecodeError, AttributeError):
+        logger.warning("Party parse error, raw: %s", raw)
+        entries = []
+    if not isinstance(entries, list):
+        entries = []
+    chars: List[Character] = []
+    for entry in entries[:n]:
+        try:
+            chars.append(Character.model_validate(entry))
+        except ValidationError as e:
+            logger.warning("Invalid party entry (regenerating): %s", e)
+    generation_stats["characters"] += len(chars)
+    generation_stats["party_batch_regenerated"] += n - len(chars)
+    chars.extend(generate_character_sync() for _ in range(n - len(chars)))
+    return chars
+
+def generate_digests_sync(chunks: List[str]) -> List[Optional[Dict[str, Any]]]:
+    """
+    Summarize `chunks` in one structured call. Returns one digest dict per
+    chunk, or None where the model's entry was missing or malformed.
+    """
+    generation_stats["digest_calls"] += 1
+    n = len(chunks)
+    passages = "\n\n".join(f"[{i + 1}] {c[:DIGEST_INPUT_CHARS]}" for i, c in enumerate(chunks))
+    prompt = DIGEST_PROMPT.format(n=n, passages=passages)
+    raw = _generate_json(prompt, digest_schema(n), DIGEST_MAX * n, DIGEST_TEMP, "{", role="player", call="digest")
+    try:
+        entries = json.loads(raw).get("digests", [])
+    except (json.JSONDecodeError, AttributeError):
+        logger.warning("Digest parse error, raw: %s", raw)
+        entries = []
+    digests: List[Optional[Dict[str, Any]]] = []
+    for i in range(n):
+        entry = entries[i] if i < len(entries) else None
+        if isinstance(entry, dict) and isinstance(entry.get("summary"), str) and entry["summary"].strip():
+            ents = entry.get("entities")
+            ents = [e for e in ents if isinstance(e, str)] if isinstance(ents, list) else []
+            digests.append({"summary": entry["summary"].strip(), "entities": ents})
+        else:
+            digests.append(None)
+    return digests
+
+def generate_characters_sync(n: int) -> List[Character]:
+    if n <= 0:
+        return []
+    if settings.party_batch:
+        return generate_party_batch_sync(n)
+    return [generate_character_sync() for _ in range(n)]
 
-def start_adventure_sync(party: Dict[str, Character]) -> str:
+def generate_party_sync(n: int = 4) -> Dict[str, Character]:
+    return {f"Player {i+1}": c for i, c in enumerate(generate_characters_sync(n))}
+
+def _generate_text(
+    prompt: str,
+    max_tokens: int,
+    temperature: float,
+    on_token: Optional[Callable[[str], None]] = None,
+    role: str = "dm",
+    call: str = "generate",
+) -> Any:
+    """
+    Plain generate; with `on_token` the response is streamed and each piece
+    is passed to the callback. Either way the final response is returned.
+    """
+    kwargs = dict(prompt=prompt, max_tokens=max_tokens, temperature=temperature, call=call, **role_options(role))
+    if on_token is None:
+        return ollama_client.generate(**kwargs)
+    parts: List[str] = []
+    last = None
+    for chunk in ollama_client.generate(stream=True, **kwargs):
+        piece = getattr(chunk, "response", "") or ""
+        parts.append(piece)
+        on_token(piece)
+        last = chunk
+    if last is None:
+        return None
+    return last.model_copy(update={"response": "".join(parts)})
+
+def start_adventure_sync(
+    party: Dict[str, Character],
+    on_token: Optional[Callable[[str], None]] = None,
+) -> str:
     names = ", ".join(party.keys())
     prompt = DM_INTRO_PROMPT.format(names=names)
-    resp = ollama_client.generate(
-        prompt=prompt,
-        max_tokens=DM_MAX,
-        temperature=DM_TEMP
-    )
+    resp = _generate_text(prompt, DM_MAX, DM_TEMP, on_token, call="intro")
     return getattr(resp, "response", "").strip()
 
-def player_turn_sync(state: Dict, name: str, info: Character) -> str:
-    recent = last_sentences(" ".join(state["story"]), 3)
+def _recent(state: Dict, n: int) -> str:
+    """
+    Last `n` sentences of the story. Every event holds at least one sentence,
+    so only the last `n` events are joined instead of the whole log.
+    """
+    return last_sentences(state["story"].tail_text(n), n)
+
+def _party(state: Dict) -> str:
+    rules = state.get("rules")
+    return f"Party: {rules.summary()}\n" if rules and rules.sheets else ""
+
+def player_prompt(state: Dict, name: str, info: Character) -> str:
+    """
+    Retrieval + prompt assembly for a player turn (no LLM call). The
+    character goes in as its compact rules sheet, not the full JSON.
+    """
+    recent = _recent(state, 3)
     lore  = retrieve(info.backstory + " " + recent)
-    ctxt  = f"Character: {info.model_dump_json()}\nRecent: {recent}\nLore: {' | '.join(lore)}"
-    prompt=PLAYER_PROMPT.format(context=ctxt)
-    resp  = ollama_client.generate(prompt=prompt, max_tokens=PLAYER_MAX, temperature=PLAYER_TEMP)
+    rules = state.get("rules")
+    sheet = rules.sheets.get(name) if rules else None
+    who   = sheet.summary() if sheet else f"{info.name} ({info.race} {info.class_})"
+    ctxt  = f"Character: {who}; {info.personality}\nRecent: {recent}\nLore: {' | '.join(lore)}"
+    return PLAYER_PROMPT.format(context=ctxt)
+
+def player_generate_sync(prompt: str) -> str:
+    resp  = _generate_text(prompt, PLAYER_MAX, PLAYER_TEMP, role="player", call="player")
     return getattr(resp, "response", "").strip()
 
-def dm_turn_sync(state: Dict) -> str:
-    recent = last_sentences(" ".join(state["story"]), 5)
+def player_turn_sync(state: Dict, name: str, info: Character) -> str:
+    return player_generate_sync(player_prompt(state, name, info))
+
+def dm_turn_response(state: Dict, on_token: Optional[Callable[[str], None]] = None) -> Any:
+    """
+    Run the DM turn and return the raw Ollama response (text plus token counts).
+    """
+    recent = _recent(state, 5)
     lore   = retrieve(recent)
-    ctxt   = f"Recent events: {recent}\nLore: {' | '.join(lore)}"
+    ctxt   = f"{_party(state)}Recent events: {recent}\nLore: {' | '.join(lore)}"
     prompt = DM_TURN_PROMPT.format(context=ctxt)
-    resp   = ollama_client.generate(prompt=prompt, max_tokens=DM_MAX, temperature=DM_TEMP)
-    return getattr(resp, "response", "").strip()
+    return _generate_text(prompt, DM_MAX, DM_TEMP, on_token, call="dm")
+
+def dm_turn_sync(state: Dict, on_token: Optional[Callable[[str], None]] = None) -> str:
+    return getattr(dm_turn_response(state, on_token), "response", "").strip()
 
 def generate_options_sync(state: Dict) -> List[str]:
-    recent = last_sentences(" ".join(state["story"]), 3)
-    ctxt   = f"Recent events: {recent}"
+    generation_stats["options_calls"] += 1
+    recent = _recent(state, 3)
+    ctxt   = f"{_party(state)}Recent events: {recent}"
     prompt = OPTIONS_PROMPT.format(context=ctxt)
-    resp   = ollama_client.generate(prompt=prompt, max_tokens=OPTIONS_MAX, temperature=OPTIONS_TEMP)
-    raw    = getattr(resp, "response", "") or ""
-    js     = _extract_json(raw)
     try:
-        opts = json.loads(js)
-        if isinstance(opts, list) and all(isinstance(o, str) for o in opts):
-            return opts
+        raw = _generate_json(prompt, OPTIONS_SCHEMA, OPTIONS_MAX, OPTIONS_TEMP, call="options")
+    except Exception as e:
+        # the client has already retried; a stock set beats a failed turn
+        logger.warning("Options generation failed: %s", e)
+        raw = ""
+    try:
+        opts = json.loads(raw)
+        if isinstance(opts, dict):
+            # some models still wrap the array: {"options": [...]}
+            opts = next((v for v in opts.values() if isinstance(v, list)), None)
+        if isinstance(opts, list) and opts and all(isinstance(o, str) for o in opts):
+            return opts[:3]
     except Exception:
-        logger.error("Options parse error, raw: %s", raw)
+        pass
+    logger.error("Options parse error, raw: %s", raw)
+    generation_stats["options_fallbacks"] += 1
     return ["Continue forward", "Inspect surroundings", "Rest and recover"]
@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Tuple
+
+from ollama._types import ResponseError
+
+from core.settings import settings
+from services.ollama_client import ollama_client
+
+logger = logging.getLogger(__name__)
+
+ROLES = ("dm", "player")
+PULL_POLL_SECONDS = 5.0
+
+def model_for(role: str) -> str:
+    return getattr(settings, f"{role}_model", None) or settings.ollama_model
+
+def keep_alive_for(role: str) -> str:
+    return getattr(settings, f"{role}_keep_alive", settings.dm_keep_alive)
+
+def role_options(role: str) -> Dict[str, Any]:
+    """
+    `model`/`keep_alive` kwargs for OllamaClient calls made on behalf of `role`.
+    """
+    return {"model": model_for(role), "keep_alive": keep_alive_for(role)}
+
+class ResidencyManager:
+    """
+    Keeps the configured DM/player models loaded on every host.
+
+    `start()` pre-warms each model with an empty generate (which loads the
+    weights without producing tokens) using the role's keep_alive, so the
+    first interactive turn never pays the load. Missing models are pulled in
+    the background and warmed once the pull finishes.
+    """
+
+    def __init__(self):
+        self._started = False
+        self._lock = threading.Lock()
+
+    def models(self) -> List[Tuple[str, str]]:
+        """
+        Distinct (model, keep_alive) pairs; when roles share a model the DM's
+        keep_alive is used.
+        """
+        pairs: Dict[str, str] = {}
+        for role in ROLES:
+            pairs.setdefault(model_for(role), keep_alive_for(role))
+        return list(pairs.items())
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started or not settings.prewarm_models:
+                return
+            self._started = True
+        for host in ollama_client.hosts:
+            for model, keep_alive in self.models():
+                threading.Thread(
+                    target=self._warm, args=(host, model, keep_alive),
+                    name=f"prewarm-{model}", daemon=True,
+                ).start()
+
+    def _warm(self, host, model: str, keep_alive: str) -> None:
+        t0 = time.monotonic()
+        try:
+            host.client.generate(model=model, prompt="", keep_alive=keep_alive)
+        except ResponseError as e:
+            if e.status_code != 404:
+                logger.warning("Pre-warm of %s on %s failed: %s", model, host.url, e)
+                return
+            job = ollama_client.pull_in_background(model, host)[0]
+            while job.status == "pulling":
+                time.sleep(PULL_POLL_SECONDS)
+            if job.status == "done":
+                self._warm(host, model, keep_alive)
+            return
+        except Exception as e:
+            logger.warning("Pre-warm of %s on %s failed: %s", model, host.url, e)
+            return
+        host.resident.add(model)
+        logger.info("Pre-warmed %s on %s in %.1fs", model, host.url, time.monotonic() - t0)
+
+residency = ResidencyManager()
@@ -0,0 +1,102 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from core.metrics import registry
+from core.settings import settings
+from services.game_runner import GameRunner
+from services.turn_service import turn_service
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 30.0          # seconds between eviction sweeps
+SESSION_OVERHEAD = 64 * 1024   # runner, party, options, speculator bookkeeping
+
+SESSIONS_EVICTED = registry.counter("sessions_evicted_total", "Sessions evicted to the journal")
+
+class SessionRegistry:
+    """
+    Process-wide map of session id → GameRunner.
+
+    Every Streamlit session asks `get()` for its runner on each rerun instead
+    of keeping it in `st.session_state`. Sessions idle longer than
+    SESSION_IDLE_SECONDS, or the least recently used ones once the estimated
+    footprint passes SESSION_MEMORY_BUDGET_MB, are dropped from memory; their
+    journal already holds everything, so the next `get()` resumes them.
+    Sessions with a job in flight, or without a journal, are never evicted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._runners: "OrderedDict[str, GameRunner]" = OrderedDict()
+        self._last_seen: Dict[str, float] = {}
+        self._last_sweep = 0.0
+
+    def __len__(self) -> int:
+        return len(self._runners)
+
+    def get(self, session_id: str) -> GameRunner:
+        now = time.monotonic()
+        with self._lock:
+            runner = self._runners.get(session_id)
+            if runner is not None:
+                self._runners.move_to_end(session_id)
+            self._last_seen[session_id] = now
+        if runner is None:
+            runner = GameRunner.resume(session_id) or GameRunner(session_id)
+            with self._lock:
+                # another rerun of the same session may have won the race
+                runner = self._runners.setdefault(session_id, runner)
+        if now - self._last_sweep >= SWEEP_INTERVAL:
+            self._last_sweep = now
+            self.sweep(keep=session_id)
+        return runner
+
+    def bytes_used(self) -> int:
+        with self._lock:
+            runners = list(self._runners.values())
+        return sum(SESSION_OVERHEAD + r.state.story.nbytes for r in runners)
+
+    def sweep(self, keep: Optional[str] = None) -> int:
+        """
+        Evict idle sessions, then LRU sessions until under budget (never
+        `keep`); returns the count.
+        """
+        now = time.monotonic()
+        budget = settings.session_memory_budget_mb * 1024 * 1024
+        with self._lock:
+            order = list(self._runners.items())     # least recently used first
+        used = sum(SESSION_OVERHEAD + r.state.story.nbytes for _, r in order)
+        evicted = 0
+        for session_id, runner in order:
+            if session_id == keep:
+                continue
+            idle = now - self._last_seen.get(session_id, now) >= settings.session_idle_seconds
+            if not idle and used <= budget:
+                continue
+            if self._evict(session_id, runner):
+                used -= SESSION_OVERHEAD + runner.state.story.nbytes
+                evicted += 1
+        if evicted:
+            logger.info("Evicted %d sessions; %d live, ~%.1f MB", evicted, len(self), used / 2**20)
+        return evicted
+
+    def _evict(self, session_id: str, runner: GameRunner) -> bool:
+        job = turn_service.get(session_id)
+        if runner.journal is None or (job is not None and not job.finished):
+            return False
+        # every finished GameRunner step is already journaled
+        if runner.speculator:
+            runner.speculator.discard()
+        turn_service.clear(session_id)
+        with self._lock:
+            if self._runners.get(session_id) is not runner:
+                return False
+            del self._runners[session_id]
+            self._last_seen.pop(session_id, None)
+        SESSIONS_EVICTED.inc()
+        return True
+
+sessions = SessionRegistry()
@@ -0,0 +1,147 @@
+import copy
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from core.settings import settings
+from core.rules import record_choice
+from core.story import EventLog
+from services.ollama_client import Priority, ollama_client, request_context
+from services.rag_utils import dm_turn_response
+
+logger = logging.getLogger(__name__)
+
+# Shared by every session's speculator so idle sessions don't each hold threads.
+_spec_exe = ThreadPoolExecutor(max_workers=settings.ollama_num_parallel, thread_name_prefix="dm-spec")
+
+@dataclass
+class SpeculationStats:
+    """
+    Running totals for speculative DM turns.
+    """
+    rounds: int = 0          # option sets we speculated on
+    hits: int = 0            # chosen branch was served from a speculation
+    misses: int = 0          # chosen branch had to be generated live
+    skipped: int = 0         # option sets not speculated on (server busy); not hits or misses
+    used_tokens: int = 0     # eval tokens of committed branches
+    wasted_tokens: int = 0   # eval tokens of discarded branches
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class DMSpeculator:
+    """
+    Pre-generates the DM turn for every offered option while the model is idle.
+
+    `start()` is called once the options are on screen; `commit()` is called
+    with the player's choice and returns the speculated DM response (or None
+    on a miss). Branches that were not chosen are discarded and their tokens
+    are counted as waste.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._log: Optional[EventLog] = None   # story the branches forked from
+        self._base_len = 0
+        self._branches: Dict[str, Future] = {}
+        self._stories: Dict[str, EventLog] = {}  # branch story per option, to check commits against
+        self.stats = SpeculationStats()
+
+    def start(self, state: Dict, options: List[str]) -> bool:
+        """
+        Queue one speculative DM turn per option. Skipped when the server is busy.
+        """
+        self.discard()
+        if not ollama_client.is_idle():
+            logger.debug("Ollama busy (%d in flight); not speculating", ollama_client.in_flight)
+            self.stats.skipped += 1
+            return False
+        log: EventLog = state["story"]
+        with self._lock:
+            self._log, self._base_len = log, len(log)
+            for opt in dict.fromkeys(options):
+                # rules are deterministic, so the branch gets the same rolls the live turn will
+                story, rules = log.fork(), copy.deepcopy(state["rules"])
+                record_choice(story, rules, state["turn"], opt)
+                branch = dict(state, story=story, rules=rules, last_choice=opt)
+                self._stories[opt] = story
+                self._branches[opt] = _spec_exe.submit(self._speculate, branch)
+            self.stats.rounds += 1
+        return True
+
+    @staticmethod
+    def _speculate(branch: Dict):
+        with request_context(Priority.SPECULATIVE):
+            return dm_turn_response(branch)
+
+    def commit(self, state: Dict, choice: str) -> Optional[Any]:
+        """
+        Return the speculated DM response for `choice` if the story is still
+        the one the branch forked from plus exactly the events the branch
+        recorded for that choice; discard all others. Returns None without
+        counting a miss when there was no speculation round to commit.
+        """
+        with self._lock:
+            fut = self._branches.pop(choice, None)
+            branch = self._stories.get(choice)
+            log, base_len = self._log, self._base_len
+        if log is None:
+            self.discard()
+            return None
+        result = None
+        story: EventLog = state["story"]
+        usable = (
+            fut is not None and story is log and len(story) == len(branch)
+            and story.to_bytes(base_len) == branch.to_bytes(base_len)
+        )
+        if usable and fut.cancel():
+            usable = False  # never started; generating live is no slower
+        if usable:
+            try:
+                resp = fut.result()
+                if getattr(resp, "response", "").strip():
+                    result = resp
+                    self.stats.used_tokens += getattr(resp, "eval_count", 0) or 0
+            except Exception as e:
+                logger.warning("Speculative DM turn failed: %s", e)
+        elif fut is not None:
+            self._waste(fut)
+        if result is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        self.discard()
+        logger.info(
+            "Speculation %s (hit rate %.0f%%, wasted %d tokens)",
+            "hit" if result is not None else "miss", self.stats.hit_rate * 100, self.stats.wasted_tokens,
+        )
+        return result
+
+    def discard(self) -> None:
+        """
+        Drop every pending branch; running ones are counted as waste when they finish.
+        """
+        with self._lock:
+            branches, self._branches = self._branches, {}
+            self._stories = {}
+            self._log, self._base_len = None, 0
+        for fut in branches.values():
+            self._waste(fut)
+
+    def _waste(self, fut: Future) -> None:
+        if fut.cancel():
+            return
+
+        def _count(f: Future) -> None:
+            try:
+                resp = f.result()
+            except Exception:
+                return
+            with self._lock:
+                self.stats.wasted_tokens += getattr(resp, "eval_count", 0) or 0
+
+        fut.add_done_callback(_count)
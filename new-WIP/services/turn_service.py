@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Literal, Optional
+
+from core.settings import settings
+from services.ollama_client import Priority, request_context
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Job:
+    """
+    One unit of game work (party, intro, options, turn) for a session.
+    """
+    session_id: str
+    key: str
+    status: Literal["queued", "running", "done", "error"] = "queued"
+    partial: str = ""
+    result: Any = None
+    error: Optional[str] = None
+    submitted_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "error")
+
+    def append_partial(self, text: str) -> None:
+        self.partial += text
+
+class TurnService:
+    """
+    Runs GameRunner work off the Streamlit script thread.
+
+    Each session has at most one job in flight; the UI submits and then
+    polls `get()`. Re-submitting the same key (a double click, a rerun) or
+    submitting while another job is running returns the existing job instead
+    of starting new LLM work.
+    """
+
+    def __init__(self, max_workers: int):
+        self._exe = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="turn")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Job] = {}
+
+    def submit(
+        self,
+        session_id: str,
+        key: str,
+        fn: Callable[..., Any],
+        *args: Any,
+        streaming: bool = False,
+    ) -> Job:
+        """
+        Queue `fn(*args)` for `session_id`. With `streaming=True`, `fn` also
+        receives `on_token=` and its output accumulates in `job.partial`.
+        """
+        with self._lock:
+            current = self._jobs.get(session_id)
+            if current and (current.key == key or not current.finished):
+                return current
+            job = Job(session_id=session_id, key=key)
+            self._jobs[session_id] = job
+        kwargs = {"on_token": job.append_partial} if streaming else {}
+        self._exe.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def get(self, session_id: str) -> Optional[Job]:
+        return self._jobs.get(session_id)
+
+    def clear(self, session_id: str) -> None:
+        with self._lock:
+            job = self._jobs.get(session_id)
+            if job and job.finished:
+                del self._jobs[session_id]
+
+    def _run(self, job: Job, fn: Callable[..., Any], args: tuple, kwargs: Dict[str, Any]) -> None:
+        job.status = "running"
+        try:
+            with request_context(Priority.INTERACTIVE, job.session_id):
+                job.result = fn(*args, **kwargs)
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Job %s for session %s failed", job.key, job.session_id)
+            job.error = str(e)
+            job.status = "error"
+        finally:
+            job.finished_at = time.time()
+
+turn_service = TurnService(max_workers=settings.turn_workers)
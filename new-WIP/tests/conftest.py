@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import time
+import zlib
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pytest
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+# core.settings creates its data dirs on import; keep them out of the tree
+_data = tempfile.mkdtemp(prefix="td-llm-dnd-tests-")
+for var, sub in (("PDF_FOLDER", "pdf"), ("VECTOR_INDEX_DIR", "vector_index"),
+                 ("CACHE_DIR", "cache"), ("JOURNAL_DIR", "journal")):
+    os.environ.setdefault(var, os.path.join(_data, sub))
+
+class StubBackend:
+    """
+    Bag-of-words hashing embedder; counts the texts it is asked to encode.
+    """
+
+    def __init__(self, name: str = "stub:test", dim: int = 256):
+        self.name, self.dim = name, dim
+        self.encoded = 0
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        self.encoded += len(texts)
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in zip(out, texts):
+            for word in text.lower().split():
+                row[zlib.crc32(word.encode()) % self.dim] += 1.0
+            norm = np.linalg.norm(row)
+            if norm:
+                row /= norm
+        return out
+
+def read_fake_pdfs(files: List[Path], on_file=None) -> List[str]:
+    # test "PDFs" are plain text, one chunk per line
+    texts: List[str] = []
+    for path in files:
+        texts.extend(line for line in Path(path).read_text().splitlines() if line)
+        if on_file:
+            on_file(path)
+    return texts
+
+class Rag:
+    """
+    RAG state pointed at a temp dir with a stub embedding backend.
+    """
+
+    def __init__(self, tmp: Path, monkeypatch):
+        from core import embeddings, utils
+        from core.settings import settings
+        self.utils, self.settings = utils, settings
+        self.backend = StubBackend()
+        self._monkeypatch = monkeypatch
+        monkeypatch.setattr(settings, "enable_rag", True)
+        monkeypatch.setattr(settings, "enable_lore_digests", False)
+        monkeypatch.setattr(settings, "pdf_folder", tmp / "pdf")
+        monkeypatch.setattr(settings, "vector_index_dir", tmp / "index")
+        monkeypatch.setattr(settings, "cache_dir", tmp / "cache")
+        for folder in (settings.pdf_folder, settings.vector_index_dir, settings.cache_dir):
+            folder.mkdir()
+        monkeypatch.setattr(embeddings, "_backend", self.backend)
+        monkeypatch.setattr(embeddings, "_failed_at", None)
+        monkeypatch.setattr(utils, "load_all_pdf_texts", lambda: read_fake_pdfs(sorted(settings.pdf_folder.glob("*.pdf"))))
+        self.restart()
+
+    def set_backend(self, backend) -> None:
+        """
+        Swap the embedding backend; None acts as one that failed to load.
+        """
+        from core import embeddings
+        self._monkeypatch.setattr(embeddings, "_backend", backend)
+        self._monkeypatch.setattr(embeddings, "_failed_at", None if backend else time.monotonic())
+
+    def write_pdf(self, name: str, *chunks: str, mtime: float = None) -> Path:
+        path = self.settings.pdf_folder / name
+        path.write_text("\n".join(chunks) + "\n")
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+        return path
+
+    def restart(self) -> None:
+        """
+        Forget everything in memory, as a new process would.
+        """
+        self._monkeypatch.setattr(self.utils, "_handle", None)
+        self._monkeypatch.setattr(self.utils, "_last_mtimes", {})
+
+@pytest.fixture
+def rag(tmp_path, monkeypatch):
+    return Rag(tmp_path, monkeypatch)
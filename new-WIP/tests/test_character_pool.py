@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from services import character_pool as pool_mod
+from services.character_pool import REFILL_BATCH, CharacterPool
+from services.rag_utils import Character
+
+def _character(i):
+    return Character(
+        name=f"Hero {i}", race="Elf", class_="Ranger", backstory="Exiled.", items=["bow"], personality="Wry",
+    )
+
+class StubGenerator:
+    """
+    Stands in for generate_characters_sync; records every batch size.
+    """
+    def __init__(self):
+        self.batches = []
+        self.made = 0
+
+    def __call__(self, n):
+        self.batches.append(n)
+        chars = [_character(self.made + i) for i in range(n)]
+        self.made += n
+        return chars
+
+@pytest.fixture
+def gen(monkeypatch):
+    stub = StubGenerator()
+    monkeypatch.setattr(pool_mod, "generate_characters_sync", stub)
+    monkeypatch.setattr(pool_mod.ollama_client, "is_idle", lambda: True)
+    return stub
+
+def _wait_full(pool, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while len(pool) < pool.capacity and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert len(pool) == pool.capacity
+
+def test_take_is_fifo_and_persisted(tmp_path):
+    path = tmp_path / "pool.json"
+    pool = CharacterPool(path, capacity=5)
+    pool.put([_character(i) for i in range(5)])
+    assert [c.name for c in pool.take(2)] == ["Hero 0", "Hero 1"]
+    reloaded = CharacterPool(path, capacity=5)
+    assert [c.name for c in reloaded.take(10)] == ["Hero 2", "Hero 3", "Hero 4"]
+    # a dry pool returns what it has instead of blocking on the LLM
+    assert reloaded.take(2) == []
+
+def test_refill_tops_up_in_batches(tmp_path, gen):
+    pool = CharacterPool(tmp_path / "pool.json", capacity=REFILL_BATCH + 2)
+    pool.start()
+    pool.start()
+    _wait_full(pool)
+    assert gen.batches == [REFILL_BATCH, 2]
+
+    taken = pool.take(3)
+    assert [c.name for c in taken] == ["Hero 0", "Hero 1", "Hero 2"]
+    _wait_full(pool)
+    assert gen.batches == [REFILL_BATCH, 2, 3]
+    assert {c.name for c in pool.take(pool.capacity)}.isdisjoint(c.name for c in taken)
+    _wait_full(pool)
@@ -0,0 +1,145 @@
+import json
+import shutil
+import socket
+import struct
+import tempfile
+import threading
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core import embeddings
+from core.embeddings import MAX_FRAME, EmbeddingBackend, WorkerBackend, recv_frame, send_frame
+from core.settings import settings
+from services.embed_worker import WORKER_REQUESTS, serve
+
+class StubBackend(EmbeddingBackend):
+    """
+    Deterministic 8-dim vectors; records the size of every batch it encodes.
+    """
+    name, dim = "stub:test", 8
+
+    def __init__(self):
+        self.batches = []
+        self.stall = threading.Event()
+
+    def encode(self, texts):
+        self.batches.append(len(texts))
+        if "stall" in texts:
+            self.stall.wait(2.0)
+        if "boom" in texts:
+            raise RuntimeError("boom")
+        return np.array([[len(t) + i for i in range(self.dim)] for t in texts], dtype="float32")
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(settings, "embed_coalesce_ms", 50.0)
+    # AF_UNIX paths are short; keep the socket near the root of /tmp
+    tmp = Path(tempfile.mkdtemp(prefix="ew-"))
+    stub = StubBackend()
+    server = serve(tmp / "embed.sock", stub)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server, stub
+    stub.stall.set()
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(tmp, ignore_errors=True)
+
+def _raw_call(path, payload: bytes):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(path)
+        send_frame(sock, payload)
+        header = json.loads(recv_frame(sock))
+        data = recv_frame(sock)
+        # the connection stays usable after a bad frame
+        send_frame(sock, b"[]")
+        follow_up = json.loads(recv_frame(sock))
+        recv_frame(sock)
+    return header, data, follow_up
+
+def test_round_trip(worker):
+    server, stub = worker
+    client = WorkerBackend(server.server_address)
+    assert (client.name, client.dim) == (stub.name, stub.dim)
+    texts = ["a", "bcd", "efghij"]
+    np.testing.assert_array_equal(client.encode(texts), stub.encode(texts))
+
+@pytest.mark.parametrize("payload", [b"not json", b'{"texts": ["a"]}', b'["a", 3]', b"\xff\xfe"])
+def test_malformed_frame_gets_error_reply(worker, payload):
+    server, stub = worker
+    header, data, follow_up = _raw_call(server.server_address, payload)
+    assert "error" in header and data == b""
+    assert follow_up["name"] == stub.name
+    assert stub.batches == []
+
+def test_oversized_frame_is_refused(worker):
+    server, stub = worker
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(5)
+        sock.connect(server.server_address)
+        # only the length goes out: the worker must answer without waiting for 4 GiB
+        sock.sendall(struct.pack("<I", 0xFFFFFFFF))
+        header = json.loads(recv_frame(sock))
+        assert "error" in header and recv_frame(sock) == b""
+        # the unread payload would desync the stream, so the worker hangs up
+        with pytest.raises(ConnectionError):
+            recv_frame(sock)
+    assert stub.batches == []
+    client = WorkerBackend(server.server_address)
+    assert client.encode(["still serving"]).shape == (1, stub.dim)
+
+def test_frame_limit():
+    a, b = socket.socketpair()
+    with a, b:
+        a.settimeout(5)
+        b.sendall(struct.pack("<I", MAX_FRAME + 1))
+        with pytest.raises(ValueError):
+            recv_frame(a)
+        # a frame at the limit still goes through; send it from a thread so the socket buffer drains
+        sender = threading.Thread(target=send_frame, args=(b, b"x" * MAX_FRAME))
+        sender.start()
+        assert len(recv_frame(a)) == MAX_FRAME
+        sender.join(5)
+
+def test_encode_error_is_raised_by_client(worker):
+    server, _ = worker
+    client = WorkerBackend(server.server_address)
+    with pytest.raises(RuntimeError, match="boom"):
+        client.encode(["boom"])
+    assert client.encode(["ok"]).shape == (1, 8)
+
+def test_concurrent_calls_are_coalesced(worker):
+    server, stub = worker
+    client = WorkerBackend(server.server_address)
+    texts = [f"text {'x' * i}" for i in range(16)]
+    results = [None] * len(texts)
+    start = threading.Barrier(len(texts))
+
+    def call(i):
+        start.wait()
+        results[i] = client.encode([texts[i]])
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(texts))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(10)
+    for text, got in zip(texts, results):
+        np.testing.assert_array_equal(got, stub.encode([text]))
+    served = stub.batches[:-len(texts)]     # drop the reference encodes above
+    assert sum(served) == len(texts)
+    assert len(served) < len(texts)
+
+def test_timeout_is_not_retried(worker, monkeypatch):
+    server, stub = worker
+    client = WorkerBackend(server.server_address)
+    monkeypatch.setattr(embeddings, "WORKER_TIMEOUT", 0.2)
+    client._drop(client._local.sock)    # reconnect with the short timeout
+    before = WORKER_REQUESTS.value()
+    with pytest.raises(socket.timeout):
+        client.encode(["stall"])
+    # a retry would have sent its frame before the second timeout surfaced
+    assert WORKER_REQUESTS.value() - before == 1
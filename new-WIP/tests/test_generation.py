@@ -0,0 +1,53 @@
+import json
+
+import pytest
+from tenacity import wait_none
+
+from services import rag_utils
+from services.ollama_client import LLM_RETRIES, ModelUnavailable, SchedulerBusy
+
+GOOD = json.dumps({
+    "name": "Brak", "race": "Orc", "class": "Fighter", "backstory": "A deserter.",
+    "items": ["axe"], "personality": "Gruff",
+})
+
+@pytest.fixture
+def generate(monkeypatch):
+    """
+    Feeds generate_character_sync the given replies (exceptions are raised).
+    """
+    def feed(*replies):
+        calls = []
+
+        def fake(*args, **kwargs):
+            reply = replies[len(calls)]
+            calls.append(reply)
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        monkeypatch.setattr(rag_utils, "_generate_json", fake)
+        return rag_utils.generate_character_sync.retry_with(wait=wait_none()), calls
+    return feed
+
+def test_parse_errors_are_retried(generate):
+    fn, calls = generate("not json", '{"name": "half"}', GOOD)
+    before = LLM_RETRIES.value(call="character", reason="parse")
+    assert fn().name == "Brak"
+    assert len(calls) == 3
+    assert LLM_RETRIES.value(call="character", reason="parse") - before == 2
+
+def test_parse_retries_are_bounded(generate):
+    fn, calls = generate("{", "{", "{", GOOD)
+    with pytest.raises(ValueError):
+        fn()
+    assert len(calls) == 3
+
+@pytest.mark.parametrize("err", [ModelUnavailable("no model"), SchedulerBusy("queue full")])
+def test_unavailable_or_busy_is_not_retried(generate, err):
+    fn, calls = generate(err, GOOD)
+    before = LLM_RETRIES.value(call="character", reason="parse")
+    with pytest.raises(type(err)):
+        fn()
+    assert len(calls) == 1
+    assert LLM_RETRIES.value(call="character", reason="parse") == before
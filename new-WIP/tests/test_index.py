@@ -0,0 +1,110 @@
+import json
+import time
+
+import pytest
+
+from conftest import StubBackend
+
+CHUNKS = ["the dragon sleeps under the mountain", "goblins raid the tavern", "the king swore an oath"]
+
+def test_restart_loads_saved_index(rag):
+    rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    assert rag.utils.retrieve("dragon", k=1) == [CHUNKS[0]]
+    built = rag.backend.encoded
+    assert built == len(CHUNKS) + 1
+    meta = json.loads((rag.settings.vector_index_dir / rag.utils.META_FILE).read_text())
+    assert set(meta["mtimes"]) == {"lore.pdf"}
+
+    rag.restart()
+    assert rag.utils.retrieve("goblins", k=1) == [CHUNKS[1]]
+    assert rag.utils.retrieve("oath", k=1) == [CHUNKS[2]]
+    # only the two queries were embedded: the saved index was loaded, not rebuilt
+    assert rag.backend.encoded == built + 2
+    assert not rag.utils._needs_rebuild()
+
+def test_restart_rebuilds_for_changed_pdfs(rag):
+    rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    rag.utils.retrieve("dragon")
+    rag.restart()
+    rag.write_pdf("more.pdf", "a ranger tracks the cult")
+    before = rag.backend.encoded
+    assert rag.utils.retrieve("ranger", k=1) == ["a ranger tracks the cult"]
+    assert rag.backend.encoded == before + len(CHUNKS) + 2
+
+def test_changed_pdf_rebuilds_live_index_once(rag):
+    path = rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    rag.utils.retrieve("dragon")
+    rag.write_pdf("lore.pdf", *CHUNKS, "a new chapter about storms")
+    assert path.stat().st_mtime > time.time() - 30
+    assert rag.utils._needs_rebuild() and rag.utils._needs_rebuild()
+    before = rag.backend.encoded
+    assert rag.utils.retrieve("storms", k=1) == ["a new chapter about storms"]
+    rag.utils.retrieve("storms")
+    assert rag.backend.encoded == before + len(CHUNKS) + 1 + 2
+
+def test_legacy_index_without_mtimes_is_rebuilt_once(rag):
+    rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    rag.utils.retrieve("dragon")
+    meta_path = rag.settings.vector_index_dir / rag.utils.META_FILE
+    meta = json.loads(meta_path.read_text())
+    del meta["mtimes"]
+    meta_path.write_text(json.dumps(meta))
+    rag.restart()
+    before = rag.backend.encoded
+    rag.utils.retrieve("dragon")
+    assert rag.backend.encoded == before + len(CHUNKS) + 1
+    rag.restart()
+    rag.utils.retrieve("dragon")
+    assert rag.backend.encoded == before + len(CHUNKS) + 2
+
+def test_no_backend_builds_nothing_until_it_comes_up(rag):
+    rag.write_pdf("lore.pdf", *CHUNKS)
+    rag.set_backend(None)
+    assert rag.utils.retrieve("dragon") == []
+    assert not (rag.settings.vector_index_dir / rag.utils.INDEX_FILE).exists()
+    rag.set_backend(rag.backend)
+    assert rag.utils.retrieve("dragon", k=1) == [CHUNKS[0]]
+    meta = json.loads((rag.settings.vector_index_dir / rag.utils.META_FILE).read_text())
+    assert meta["embedder"] == rag.backend.name
+
+def test_index_texts_refuses_without_backend(rag):
+    rag.set_backend(None)
+    with pytest.raises(RuntimeError):
+        rag.utils.index_texts(CHUNKS)
+
+def test_live_index_from_another_embedder_is_rebuilt(rag):
+    rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    rag.utils.retrieve("dragon")
+    other = StubBackend(name="stub:other", dim=rag.backend.dim)
+    rag.set_backend(other)
+    assert rag.utils.retrieve("goblins", k=1) == [CHUNKS[1]]
+    assert other.encoded == len(CHUNKS) + 1
+    assert rag.utils.current_index().embedder == "stub:other"
+
+def test_no_backend_loads_saved_index_at_its_width(rag):
+    wide = StubBackend(dim=64)
+    rag.set_backend(wide)
+    rag.write_pdf("lore.pdf", *CHUNKS, mtime=time.time() - 60)
+    rag.utils.retrieve("dragon")
+    rag.restart()
+    rag.set_backend(None)
+    handle = rag.utils.build_index()
+    assert handle.index.dim == 64 and handle.embedder == wide.name
+
+@pytest.mark.parametrize("saved, ok", [
+    ({"embedder": "stub:test", "dim": 256}, True),
+    ({"embedder": "stub", "dim": 256}, False),
+    ({"embedder": "stub:test:extra", "dim": 256}, False),
+    ({"embedder": "stub:test", "dim": 384}, False),
+    ({"dim": 256}, False),
+    ({"embedder": "stub:test"}, False),
+    ({}, False),
+])
+def test_meta_matches_exactly(rag, saved, ok):
+    assert rag.utils._meta_matches(saved) is ok
+
+def test_legacy_meta_matches_only_local_models(rag):
+    legacy = dict(rag.utils.LEGACY_META)
+    assert not rag.utils._meta_matches(legacy)
+    rag.set_backend(StubBackend(name="local:intfloat/e5-small", dim=legacy["dim"]))
+    assert rag.utils._meta_matches(legacy)
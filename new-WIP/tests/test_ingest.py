@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from conftest import read_fake_pdfs
+from services import ingest
+from services.ingest import INGEST_SKIPPED, IngestService
+
+LORE = ["the dragon sleeps under the mountain", "goblins raid the tavern"]
+UPLOAD = b"a ranger tracks the cult\nthe cult worships a lich\n"
+
+@pytest.fixture
+def service(rag, monkeypatch):
+    """
+    A fresh IngestService over the `rag` temp dirs; `.gate` can hold extraction.
+    """
+    gate = threading.Event()
+    gate.set()
+    started = threading.Event()
+
+    def load(files, on_file=None):
+        started.set()
+        gate.wait(5)
+        return read_fake_pdfs(files, on_file)
+
+    monkeypatch.setattr(ingest, "load_pdf_texts", load)
+    monkeypatch.setattr(ingest.lore_digester, "notify", lambda: None)
+    svc = IngestService()
+    svc.gate, svc.started = gate, started
+    yield svc
+    gate.set()
+    svc._exe.shutdown(wait=True)
+
+def _wait(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert job.finished
+    return job
+
+def test_unchanged_upload_is_skipped(rag, service):
+    job = _wait(service.submit([("cult.pdf", UPLOAD)]))
+    assert job.status == "done", job.error
+    assert (rag.settings.pdf_folder / "cult.pdf").exists()
+    assert rag.utils.retrieve("ranger", k=1) == ["a ranger tracks the cult"]
+
+    before = INGEST_SKIPPED.value()
+    # same bytes under another name, and again after a restart (the manifest is on disk)
+    assert service.submit([("cult-copy.pdf", UPLOAD)]) is None
+    assert IngestService().submit([("cult.pdf", UPLOAD)]) is None
+    assert INGEST_SKIPPED.value() - before == 2
+    assert len(service.jobs()) == 1
+    assert not (rag.settings.pdf_folder / "cult-copy.pdf").exists()
+
+def test_cancelled_job_leaves_live_index(rag, service):
+    rag.write_pdf("lore.pdf", *LORE, mtime=time.time() - 60)
+    assert rag.utils.retrieve("dragon", k=1) == [LORE[0]]
+    live = rag.utils.current_index()
+    encoded = rag.backend.encoded
+
+    service.gate.clear()
+    job = service.submit([("cult.pdf", UPLOAD)])
+    assert service.started.wait(5)
+    assert service.cancel(job.id)
+    service.gate.set()
+    assert _wait(job).status == "cancelled"
+    assert not service.cancel(job.id)
+
+    assert rag.utils.current_index() is live
+    assert sorted(rag.utils.retrieve("ranger")) == sorted(LORE)
+    assert rag.backend.encoded == encoded + 1      # only the query; nothing was embedded for the upload
+    assert not (rag.settings.pdf_folder / "cult.pdf").exists()
+    assert not service._staging(job).exists()
+    assert not (rag.settings.vector_index_dir / ingest.MANIFEST_FILE).exists()
+    # a cancelled upload is not "already indexed"
+    retry = _wait(service.submit([("cult.pdf", UPLOAD)]))
+    assert retry is not job and retry.status == "done"
+    assert rag.utils.retrieve("ranger", k=1) == ["a ranger tracks the cult"]
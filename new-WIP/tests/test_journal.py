@@ -0,0 +1,94 @@
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from core.journal import encode_state
+from core.settings import settings
+from services import game_runner
+from services.game_runner import GameRunner
+from services.rag_utils import Character
+
+OPTIONS = ["Attack the goblin chief", "Drink a healing potion", "Sneak past the guards"]
+
+def _character(i):
+    return Character(
+        name=f"Hero {i}", race="Human", class_=["Fighter", "Wizard", "Rogue", "Cleric"][i % 4],
+        backstory="Raised by wolves.", items=["longsword", "healing potion"], personality="Blunt",
+    )
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    """
+    A journaled GameRunner with a party and an intro; LLM calls are stubbed.
+    """
+    for name, value in [
+        ("journal_dir", tmp_path), ("enable_journal", True), ("enable_speculation", False),
+        ("enable_character_pool", False), ("enable_ai_party", False),
+    ]:
+        monkeypatch.setattr(settings, name, value)
+    monkeypatch.setattr(game_runner, "generate_characters_sync", lambda n: [_character(i) for i in range(n)])
+    monkeypatch.setattr(game_runner, "start_adventure_sync", lambda party, on_token=None: "You wake in a cell.")
+    monkeypatch.setattr(game_runner, "generate_options_sync", lambda state: list(OPTIONS))
+    monkeypatch.setattr(
+        game_runner, "dm_turn_response",
+        lambda state, on_token=None: SimpleNamespace(response=f"The DM narrates turn {state['turn']}.", eval_count=7),
+    )
+    r = GameRunner(uuid.uuid4().hex)
+    r.new_party()
+    r.start_adventure()
+    return r
+
+def _play(runner, turns):
+    for i in range(turns):
+        runner.request_options()
+        runner.play_turn(i % len(OPTIONS))
+
+def _party(runner):
+    return {name: c.model_dump(by_alias=True) for name, c in runner.party.items()}
+
+def _same(resumed, original):
+    assert encode_state(resumed.state) == encode_state(original.state)
+    assert resumed.state.story == original.state.story
+    assert resumed.state.rules == original.state.rules
+    assert _party(resumed) == _party(original)
+
+def test_resume_restores_state(runner):
+    _play(runner, 4)
+    assert runner.state.rules.rolls > 0
+    _same(GameRunner.resume(runner.journal.session_id), runner)
+
+def test_torn_tail_is_dropped(runner):
+    _play(runner, 3)
+    before = encode_state(runner.state)
+    runner.request_options()        # one "set" line: the new options and phase
+    path = runner.journal.path
+    data = path.read_bytes()
+    last = data.rstrip(b"\n").rfind(b"\n") + 1
+    assert json.loads(data[last:])["t"] == "set"
+    path.write_bytes(data[:last + (len(data) - last) // 2])
+
+    resumed = GameRunner.resume(runner.journal.session_id)
+    assert encode_state(resumed.state) == before
+    assert resumed.state.phase == "dm_response"
+    assert path.read_bytes() == data[:last]
+    # the repaired journal takes new commits and replays them
+    _play(resumed, 1)
+    _same(GameRunner.resume(runner.journal.session_id), resumed)
+
+def test_compaction_keeps_state(runner):
+    runner.journal.snapshot_every = 5
+    _play(runner, 6)
+    lines = runner.journal.path.read_text().splitlines()
+    snapshot = json.loads(lines[0])
+    # the first commit always writes a snapshot; a later one means the file was compacted
+    assert snapshot["t"] == "snapshot" and snapshot["state"]["turn"] > 1
+    assert len(lines) < 5
+    _same(GameRunner.resume(runner.journal.session_id), runner)
+
+def test_resume_without_journal(runner, monkeypatch):
+    assert GameRunner.resume(uuid.uuid4().hex) is None
+    assert GameRunner.resume("../etc/passwd") is None
+    monkeypatch.setattr(settings, "enable_journal", False)
+    assert GameRunner.resume(runner.journal.session_id) is None
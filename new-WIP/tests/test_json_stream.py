@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from core.json_stream import JsonStreamParser
+
+def _feed(chunks, parser=None):
+    parser = parser or JsonStreamParser()
+    for i, chunk in enumerate(chunks):
+        if parser.feed(chunk):
+            return parser, i
+    return parser, None
+
+def test_skips_chatter_and_fences():
+    parser, at = _feed(["Sure! ```json\n", '{"name": "Elara",', ' "items": ["bow"]}', "\n``` enjoy"])
+    assert at == 2
+    assert json.loads(parser.text) == {"name": "Elara", "items": ["bow"]}
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7])
+def test_any_chunking(size):
+    value = {"a": [1, {"b": "c"}], "d": "}]{[", "e": 'say \\"hi\\" {'}
+    raw = "noise " + json.dumps(value) + " trailing {"
+    parser, at = _feed([raw[i:i + size] for i in range(0, len(raw), size)])
+    assert at is not None
+    assert json.loads(parser.text) == value
+
+def test_brackets_and_escapes_inside_strings():
+    raw = r'{"s": "a \\\" } ] \\\\", "t": "{"}'
+    parser, at = _feed([raw])
+    assert at == 0
+    assert parser.text == raw
+
+def test_incomplete_and_not_started():
+    parser = JsonStreamParser()
+    assert not parser.feed("no json here")
+    assert not parser.started
+    assert not parser.feed('{"a": [1, 2')
+    assert parser.started and not parser.done
+
+def test_done_is_sticky_and_drops_the_rest():
+    parser, _ = _feed(['[1, 2]', '[3]'])
+    assert parser.done
+    assert parser.feed("anything")
+    assert parser.text == "[1, 2]"
+
+def test_openers_restrict_the_value():
+    parser, _ = _feed(['["ignored"] then {"x": 1}'], JsonStreamParser(openers="{"))
+    assert json.loads(parser.text) == {"x": 1}
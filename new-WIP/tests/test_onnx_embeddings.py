@@ -0,0 +1,49 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+
+from core.embeddings import ONNX_META, LocalBackend, OnnxBackend
+from core.settings import settings
+from tools.corpus import corpus, sentences
+
+MIN_COSINE = 0.99   # same bar as tools/bench_embeddings.py
+
+@pytest.fixture(scope="module")
+def texts():
+    # long chunks and short queries mixed, so batches carry real padding
+    rng = random.Random(1234)
+    mixed = corpus(rng, 32) + sentences(rng, 32)
+    rng.shuffle(mixed)
+    return mixed
+
+@pytest.fixture(scope="module")
+def reference(texts):
+    if not (settings.onnx_model_dir / ONNX_META).exists():
+        pytest.skip(f"no ONNX export in {settings.onnx_model_dir}; run tools/export_onnx.py")
+    try:
+        local = LocalBackend()
+    except RuntimeError as e:
+        pytest.skip(str(e))
+    return local, local.encode(texts)
+
+def _cosines(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return (a * b).sum(axis=1)
+
+@pytest.mark.parametrize("quantized", [True, False], ids=["int8", "fp32"])
+def test_onnx_matches_local(texts, reference, quantized, monkeypatch):
+    local, expected = reference
+    monkeypatch.setattr(settings, "onnx_quantized", quantized)
+    onnx = OnnxBackend()
+    assert onnx.dim == local.dim
+    assert onnx.name.endswith(":int8" if quantized else ":fp32")
+    got = onnx.encode(texts)
+    assert got.shape == expected.shape
+    assert _cosines(got, expected).min() >= MIN_COSINE
@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core.rules import (
+    RULES_SPEAKER, CharacterSheet, RulesState, inflections, modifier, parse_dice, record_choice,
+)
+from core.story import EventKind, EventLog
+
+def _party():
+    return {
+        "Player 1": SimpleNamespace(name="Brak", class_="Fighter", items=["longsword", "healing potion"]),
+        "Player 2": SimpleNamespace(name="Ilse", class_="Wizard", items=["spellbook"]),
+    }
+
+def _sheet(**kw):
+    base = dict(name="Tess", klass="Rogue", hp=8, max_hp=8, ac=13,
+                abilities={a: 10 for a in ("str", "dex", "con", "int", "wis", "cha")})
+    return CharacterSheet(**{**base, **kw})
+
+@pytest.mark.parametrize("expr, parsed", [
+    ("2d6+1", (2, 6, 1)),
+    ("d20", (1, 20, 0)),
+    (" 1d4 - 2 ", (1, 4, -2)),
+    ("3D8", (3, 8, 0)),
+])
+def test_parse_dice(expr, parsed):
+    assert parse_dice(expr) == parsed
+
+@pytest.mark.parametrize("expr", ["", "2d", "d", "2x6", "1d6+", "1d6*2"])
+def test_parse_dice_rejects(expr):
+    with pytest.raises(ValueError):
+        parse_dice(expr)
+
+def test_modifier():
+    assert [modifier(s) for s in (1, 9, 10, 11, 18)] == [-5, -1, 0, 0, 4]
+
+def test_rolls_are_seeded_by_count():
+    a, b = RulesState(seed=7), RulesState(seed=7)
+    rolls = [a.roll("1d20") for _ in range(20)]
+    assert rolls == [b.roll("1d20") for _ in range(20)]
+    assert all(1 <= r <= 20 for r in rolls)
+    assert a.rolls == 20
+    # the same roll number always gives the same die, whatever came before
+    c = RulesState(seed=7, rolls=5)
+    assert c.roll("1d20") == rolls[5]
+    assert rolls != [RulesState(seed=8, rolls=i).roll("1d20") for i in range(20)]
+
+def test_for_party_is_deterministic():
+    a, b = RulesState.for_party(_party(), seed=3), RulesState.for_party(_party(), seed=3)
+    assert a.to_dict() == b.to_dict()
+    fighter = a.sheets["Player 1"]
+    assert fighter.name == "Brak" and fighter.klass == "Fighter"
+    # the best score goes into the class's primary ability
+    assert fighter.abilities["str"] == max(fighter.abilities.values())
+    assert fighter.inventory == ["longsword", "healing potion"]
+    assert fighter.hp == fighter.max_hp >= 1
+
+def test_resolve_does_not_change_state():
+    rules = RulesState.for_party(_party(), seed=11)
+    before = rules.to_dict()
+    first = rules.resolve("Attack the goblin")
+    assert rules.to_dict() == before
+    assert rules.resolve("Attack the goblin") == first
+
+def test_resolve_ignores_unknown_and_embedded_words():
+    rules = RulesState.for_party(_party(), seed=1)
+    assert rules.resolve("Admire the sunset") is None
+    # "forest" must not read as "rest"
+    assert rules.resolve("Enter the forest") is None
+
+@pytest.mark.parametrize("word, form", [
+    ("run", "runs"), ("run", "running"), ("study", "studies"), ("study", "studied"),
+    ("search", "searching"), ("hide", "hiding"), ("dodge", "dodged"), ("flee", "fleeing"),
+])
+def test_inflections(word, form):
+    assert form in inflections(word)
+
+@pytest.mark.parametrize("word, other", [("run", "rune"), ("run", "runes"), ("run", "runic"), ("rest", "forest")])
+def test_inflections_are_whole_words(word, other):
+    assert other not in inflections(word)
+
+@pytest.mark.parametrize("choice, ability", [
+    ("Study the ancient runes", "INT"),
+    ("Read the runic inscription", "INT"),
+    ("Run from the ogre", "DEX"),
+    ("Keep running", "DEX"),
+    ("Searching the crypt", "INT"),
+])
+def test_checks_match_whole_words(choice, ability):
+    rules = RulesState.for_party(_party(), seed=4)
+    outcome = rules.resolve(choice)
+    assert f" {ability} check" in outcome.text
+
+@pytest.mark.parametrize("choice", ["Buy a potion", "Inspect the potion", "Sell the herbs"])
+def test_consumables_need_a_use_verb(choice):
+    rules = RulesState(seed=5, sheets={"p": _sheet(hp=3, inventory=["healing potion", "herbs"])})
+    outcome = rules.resolve(choice)
+    assert outcome is None or not outcome.removed
+
+@pytest.mark.parametrize("choice", ["Drink a potion", "Quaff the healing potion", "Eat some herbs"])
+def test_consumables_used(choice):
+    rules = RulesState(seed=5, sheets={"p": _sheet(hp=3, inventory=["healing potion", "herbs"])})
+    assert rules.resolve(choice).removed
+
+def test_apply_commits_outcome():
+    rules = RulesState(seed=5, sheets={"p": _sheet(hp=3, inventory=["healing potion", "rope"])})
+    outcome = rules.resolve("Drink a potion")
+    assert outcome.removed == {"p": "healing potion"}
+    rules.apply(outcome)
+    assert rules.rolls == outcome.rolls > 0
+    assert rules.sheets["p"].hp == outcome.hp["p"] <= 8
+    assert rules.sheets["p"].inventory == ["rope"]
+
+def test_failed_check_can_down_a_member():
+    for seed in range(200):
+        rules = RulesState(seed=seed, sheets={"p": _sheet(hp=1)})
+        outcome = rules.resolve("Attack the troll")
+        if outcome.hp:
+            break
+    else:
+        pytest.fail("no failed check in 200 seeds")
+    rules.apply(outcome)
+    assert rules.sheets["p"].down
+    assert "is down" in outcome.text
+    assert rules.resolve("Attack the troll") is None
+
+def test_to_dict_round_trip_is_independent():
+    rules = RulesState.for_party(_party(), seed=9)
+    rules.roll("1d6")
+    data = rules.to_dict()
+    copy = RulesState.from_dict(data)
+    assert copy == rules
+    copy.sheets["Player 1"].inventory.append("torch")
+    copy.sheets["Player 1"].abilities["str"] = 1
+    assert data["sheets"]["Player 1"]["inventory"] == ["longsword", "healing potion"]
+    assert RulesState.from_dict(data) == rules
+    # a restored state keeps rolling exactly where the original would
+    assert copy.roll("1d20") == rules.roll("1d20")
+
+def test_record_choice_appends_outcome():
+    story = EventLog()
+    rules = RulesState.for_party(_party(), seed=2)
+    outcome = record_choice(story, rules, 1, "Sneak past the guards")
+    assert [story.speaker(ev) for ev in story] == ["Player", RULES_SPEAKER]
+    assert story[1].kind == EventKind.RULES
+    assert story.text(story[1]) == outcome.text
+    assert record_choice(story, rules, 2, "Wave") is None
+    assert len(story) == 3
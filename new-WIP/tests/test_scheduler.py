@@ -0,0 +1,132 @@
+import threading
+import time
+
+import pytest
+
+from services.ollama_client import Priority, RequestScheduler, SchedulerBusy, request_context
+
+TIMEOUT = 5.0
+
+class Harness:
+    """
+    Runs requests on threads against one scheduler; `order` records who got
+    a slot, and each request holds it until released.
+    """
+
+    def __init__(self, scheduler: RequestScheduler):
+        self.scheduler = scheduler
+        self.order = []
+        self.errors = {}
+        self._release = {}
+        self._threads = []
+
+    def submit(self, name, priority=Priority.INTERACTIVE, session="", model=""):
+        release = self._release[name] = threading.Event()
+        before = self._snapshot()
+
+        def run():
+            try:
+                with request_context(priority, session), self.scheduler.slot(model):
+                    self.order.append(name)
+                    release.wait(TIMEOUT)
+            except SchedulerBusy as e:
+                self.errors[name] = e
+
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        self._threads.append(t)
+        # wait until it is queued, running, refused or has shed someone, so arrival order is fixed
+        _until(lambda: self._snapshot() != before)
+        return t
+
+    def _snapshot(self):
+        return self.scheduler.queued, self.scheduler.in_flight, len(self.order), len(self.errors)
+
+    def release(self, name):
+        self._release[name].set()
+
+    def drain(self):
+        for ev in self._release.values():
+            ev.set()
+        for t in self._threads:
+            t.join(TIMEOUT)
+        assert self.scheduler.idle()
+
+def _until(cond):
+    deadline = time.monotonic() + TIMEOUT
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+@pytest.fixture
+def harness():
+    h = Harness(RequestScheduler(max_in_flight=1, max_queue=8, shed_after=60.0))
+    yield h
+    h.drain()
+
+def test_caps_in_flight(harness):
+    harness.submit("a")
+    harness.submit("b")
+    assert harness.order == ["a"]
+    assert harness.scheduler.in_flight == 1 and harness.scheduler.queued == 1
+    harness.release("a")
+    _until(lambda: harness.order == ["a", "b"])
+
+def test_priority_then_round_robin(harness):
+    harness.submit("hold")
+    harness.submit("bg", Priority.BACKGROUND)
+    harness.submit("s1-1", session="s1")
+    harness.submit("s1-2", session="s1")
+    harness.submit("s2-1", session="s2")
+    expected = ["hold", "s1-1", "s2-1", "s1-2", "bg"]
+    for i, name in enumerate(expected):
+        _until(lambda: len(harness.order) > i)
+        harness.release(name)
+    assert harness.order == expected
+
+def test_prefers_the_last_model(harness):
+    harness.submit("hold", model="dm")
+    harness.submit("player", session="s1", model="player")
+    harness.submit("dm", session="s2", model="dm")
+    expected = ["hold", "dm", "player"]
+    for i, name in enumerate(expected):
+        _until(lambda: len(harness.order) > i)
+        harness.release(name)
+    assert harness.order == expected
+
+def test_full_queue_sheds_lowest_priority():
+    h = Harness(RequestScheduler(max_in_flight=1, max_queue=1, shed_after=60.0))
+    try:
+        h.submit("hold")
+        h.submit("spec", Priority.SPECULATIVE)
+        h.submit("user")
+        _until(lambda: "spec" in h.errors)
+        h.submit("late", Priority.SPECULATIVE)
+        assert "queue full" in str(h.errors["late"])
+        h.release("hold")
+        _until(lambda: h.order == ["hold", "user"])
+    finally:
+        h.drain()
+
+def test_sheds_background_work_on_long_waits():
+    h = Harness(RequestScheduler(max_in_flight=1, max_queue=8, shed_after=0.5))
+    try:
+        h.submit("hold")
+        h.submit("bg", Priority.BACKGROUND)
+        assert "est. wait" in str(h.errors["bg"])
+        # interactive work always queues
+        h.submit("user")
+        assert "user" not in h.errors
+    finally:
+        h.drain()
+
+def test_estimated_wait():
+    s = RequestScheduler(max_in_flight=2, max_queue=8, shed_after=60.0)
+    assert s.estimated_wait() == 0
+    h = Harness(s)
+    try:
+        h.submit("a")
+        h.submit("b")
+        assert s.estimated_wait() == pytest.approx(s._service_time / 2)
+    finally:
+        h.drain()
@@ -0,0 +1,112 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+from core.rules import RulesState, record_choice
+from core.story import EventKind, EventLog
+from services import speculation
+from services.speculation import DMSpeculator
+
+OPTIONS = ["Attack the ogre", "Search the crypt", "Talk to the priest"]
+TOKENS = 10
+
+class StubDM:
+    """
+    Stands in for dm_turn_response; options listed in `hold` block until released.
+    """
+    def __init__(self, hold=()):
+        self.hold = set(hold)
+        self.release = threading.Event()
+        self.calls = []
+
+    def __call__(self, state, on_token=None):
+        self.calls.append(state["last_choice"])
+        if state["last_choice"] in self.hold:
+            self.release.wait(5)
+        return SimpleNamespace(response=f"DM answers: {state['last_choice']}", eval_count=TOKENS)
+
+@pytest.fixture
+def spec(monkeypatch):
+    """
+    Returns a factory: spec(workers, stub) -> (speculator, executor).
+    """
+    exes = []
+
+    def make(workers=len(OPTIONS), stub=None):
+        exe = ThreadPoolExecutor(max_workers=workers)
+        exes.append(exe)
+        monkeypatch.setattr(speculation, "_spec_exe", exe)
+        monkeypatch.setattr(speculation, "dm_turn_response", stub or StubDM())
+        monkeypatch.setattr(speculation.ollama_client, "is_idle", lambda: True)
+        return DMSpeculator(), exe
+
+    yield make
+    for exe in exes:
+        exe.shutdown(wait=True)
+
+def _state():
+    party = {"Player 1": SimpleNamespace(name="Brak", class_="Fighter", items=["rope"])}
+    story = EventLog()
+    story.append(1, "DM", EventKind.INTRO, "The crypt door creaks open.")
+    return {"turn": 1, "story": story, "rules": RulesState.for_party(party, seed=5)}
+
+def _choose(state, choice):
+    record_choice(state["story"], state["rules"], state["turn"], choice)
+    return choice
+
+def _settle(spec):
+    for fut in list(spec._branches.values()):
+        fut.result(5)
+
+def test_hit_serves_branch_and_wastes_the_rest(spec):
+    speculator, exe = spec()
+    state = _state()
+    assert speculator.start(state, OPTIONS)
+    _settle(speculator)
+    resp = speculator.commit(state, _choose(state, OPTIONS[1]))
+    assert resp.response == f"DM answers: {OPTIONS[1]}"
+    exe.shutdown(wait=True)
+    stats = speculator.stats
+    assert (stats.rounds, stats.hits, stats.misses) == (1, 1, 0)
+    assert stats.used_tokens == TOKENS
+    assert stats.wasted_tokens == TOKENS * (len(OPTIONS) - 1)
+
+def test_diverged_story_is_a_miss(spec):
+    speculator, exe = spec()
+    state = _state()
+    speculator.start(state, OPTIONS)
+    _settle(speculator)
+    choice = _choose(state, OPTIONS[0])
+    state["story"].append(1, "Player 2", EventKind.ACTION, "Ilse lights a torch.")
+    assert speculator.commit(state, choice) is None
+    exe.shutdown(wait=True)
+    stats = speculator.stats
+    assert (stats.hits, stats.misses, stats.used_tokens) == (0, 1, 0)
+    assert stats.wasted_tokens == TOKENS * len(OPTIONS)
+
+def test_unstarted_branch_is_cancelled(spec):
+    # one worker: the first branch is running, the others are still queued
+    stub = StubDM(hold=[OPTIONS[0]])
+    speculator, exe = spec(workers=1, stub=stub)
+    state = _state()
+    speculator.start(state, OPTIONS)
+    assert speculator.commit(state, _choose(state, OPTIONS[1])) is None
+    stub.release.set()
+    exe.shutdown(wait=True)
+    assert stub.calls == [OPTIONS[0]]
+    stats = speculator.stats
+    assert (stats.hits, stats.misses, stats.used_tokens) == (0, 1, 0)
+    # only the branch that was already running burned tokens
+    assert stats.wasted_tokens == TOKENS
+
+def test_busy_server_skips(spec, monkeypatch):
+    speculator, _ = spec()
+    monkeypatch.setattr(speculation.ollama_client, "is_idle", lambda: False)
+    state = _state()
+    assert not speculator.start(state, OPTIONS)
+    # nothing to commit: neither a hit nor a miss
+    assert speculator.commit(state, _choose(state, OPTIONS[0])) is None
+    stats = speculator.stats
+    assert (stats.rounds, stats.skipped, stats.hits, stats.misses) == (0, 1, 0, 0)
@@ -0,0 +1,59 @@
+import pytest
+
+from core.story import EventKind, EventLog
+
+def _log():
+    log = EventLog()
+    log.append(0, "DM", EventKind.INTRO, "The tavern is quiet.")
+    log.append(1, "Player", EventKind.CHOICE, "Order an ale")
+    log.append(1, "Ilse", EventKind.ACTION, "Ilse eyes the stranger — warily.")
+    log.append(1, "DM", EventKind.NARRATION, "The stranger smiles.", tokens=42)
+    return log
+
+def test_round_trip():
+    log = _log()
+    copy = EventLog.from_bytes(log.to_bytes())
+    assert copy == log
+    assert [copy.line(ev) for ev in copy] == [log.line(ev) for ev in log]
+    assert copy[3].tokens == 42
+    assert [ev.kind for ev in copy] == [ev.kind for ev in log]
+    assert copy.by_speaker("DM") and len(copy.for_turn(1)) == 3
+
+def test_empty_round_trip():
+    assert len(EventLog.from_bytes(EventLog().to_bytes())) == 0
+
+def test_tail_chunks_extend_to_the_same_log():
+    log = _log()
+    # journal style: a prefix, then only what was appended since
+    partial = EventLog.from_bytes(log.to_bytes())
+    log.append(2, "Player", EventKind.CHOICE, "Follow him")
+    log.append(2, "Bram", EventKind.ACTION, "Bram grabs his axe.")
+    partial.extend_bytes(log.to_bytes(4))
+    assert partial == log
+    assert partial.speaker(partial[5]) == "Bram"
+    assert partial.text(partial[4]) == "Follow him"
+
+def test_chunk_decodes_on_its_own():
+    log = _log()
+    tail = EventLog.from_bytes(log.to_bytes(2))
+    assert [tail.line(ev) for ev in tail] == [log.line(ev) for ev in log][2:]
+
+def test_extend_remaps_speakers_from_another_log():
+    other = EventLog()
+    other.append(5, "Bram", EventKind.ACTION, "Bram sings.")
+    log = _log()
+    log.extend_bytes(other.to_bytes())
+    assert log.speaker(log[-1]) == "Bram"
+    assert log.text(log[-1]) == "Bram sings."
+    assert [log.speaker(ev) for ev in log.by_speaker("DM")] == ["DM", "DM"]
+
+def test_rejects_foreign_bytes():
+    with pytest.raises(ValueError):
+        EventLog.from_bytes(b"NOPE" + bytes(6))
+
+def test_fork_is_independent():
+    log = _log()
+    branch = log.fork()
+    branch.append(2, "Player", EventKind.CHOICE, "Leave")
+    assert len(log) == 4 and len(branch) == 5
+    assert log.for_turn(2) == []
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from services.turn_service import TurnService
+
+@pytest.fixture
+def service():
+    svc = TurnService(max_workers=2)
+    yield svc
+    svc._exe.shutdown(wait=True)
+
+def _wait(job, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not job.finished and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert job.finished
+    return job
+
+def test_duplicate_submit_returns_same_job(service):
+    release = threading.Event()
+    calls = []
+
+    def work(n):
+        calls.append(n)
+        release.wait(5)
+        return n * 2
+
+    job = service.submit("s1", "turn:1", work, 21)
+    assert service.submit("s1", "turn:1", work, 21) is job
+    # a different key while the first is in flight also gets the running job
+    assert service.submit("s1", "options:1", work, 99) is job
+    release.set()
+    assert _wait(job).result == 42
+    # a rerun after it finished still returns the finished job, not new work
+    assert service.submit("s1", "turn:1", work, 21) is job
+    assert calls == [21]
+
+def test_new_key_after_finish_starts_new_job(service):
+    first = _wait(service.submit("s1", "turn:1", lambda: "a"))
+    second = service.submit("s1", "turn:2", lambda: "b")
+    assert second is not first
+    assert _wait(second).result == "b"
+    assert service.get("s1") is second
+
+def test_sessions_are_independent(service):
+    a = service.submit("s1", "turn:1", lambda: "a")
+    b = service.submit("s2", "turn:1", lambda: "b")
+    assert a is not b
+    assert (_wait(a).result, _wait(b).result) == ("a", "b")
+
+def test_streaming_collects_partial_output(service):
+    def stream(on_token):
+        for tok in ("The ", "door ", "opens."):
+            on_token(tok)
+        return "done"
+
+    job = _wait(service.submit("s1", "intro", stream, streaming=True))
+    assert job.partial == "The door opens." and job.result == "done"
+
+def test_failed_job_reports_error_and_clears(service):
+    def boom():
+        raise RuntimeError("model unavailable")
+
+    job = _wait(service.submit("s1", "turn:1", boom))
+    assert job.status == "error" and job.error == "model unavailable"
+    assert job.finished_at >= job.submitted_at
+    service.clear("s1")
+    assert service.get("s1") is None
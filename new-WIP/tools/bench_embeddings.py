@@ -0,0 +1,98 @@
+"""
+Check embedding backends against each other and measure their throughput.
+
+    python tools/bench_embeddings.py [--backends local,onnx,onnx-fp32] [--texts 512] [--min-cosine 0.99]
+
+Embeds a corpus (chunks from PDF_FOLDER, or synthetic sentences when there
+are none) with each backend and reports bulk throughput (EMBED_BATCH texts
+per call, as ingest does) and single-query latency, as retrieve does. The
+first backend is the reference: every other one is compared text by text
+by cosine similarity, and the run exits non-zero if any minimum is below
+--min-cosine, so it can gate a new ONNX export. `onnx-fp32` is the onnx
+backend with ONNX_QUANTIZED off.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+import numpy as np
+
+from core.embeddings import EmbeddingBackend, make_backend
+from core.pdf_utils import load_all_pdf_texts
+from core.settings import settings
+from corpus import corpus
+
+QUERY_SAMPLES = 64
+
+def _load(name: str) -> EmbeddingBackend:
+    if name == "onnx-fp32":
+        settings.onnx_quantized = False
+        try:
+            return make_backend("onnx")
+        finally:
+            settings.onnx_quantized = True
+    return make_backend(name)
+
+def _texts(n: int) -> List[str]:
+    texts = load_all_pdf_texts()[:n]
+    if len(texts) < n:
+        texts += corpus(random.Random(1234), n - len(texts))
+    return texts
+
+def _bulk(backend: EmbeddingBackend, texts: List[str]) -> np.ndarray:
+    out = []
+    for start in range(0, len(texts), settings.embed_batch):
+        out.append(backend.encode(texts[start:start + settings.embed_batch]))
+    return np.concatenate(out)
+
+def _cosines(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return (a * b).sum(axis=1)
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backends", default="local,onnx", help="comma-separated; the first is the reference")
+    ap.add_argument("--texts", type=int, default=512)
+    ap.add_argument("--min-cosine", type=float, default=0.99)
+    args = ap.parse_args()
+
+    texts = _texts(args.texts)
+    queries = [t[:200] for t in texts[:QUERY_SAMPLES]]
+    vectors: Dict[str, np.ndarray] = {}
+    print(f"{len(texts)} texts, batch {settings.embed_batch}, onnx threads {settings.onnx_threads or 'auto'}")
+    print(f"{'backend':<12}{'load':>8}{'bulk texts/s':>14}{'query p50':>11}{'query p95':>11}")
+    for name in args.backends.split(","):
+        t0 = time.perf_counter()
+        backend = _load(name)
+        load = time.perf_counter() - t0
+        backend.encode(queries[:4])     # warm-up
+        t0 = time.perf_counter()
+        vectors[name] = _bulk(backend, texts)
+        rate = len(texts) / (time.perf_counter() - t0)
+        lat = []
+        for q in queries:
+            t0 = time.perf_counter()
+            backend.encode([q])
+            lat.append(time.perf_counter() - t0)
+        p95 = statistics.quantiles(lat, n=20)[-1]
+        print(f"{name:<12}{load:7.1f}s{rate:14.1f}{statistics.median(lat) * 1e3:9.1f}ms{p95 * 1e3:9.1f}ms")
+
+    names = list(vectors)
+    failed = False
+    for name in names[1:]:
+        cos = _cosines(vectors[names[0]], vectors[name])
+        ok = cos.min() >= args.min_cosine
+        failed |= not ok
+        print(f"cosine {name} vs {names[0]}: min {cos.min():.4f} mean {cos.mean():.4f} {'ok' if ok else 'FAIL'}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Micro-benchmarks for the Python-side hot paths, with stored baselines.
+
+    python tools/bench_micro.py --save              # record tools/bench_baseline.json
+    python tools/bench_micro.py --compare           # exit 1 if anything is >25% slower, 2 if there is no baseline
+    python tools/bench_micro.py --compare --threshold 0.1 --filter retrieve
+
+Runs offline: the sentence-transformers model is swapped for a tiny hashing
+encoder, and build_index/retrieve work on a synthetic corpus in a temp dir,
+so numbers measure our code (splitting, parsing, HNSW, validation) rather
+than the embedding model. Baselines are per machine; record them on the box
+you compare on.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+from core import embeddings, utils
+from core.journal import SessionJournal, decode_state, encode_state
+from core.models import GameState
+from core.rules import RulesState
+from core.settings import settings
+from core.story import EventKind
+from services.rag_utils import Character, _extract_json
+from corpus import WORDS, corpus, sentences
+
+DEFAULT_BASELINE = Path(__file__).with_name("bench_baseline.json")
+
+class StubEncoder:
+    """
+    Deterministic bag-of-words hashing encoder with the SentenceTransformer
+    `encode` signature; cheap enough that it barely shows up in timings.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False, batch_size: int = 64) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in zip(out, texts):
+            for word in text.lower().split():
+                row[zlib.crc32(word.encode()) % self.dim] += 1.0
+            norm = np.linalg.norm(row)
+            if norm:
+                row /= norm
+        return out
+
+CHARACTER_JSON = json.dumps({
+    "name": "Elara Moonwhisper",
+    "race": "Elf",
+    "class": "Ranger",
+    "backstory": "Raised by wolves at the edge of the Greywood, she tracks the cult that burned her village.",
+    "items": ["longbow", "quiver of 20 arrows", "hunting knife", "wolf-fang amulet"],
+    "personality": "Quiet, watchful and fiercely loyal to those who earn her trust.",
+})
+
+LLM_REPLY = (
+    "Sure! Here is the character you asked for:\n```json\n"
+    + CHARACTER_JSON
+    + "\n```\nLet me know if you want another one {or a [different] class}."
+)
+
+Bench = Callable[[], object]
+
+def _setup(tmp: Path) -> Dict[str, Callable[[], Bench]]:
+    """
+    Map each benchmark name to a factory that prepares its state and returns
+    the callable to time. Index work is pointed at `tmp` so the real
+    vector_index_dir is never touched.
+    """
+    rng = random.Random(1234)
+    embeddings._backend = embeddings.LocalBackend(StubEncoder(embeddings.EMBED_DIM), name="stub")
+    settings.enable_rag = True
+    settings.pdf_folder = tmp / "pdf"
+    settings.vector_index_dir = tmp / "index"
+    settings.journal_dir = tmp / "journal"
+    settings.pdf_folder.mkdir()
+    settings.vector_index_dir.mkdir()
+    settings.journal_dir.mkdir()
+
+    pdf_texts: List[str] = []
+    utils.load_all_pdf_texts = lambda: pdf_texts
+    (settings.pdf_folder / "bench.pdf").touch()     # builds skip an empty PDF folder
+
+    def build(n: int) -> Bench:
+        docs = corpus(rng, n)
+
+        def run():
+            pdf_texts[:] = docs
+            for f in (utils.INDEX_FILE, utils.TEXTS_FILE):
+                (settings.vector_index_dir / f).unlink(missing_ok=True)
+            utils.build_index()
+        return run
+
+    def retrieve_at(n: int) -> Bench:
+        # the index is process-global, so each size builds it right before timing
+        build(n)()
+        queries = [" ".join(rng.choice(WORDS) for _ in range(5)) for _ in range(32)]
+        it = itertools.cycle(queries)
+        return lambda: utils.retrieve(next(it))
+
+    story = sentences(rng, 2_000)
+    state = GameState(
+        turn=200, phase="choice", intro_text=" ".join(sentences(rng, 10)),
+        current_options=["Fight", "Flee", "Parley"], last_choice="Fight",
+    )
+    for i, s in enumerate(story[:400]):
+        state.story.append(i // 2, "DM" if i % 2 else "Player", EventKind.NARRATION if i % 2 else EventKind.CHOICE, s)
+    batches = {n: sentences(rng, n) for n in (1, 16, 64, 256)}
+
+    hero = Character.model_validate_json(CHARACTER_JSON)
+    rules = RulesState.for_party({f"Player {i + 1}": hero for i in range(4)}, seed=1234)
+    state.rules = rules
+
+    long_story, short_story = " ".join(story), " ".join(story[:200])
+    dumped = json.dumps(encode_state(state))
+
+    # a 200-turn game journaled turn by turn, as GameRunner does
+    journal = SessionJournal("0" * 32)
+    played = GameState(current_options=list(state.current_options), rules=RulesState.from_dict(rules.to_dict()))
+    for i, s in enumerate(story[:400]):
+        played.story.append(i // 2, "DM" if i % 2 else "Player", EventKind.NARRATION if i % 2 else EventKind.CHOICE, s)
+        played.turn = i // 2
+        journal.commit(played)
+
+    benches: Dict[str, Callable[[], Bench]] = {
+        "last_sentences/200": lambda: lambda: utils.last_sentences(short_story, 5),
+        "last_sentences/2000": lambda: lambda: utils.last_sentences(long_story, 5),
+        "extract_json/fenced": lambda: lambda: _extract_json(LLM_REPLY),
+        "extract_json/bare": lambda: lambda: _extract_json(CHARACTER_JSON),
+        "character/validate": lambda: lambda: Character.model_validate_json(CHARACTER_JSON),
+        "gamestate/dump": lambda: lambda: json.dumps(encode_state(state)),
+        "gamestate/load": lambda: lambda: decode_state(json.loads(dumped)),
+        "journal/resume": lambda: lambda: SessionJournal(journal.session_id).load(),
+        "story/tail_text": lambda: lambda: utils.last_sentences(state.story.tail_text(5), 5),
+        "rules/resolve": lambda: lambda: rules.resolve("Attack the goblin chieftain"),
+        "rules/summary": lambda: lambda: rules.summary(),
+    }
+    for n, texts in batches.items():
+        benches[f"embed_texts/{n}"] = (lambda t: lambda: lambda: embeddings.embed_texts(t))(texts)
+    for n in (500, 5_000):
+        benches[f"build_index/{n}"] = (lambda n: lambda: build(n))(n)
+    for n in (1_000, 10_000, 50_000):
+        benches[f"retrieve/{n}"] = (lambda n: lambda: retrieve_at(n))(n)
+    return benches
+
+def measure(fn: Bench, repeat: int) -> float:
+    """
+    Best-of-`repeat` seconds per call; each repeat runs for at least ~0.2s.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def compare(results: Dict[str, float], baseline: Dict[str, float], threshold: float) -> List[Tuple[str, float]]:
+    return [
+        (name, secs / baseline[name] - 1)
+        for name, secs in results.items()
+        if name in baseline and secs > baseline[name] * (1 + threshold)
+    ]
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--save", action="store_true", help="write results as the new baseline")
+    ap.add_argument("--compare", action="store_true", help="fail if slower than baseline by more than --threshold")
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    ap.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    ap.add_argument("--repeat", type=int, default=5)
+    args = ap.parse_args()
+
+    baseline: Dict[str, float] = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+    elif args.compare and not args.save:
+        # baselines are per machine, so none ships with the repo; a gate with
+        # nothing to compare against must not pass silently
+        ap.error(f"no baseline at {args.baseline}; record one on this machine with --save, then --compare")
+
+    results: Dict[str, float] = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        benches = _setup(Path(tmp))
+        print(f"{'benchmark':<22}{'per call':>12}{'baseline':>12}{'change':>9}")
+        for name, make in benches.items():
+            if args.filter not in name:
+                continue
+            secs = results[name] = measure(make(), args.repeat)
+            base = baseline.get(name)
+            change = f"{secs / base - 1:+8.1%}" if base else ""
+            base_s = f"{base * 1e6:10.1f}us" if base else ""
+            print(f"{name:<22}{secs * 1e6:10.1f}us{base_s:>12}{change:>9}")
+
+    if args.save:
+        args.baseline.write_text(json.dumps({**baseline, **results}, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}")
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold)
+        for name, slower in regressions:
+            print(f"REGRESSION {name}: {slower:+.1%} (threshold {args.threshold:.0%})", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare batched party generation against one call per character.
+
+    python tools/bench_party.py --rounds 5 --size 4
+
+Reports wall time, LLM calls and how many duplicate names/classes each
+path produces. Runs against whatever OLLAMA_HOST/OLLAMA_MODEL point at.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+from services import rag_utils
+from services.rag_utils import (
+    generate_character_sync,
+    generate_party_batch_sync,
+    generation_stats,
+)
+
+def _duplicates(chars, attr: str) -> int:
+    values = [getattr(c, attr).strip().lower() for c in chars]
+    return len(values) - len(set(values))
+
+def run(label: str, make_party, rounds: int) -> None:
+    times, dup_names, dup_classes = [], 0, 0
+    before = sum(generation_stats[k] for k in ("character_calls", "party_batch_calls"))
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        chars = make_party()
+        times.append(time.perf_counter() - t0)
+        dup_names += _duplicates(chars, "name")
+        dup_classes += _duplicates(chars, "class_")
+    calls = sum(generation_stats[k] for k in ("character_calls", "party_batch_calls")) - before
+    print(
+        f"{label:<14} mean {statistics.mean(times):6.2f}s  "
+        f"median {statistics.median(times):6.2f}s  "
+        f"calls/party {calls / rounds:4.2f}  "
+        f"dup names {dup_names}  dup classes {dup_classes}"
+    )
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--size", type=int, default=4)
+    args = ap.parse_args()
+
+    print(f"model={rag_utils.settings.ollama_model} rounds={args.rounds} size={args.size}")
+    run("per-character", lambda: [generate_character_sync() for _ in range(args.size)], args.rounds)
+    run("batch", lambda: generate_party_batch_sync(args.size), args.rounds)
+    print(f"regenerated entries: {generation_stats['party_batch_regenerated']}")
+
+if __name__ == "__main__":
+    main()
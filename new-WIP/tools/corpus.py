@@ -0,0 +1,23 @@
+"""
+Synthetic fantasy text for the benchmarks and embedding checks, so they run
+without any PDFs. The same seed always gives the same texts.
+"""
+import random
+from typing import List
+
+WORDS = (
+    "dragon sword tavern goblin ranger spell shadow crypt torch rune ancient "
+    "forest bard potion arrow castle whisper storm king oath ruin mist"
+).split()
+
+def sentences(rng: random.Random, n: int) -> List[str]:
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 18))).capitalize() + rng.choice(".!?")
+        for _ in range(n)
+    ]
+
+def corpus(rng: random.Random, n: int) -> List[str]:
+    """
+    `n` chunk-sized texts of six sentences each.
+    """
+    return [" ".join(sentences(rng, 6)) for _ in range(n)]
@@ -0,0 +1,90 @@
+"""
+Export the local SentenceTransformer to ONNX for EMBEDDING_BACKEND=onnx.
+
+    python tools/export_onnx.py [--repo intfloat/e5-small] [--out models/onnx]
+
+Writes model.onnx (fp32), model_int8.onnx (dynamic int8 quantization of
+the weights), tokenizer.json and meta.json (pooling, normalization, max
+length, dimension) into --out, which is what ONNX_MODEL_DIR points at. Needs
+torch, sentence-transformers and onnx; the app itself then only needs
+onnxruntime. Check the result with tools/bench_embeddings.py.
+"""
+import argparse
+import json
+import os
+import sys
+from pathlib import Path
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+
+import torch
+from onnxruntime.quantization import QuantType, quantize_dynamic
+from sentence_transformers import SentenceTransformer
+
+from core.embeddings import LOCAL_REPOS, ONNX_INT8_MODEL, ONNX_META, ONNX_MODEL
+from core.settings import settings
+
+OPSET = 17
+
+def _pooling(model: SentenceTransformer) -> str:
+    for module in model:
+        if hasattr(module, "pooling_mode_cls_token"):
+            return "cls" if module.pooling_mode_cls_token else "mean"
+    return "mean"
+
+def _normalizes(model: SentenceTransformer) -> bool:
+    return any(type(module).__name__ == "Normalize" for module in model)
+
+def export(repo: str, out: Path) -> None:
+    model = SentenceTransformer(repo, device="cpu", local_files_only=True)
+    transformer = model[0].auto_model.eval()
+    tokenizer = model.tokenizer
+    out.mkdir(parents=True, exist_ok=True)
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    names = [n for n in ("input_ids", "attention_mask", "token_type_ids") if n in sample]
+    axes = {n: {0: "batch", 1: "seq"} for n in names}
+    axes["last_hidden_state"] = {0: "batch", 1: "seq"}
+
+    class Wrapper(torch.nn.Module):
+        # keyword inputs in a fixed order, only the token embeddings out
+        def __init__(self, inner):
+            super().__init__()
+            self.inner = inner
+
+        def forward(self, *args):
+            return self.inner(**dict(zip(names, args))).last_hidden_state
+
+    with torch.no_grad():
+        torch.onnx.export(
+            Wrapper(transformer), tuple(sample[n] for n in names), str(out / ONNX_MODEL),
+            input_names=names, output_names=["last_hidden_state"], dynamic_axes=axes, opset_version=OPSET,
+        )
+    quantize_dynamic(str(out / ONNX_MODEL), str(out / ONNX_INT8_MODEL), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(str(out))     # fast tokenizers write tokenizer.json
+    if not (out / "tokenizer.json").exists():
+        sys.exit(f"{repo} has no fast tokenizer; the onnx backend needs tokenizer.json")
+    meta = {
+        "name": repo,
+        "dim": model.get_sentence_embedding_dimension(),
+        "max_length": model.max_seq_length,
+        "pooling": _pooling(model),
+        "normalize": _normalizes(model),
+        "pad_id": tokenizer.pad_token_id or 0,
+        "pad_token": tokenizer.pad_token or "[PAD]",
+    }
+    (out / ONNX_META).write_text(json.dumps(meta, indent=2))
+    sizes = ", ".join(f"{p.name} {p.stat().st_size / 2**20:.0f} MB" for p in (out / ONNX_MODEL, out / ONNX_INT8_MODEL))
+    print(f"Exported {repo} to {out}: {sizes}")
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repo", default=LOCAL_REPOS[0])
+    ap.add_argument("--out", type=Path, default=settings.onnx_model_dir)
+    args = ap.parse_args()
+    export(args.repo, args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Stand-in Ollama server for load/latency testing without GPUs or models.
+
+    python tools/mock_ollama.py --port 11500 --ttft 0.3 --tps 40
+    python tools/mock_ollama.py --port 11500 --count 3 --fail-rate 0.05
+
+Implements /api/generate, /api/chat, /api/embed, /api/tags, /api/ps,
+/api/pull and /api/version, streaming (NDJSON) and non-streaming. Replies
+to structured prompts (a `format` schema, or a prompt asking for a
+character/party/options) with canned JSON, everything else with filler
+prose of `num_predict` tokens.
+
+Point the new app at it with OLLAMA_HOST=http://127.0.0.1:11500 (or
+OLLAMA_HOSTS=[...] for several), and the legacy app with
+OLLAMA_API_ENDPOINT=http://127.0.0.1:11500/api/generate.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import math
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+logger = logging.getLogger("mock_ollama")
+
+NAMES = ["Arwen", "Borin", "Cassia", "Dren", "Elowen", "Fargrim", "Gwyn", "Hale", "Isolde", "Jorah", "Kael", "Lyra"]
+RACES = ["Elf", "Dwarf", "Human", "Halfling", "Tiefling", "Gnome", "Half-Orc", "Dragonborn"]
+CLASSES = ["Wizard", "Fighter", "Rogue", "Cleric", "Ranger", "Bard", "Paladin", "Warlock"]
+OPTIONS = [
+    "Search the ruined chapel", "Follow the tracks into the woods", "Question the innkeeper",
+    "Climb the watchtower", "Cross the rope bridge", "Set up camp and rest",
+]
+FILLER = (
+    "The torchlight flickers across damp stone as the party presses deeper "
+    "into the ancient halls, where distant echoes hint at something stirring below."
+).split()
+
+@dataclass
+class MockConfig:
+    ttft: float = 0.2              # seconds before the first token
+    tps: float = 40.0              # generated tokens per second (0 = instant)
+    load_time: float = 0.0         # extra delay the first time a model is used
+    fail_rate: float = 0.0         # probability of a 500 on inference endpoints
+    embed_dim: int = 384
+    models: List[str] = field(default_factory=list)   # empty = accept any model
+    seed: Optional[int] = None
+
+# ——— Canned payloads ———————————————————————————————————
+
+def _character(rng: random.Random) -> Dict[str, Any]:
+    name = f"{rng.choice(NAMES)} {rng.randint(1, 999)}"
+    return {
+        "name": name,
+        "race": rng.choice(RACES),
+        "class": rng.choice(CLASSES),
+        "backstory": f"{name} left home after a prophecy spoke of a lost relic.",
+        "items": rng.sample(["longsword", "spellbook", "rope", "lantern", "dagger", "healing potion"], 3),
+        "personality": rng.choice(["brave", "curious", "sly", "stoic", "cheerful"]),
+    }
+
+def canned_response(prompt: str, fmt: Any, rng: random.Random, num_predict: int) -> str:
+    schema = fmt if isinstance(fmt, dict) else {}
+    lowered = prompt.lower()
+    if schema.get("type") == "array" or (not schema and "options" in lowered and "json" in lowered):
+        return json.dumps(rng.sample(OPTIONS, 3))
+    if "digests" in schema.get("properties", {}):
+        n = schema["properties"]["digests"].get("maxItems", 1)
+        return json.dumps({"digests": [
+            {"summary": " ".join(rng.sample(FILLER, min(12, len(FILLER)))) + ".", "entities": rng.sample(NAMES, 2)}
+            for _ in range(n)
+        ]})
+    if "characters" in schema.get("properties", {}) or (not schema and "party of" in lowered):
+        n = schema.get("properties", {}).get("characters", {}).get("maxItems", 4)
+        return json.dumps({"characters": [_character(rng) for _ in range(n)]})
+    if "name" in schema.get("properties", {}) or (not schema and "character" in lowered and "json" in lowered):
+        return json.dumps(_character(rng))
+    words = itertools.islice(itertools.cycle(FILLER), max(1, num_predict))
+    return " ".join(words)
+
+def _tokens(text: str) -> List[str]:
+    # ~one token per word; keep the separators so the stream concatenates back
+    parts = text.split(" ")
+    return [p + (" " if i < len(parts) - 1 else "") for i, p in enumerate(parts)]
+
+def _embedding(text: str, dim: int) -> List[float]:
+    seed = int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+    rng = random.Random(seed)
+    vec = [rng.gauss(0, 1) for _ in range(dim)]
+    norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+    return [v / norm for v in vec]
+
+# ——— Server ————————————————————————————————————————————
+
+class MockOllamaServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, config: MockConfig):
+        super().__init__(addr, _Handler)
+        self.config = config
+        self.loaded: Set[str] = set()
+        self.lock = threading.Lock()
+        self.rng = random.Random(config.seed)
+        self.requests = 0
+
+    def handle_error(self, request, client_address):
+        # clients hang up mid-stream on purpose (early JSON stop); not an error
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MockOllamaServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        logger.debug(format, *args)
+
+    # ——— plumbing ———
+
+    def _body(self) -> Dict[str, Any]:
+        n = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(n) or b"{}")
+
+    def _json(self, payload: Dict[str, Any], status: int = 200) -> None:
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _ndjson(self, parts: Iterator[Dict[str, Any]]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for part in parts:
+                line = json.dumps(part).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # client hung up early (e.g. JSON complete) — stop generating
+
+    def _check_model(self, model: str) -> bool:
+        cfg = self.server.config
+        if cfg.models and model not in cfg.models:
+            self._json({"error": f"model '{model}' not found"}, 404)
+            return False
+        if cfg.fail_rate and self.server.rng.random() < cfg.fail_rate:
+            self._json({"error": "injected failure"}, 500)
+            return False
+        return True
+
+    def _load(self, model: str) -> float:
+        with self.server.lock:
+            first = model not in self.server.loaded
+            self.server.loaded.add(model)
+        if first and self.server.config.load_time:
+            time.sleep(self.server.config.load_time)
+            return self.server.config.load_time
+        return 0.0
+
+    # ——— routes ———
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            names = self.server.config.models or sorted(self.server.loaded) or ["mock"]
+            self._json({"models": [{"name": m, "model": m, "size": 0} for m in names]})
+        elif self.path == "/api/ps":
+            self._json({"models": [{"name": m, "model": m, "size": 0} for m in sorted(self.server.loaded)]})
+        elif self.path == "/api/version":
+            self._json({"version": "0.0.0-mock"})
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def do_HEAD(self):
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        self.server.requests += 1
+        req = self._body()
+        if self.path in ("/api/generate", "/api/chat"):
+            self._inference(req, chat=self.path == "/api/chat")
+        elif self.path in ("/api/embed", "/api/embeddings"):
+            if not self._check_model(req.get("model", "")):
+                return
+            inputs = req.get("input", req.get("prompt", ""))
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dim = self.server.config.embed_dim
+            self._json({"model": req.get("model"), "embeddings": [_embedding(t, dim) for t in inputs]})
+        elif self.path == "/api/pull":
+            self._pull(req)
+        else:
+            self._json({"error": "not found"}, 404)
+
+    def _inference(self, req: Dict[str, Any], chat: bool) -> None:
+        model = req.get("model", "")
+        if not self._check_model(model):
+            return
+        cfg = self.server.config
+        t0 = time.perf_counter()
+        load = self._load(model)
+        if chat:
+            prompt = "\n".join(m.get("content", "") for m in req.get("messages", []))
+        else:
+            prompt = req.get("prompt") or ""
+        num_predict = (req.get("options") or {}).get("num_predict") or 128
+        if not prompt:
+            text = ""   # pre-warm: load only
+        else:
+            with self.server.lock:
+                text = canned_response(prompt, req.get("format"), self.server.rng, num_predict)
+        tokens = _tokens(text) if text else []
+        prompt_tokens = max(1, len(prompt.split()))
+
+        def frame(piece: str, done: bool, **extra) -> Dict[str, Any]:
+            base = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "done": done}
+            if chat:
+                base["message"] = {"role": "assistant", "content": piece}
+            else:
+                base["response"] = piece
+            base.update(extra)
+            return base
+
+        def final_stats(eval_dur: float) -> Dict[str, Any]:
+            return dict(
+                done_reason="stop",
+                total_duration=int((time.perf_counter() - t0) * 1e9),
+                load_duration=int(load * 1e9),
+                prompt_eval_count=prompt_tokens,
+                prompt_eval_duration=int(cfg.ttft * 1e9),
+                eval_count=len(tokens),
+                eval_duration=int(eval_dur * 1e9),
+            )
+
+        delay = 1.0 / cfg.tps if cfg.tps else 0.0
+        if tokens:
+            time.sleep(cfg.ttft)
+        if req.get("stream", True):
+            def parts():
+                start = time.perf_counter()
+                for i, tok in enumerate(tokens):
+                    if i and delay:
+                        time.sleep(delay)
+                    yield frame(tok, False)
+                yield frame("", True, **final_stats(time.perf_counter() - start))
+            self._ndjson(parts())
+        else:
+            time.sleep(delay * max(0, len(tokens) - 1))
+            self._json(frame(text, True, **final_stats(delay * len(tokens))))
+
+    def _pull(self, req: Dict[str, Any]) -> None:
+        model = req.get("model") or req.get("name") or ""
+        total = 1000
+
+        def parts():
+            yield {"status": "pulling manifest"}
+            for done in range(0, total + 1, 250):
+                time.sleep(0.05)
+                yield {"status": "downloading", "digest": "sha256:mock", "total": total, "completed": done}
+            if self.server.config.models and model not in self.server.config.models:
+                self.server.config.models.append(model)
+            yield {"status": "success"}
+
+        if req.get("stream", True):
+            self._ndjson(parts())
+        else:
+            for _ in parts():
+                pass
+            self._json({"status": "success"})
+
+def start_mock(port: int = 0, host: str = "127.0.0.1", config: Optional[MockConfig] = None) -> MockOllamaServer:
+    """
+    Start a mock server on a daemon thread; port 0 picks a free port.
+    """
+    server = MockOllamaServer((host, port), config or MockConfig())
+    threading.Thread(target=server.serve_forever, name=f"mock-ollama-{server.server_address[1]}", daemon=True).start()
+    return server
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11500)
+    ap.add_argument("--count", type=int, default=1, help="start N servers on consecutive ports")
+    ap.add_argument("--ttft", type=float, default=0.2)
+    ap.add_argument("--tps", type=float, default=40.0)
+    ap.add_argument("--load-time", type=float, default=0.0)
+    ap.add_argument("--fail-rate", type=float, default=0.0)
+    ap.add_argument("--embed-dim", type=int, default=384)
+    ap.add_argument("--models", nargs="*", default=[], help="only these models exist (others 404 until pulled)")
+    ap.add_argument("--seed", type=int)
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    servers = []
+    for i in range(args.count):
+        cfg = MockConfig(
+            ttft=args.ttft, tps=args.tps, load_time=args.load_time, fail_rate=args.fail_rate,
+            embed_dim=args.embed_dim, models=list(args.models), seed=args.seed,
+        )
+        servers.append(start_mock(args.port + i, args.host, cfg))
+    urls = [s.url for s in servers]
+    logger.info("Mock Ollama listening on %s", ", ".join(urls))
+    if len(urls) > 1:
+        logger.info("OLLAMA_HOSTS=%s", json.dumps(urls))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
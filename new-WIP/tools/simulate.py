@@ -0,0 +1,170 @@
+"""
+Headless game simulator for throughput benchmarking and capacity planning.
+
+    python tools/simulate.py --games 8 --turns 5 --mock
+    python tools/simulate.py --games 4 --concurrency 2 --choice random
+
+Runs N full games (party, intro, then options → choice → DM turn up to the
+turn limit) concurrently through GameRunner, without Streamlit. Reports
+games/hour, per-phase latency percentiles, tokens consumed and peak RSS.
+Without --mock it uses whatever OLLAMA_HOST/OLLAMA_HOSTS point at.
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List
+
+# ensure project root
+sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from core.settings import settings
+
+PHASES = ("new_party", "start_adventure", "request_options", "play_turn")
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    def timed(self, phase: str, fn, *args):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            with self._lock:
+                self.latencies[phase].append(time.perf_counter() - t0)
+
+def play_game(game_id: int, turns: int, choose, rec: Recorder) -> int:
+    from services.game_runner import GameRunner
+    from services.ollama_client import Priority, request_context
+
+    with request_context(Priority.INTERACTIVE, f"sim-{game_id}"):
+        runner = GameRunner()
+        rec.timed("new_party", runner.new_party)
+        rec.timed("start_adventure", runner.start_adventure)
+        for turn in range(turns):
+            rec.timed("request_options", runner.request_options)
+            idx = choose(game_id, turn, runner.state.current_options)
+            rec.timed("play_turn", runner.play_turn, idx)
+    return turns
+
+def make_chooser(mode: str, script: List[int], seed: int):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def choose(game_id: int, turn: int, options: List[str]) -> int:
+        if mode == "first":
+            return 0
+        if mode == "script":
+            return script[turn % len(script)] % len(options)
+        with lock:
+            return rng.randrange(len(options))
+    return choose
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--games", type=int, default=4)
+    ap.add_argument("--concurrency", type=int, default=0, help="games in parallel (default: all)")
+    ap.add_argument("--turns", type=int, default=settings.turn_limit)
+    ap.add_argument("--choice", choices=("first", "random", "script"), default="random")
+    ap.add_argument("--script", default="0,1,2", help="comma-separated option indexes for --choice script")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--no-rag", action="store_true", help="disable lore retrieval")
+    ap.add_argument("--mock", action="store_true", help="run against in-process mock Ollama server(s)")
+    ap.add_argument("--mock-hosts", type=int, default=1)
+    ap.add_argument("--mock-ttft", type=float, default=0.2)
+    ap.add_argument("--mock-tps", type=float, default=40.0)
+    ap.add_argument("--mock-fail-rate", type=float, default=0.0)
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args()
+
+    if args.no_rag:
+        settings.enable_rag = False
+    if args.mock:
+        from mock_ollama import MockConfig, start_mock
+        servers = [
+            start_mock(config=MockConfig(
+                ttft=args.mock_ttft, tps=args.mock_tps, fail_rate=args.mock_fail_rate, seed=args.seed + i,
+            ))
+            for i in range(args.mock_hosts)
+        ]
+        # must be set before services.ollama_client builds its host pool
+        settings.ollama_hosts = [s.url for s in servers]
+
+    from core.metrics import registry
+    from services.residency import residency
+
+    residency.start()
+    rec = Recorder()
+    choose = make_chooser(args.choice, [int(x) for x in args.script.split(",")], args.seed)
+    workers = args.concurrency or args.games
+    done = failed = 0
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sim") as exe:
+        futures = [exe.submit(play_game, g, args.turns, choose, rec) for g in range(args.games)]
+        for fut in as_completed(futures):
+            try:
+                fut.result()
+                done += 1
+            except Exception as e:
+                failed += 1
+                print(f"game failed: {e!r}", file=sys.stderr)
+    elapsed = time.perf_counter() - t0
+
+    tokens = registry.counter("llm_tokens_total")
+    report = {
+        "games": args.games,
+        "completed": done,
+        "failed": failed,
+        "turns_per_game": args.turns,
+        "concurrency": workers,
+        "elapsed_s": round(elapsed, 2),
+        "games_per_hour": round(done / elapsed * 3600, 1) if elapsed else 0.0,
+        "tokens": {
+            "prompt": int(tokens.total(kind="prompt")),
+            "eval": int(tokens.total(kind="eval")),
+        },
+        # ru_maxrss is KiB on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "phases": {
+            phase: {
+                "n": len(vals),
+                "mean": round(statistics.mean(vals), 3),
+                "p50": round(percentile(vals, 50), 3),
+                "p90": round(percentile(vals, 90), 3),
+                "p99": round(percentile(vals, 99), 3),
+            }
+            for phase in PHASES
+            if (vals := rec.latencies.get(phase))
+        },
+    }
+
+    print(f"{done}/{args.games} games in {elapsed:.1f}s → {report['games_per_hour']} games/hour "
+          f"(concurrency {workers}, {args.turns} turns)")
+    print(f"tokens: {report['tokens']['prompt']} prompt, {report['tokens']['eval']} eval; "
+          f"peak RSS {report['peak_rss_mb']} MB")
+    print(f"{'phase':<16}{'n':>5}{'mean':>8}{'p50':>8}{'p90':>8}{'p99':>8}")
+    for phase, st in report["phases"].items():
+        print(f"{phase:<16}{st['n']:>5}{st['mean']:>8.2f}{st['p50']:>8.2f}{st['p90']:>8.2f}{st['p99']:>8.2f}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
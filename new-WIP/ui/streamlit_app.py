@@ -1,5 +1,4 @@
-import os, sys, logging
-import torch; torch.classes.__path__ = []    # avoid Streamlit watcher errors
+import os, sys, logging, time, uuid
 import streamlit as st
 from requests.exceptions import ConnectionError
 from ollama._types import ResponseError
@@ -7,89 +6,179 @@ from ollama._types import ResponseError
 # ensure project root
 sys.path.append(os.path.abspath(os.path.join(__file__, "..", "..")))
 
+from core.metrics import registry, start_metrics_server, timer
+from core.digests import digest_store
+from core.journal import valid_session_id
 from core.settings import settings
+if settings.embedding_backend == "local":
+    import torch; torch.classes.__path__ = []    # avoid Streamlit watcher errors
+from core.story import EventKind
 from core.utils import last_sentences
+from services.digester import lore_digester
 from services.game_runner import GameRunner
+from services.ingest import ingest_service
 from services.ollama_client import ollama_client
-from core.utils import build_index
-from core.pdf_utils import load_all_pdf_texts
+from services.residency import model_for, residency
+from services.sessions import sessions
+from services.turn_service import turn_service
 
 logger = logging.getLogger(__name__)
 st.set_page_config(page_title="TD-LLM-DND", layout="wide")
 
-def display_party(party):
+LOG_RENDER_SECONDS = registry.histogram("ui_log_render_seconds", "Adventure log render time per rerun")
+LOG_EVENTS_RENDERED = registry.counter("ui_log_events_rendered_total", "Adventure log entries rendered")
+
+def display_party(party, rules):
     st.subheader("🧙‍♂️ Party Sheet")
     cols = st.columns(len(party))
     for col, (name, char) in zip(cols, party.items()):
+        sheet = rules.sheets.get(name)
         with col.expander(name, expanded=False):
-            data = char.model_dump()
+            data = char.model_dump(by_alias=True)
             st.write(f"**Race:** {data['race']}  ")
             st.write(f"**Class:** {data['class']}  ")
+            if sheet:
+                st.write(f"**HP:** {sheet.hp}/{sheet.max_hp}  **AC:** {sheet.ac}")
+                st.caption("  ".join(f"{a.upper()} {v}" for a, v in sheet.abilities.items()))
             st.write("**Items:**")
-            for it in data["items"]:
+            for it in (sheet.inventory if sheet else data["items"]):
                 st.write(f"- {it}")
             st.write("**Backstory (snippet):**")
             st.write(data["backstory"][:200] + "...")
 
-def display_log(story):
+@st.fragment
+def display_log(session_id):
+    """
+    Render the last `log_window_turns` turns; older turns load a window at a
+    time on demand. Runs as a fragment, so paging doesn't rerun the page.
+    """
+    story = sessions.get(session_id).state.story
+    last = story.last()
+    if last is None:
+        return
     st.subheader("📜 Adventure Log")
-    for i, line in enumerate(story, start=1):
-        who, text = line.split(":", 1)
-        icon = "🧙‍♂️" if who.strip()=="DM" else "🎲"
-        with st.expander(f"Turn {i} - {icon}"):
-            st.markdown(f"**{who}:** {text.strip()}")
+    window = settings.log_window_turns
+    pages = st.session_state.setdefault("log_pages", 1)
+    first = max(1, last.turn - pages * window + 1)
+    if first > 1 and st.button(f"Show earlier turns ({first - 1} hidden)"):
+        st.session_state.log_pages += 1
+        st.rerun(scope="fragment")
+    with timer(LOG_RENDER_SECONDS):
+        rendered = 0
+        for turn in range(first, last.turn + 1):
+            for ev in story.for_turn(turn):
+                who = story.speaker(ev)
+                icon = "🧙‍♂️" if who == "DM" else "📏" if ev.kind == EventKind.RULES else "🎲"
+                with st.expander(f"Turn {ev.turn} - {icon}"):
+                    st.markdown(f"**{who}:** {story.text(ev)}")
+                rendered += 1
+    LOG_EVENTS_RENDERED.inc(rendered)
+
+JOB_LABELS = {
+    "party": "Summoning brave adventurers...",
+    "intro": "Preparing an epic quest...",
+    "options": "Weighing your options...",
+    "turn": "The dice are rolling...",
+}
+
+@st.fragment(run_every=1.0)
+def job_progress(session_id):
+    job = turn_service.get(session_id)
+    if job is None or job.finished:
+        st.rerun()
+    st.info(JOB_LABELS.get(job.key.split(":")[0], "Working..."))
+    if job.partial:
+        st.markdown(job.partial)
+
+@st.fragment(run_every=1.0)
+def ingest_progress():
+    for job in ingest_service.jobs()[-3:]:
+        if not job.finished:
+            st.progress(job.progress, text=f"Indexing {len(job.files)} PDF(s): {job.stage}")
+            if st.button("Cancel", key=f"cancel_{job.id}"):
+                ingest_service.cancel(job.id)
+        elif job.status == "done" and time.time() - (job.finished_at or 0) < 10:
+            st.success(f"Indexed {', '.join(job.files)}")
+        elif job.status == "error":
+            st.error(f"Indexing failed: {job.error}")
 
 def main():
+    residency.start()
+    lore_digester.start()
+    start_metrics_server(settings.metrics_port)
     st.sidebar.title("TD-LLM-DND Settings")
-    st.sidebar.write(f"- **Ollama Host:** `{settings.ollama_host}`")
-    st.sidebar.write(f"- **Model:** `{settings.ollama_model}`")
+    hosts = ", ".join(f"`{h.url}`" + ("" if h.healthy else " (down)") for h in ollama_client.hosts)
+    st.sidebar.write(f"- **Ollama Hosts:** {hosts}")
+    st.sidebar.write(f"- **DM Model:** `{model_for('dm')}`")
+    st.sidebar.write(f"- **Player Model:** `{model_for('player')}`")
+    for job in ollama_client.pulls.values():
+        if job.status == "pulling":
+            st.sidebar.progress(job.progress, text=f"Pulling {job.model} on {job.host}")
     st.sidebar.write(f"- **Turn Limit:** {settings.turn_limit}")
     st.sidebar.write(f"- **RAG:** {settings.enable_rag}")
+    if settings.enable_lore_digests:
+        st.sidebar.write(f"- **Lore Digests:** {len(digest_store)} ({lore_digester.pending()} pending)")
+
+    st.sidebar.write(f"- **Live Sessions:** {len(sessions)}")
 
-    # RAG PDF upload
+    # RAG PDF upload; files stay in the uploader across reruns, so only ones
+    # this session hasn't handed over yet are hashed and queued
     up = st.sidebar.file_uploader("Upload PDFs for lore", accept_multiple_files=True, type="pdf")
-    if up:
-        for f in up:
-            dst = settings.pdf_folder / f.name
-            dst.write_bytes(f.getbuffer())
-        build_index()
-        st.sidebar.success("PDF index rebuilt!")
-
-    # init runner
-    if "runner" not in st.session_state:
-        st.session_state.runner = GameRunner()
-    runner: GameRunner = st.session_state.runner
+    seen = st.session_state.setdefault("uploaded_ids", set())
+    new = [f for f in up or [] if f.file_id not in seen]
+    if new:
+        ingest_service.submit([(f.name, f.getvalue()) for f in new])
+        seen.update(f.file_id for f in new)
+    with st.sidebar:
+        ingest_progress()
+
+    # the session id lives in the URL so a reload or a new pod picks the
+    # campaign back up; runners are shared process-wide and may be evicted
+    # to the journal between reruns
+    if "session_id" not in st.session_state:
+        # the id names the journal file, so anything but our own uuid4 hex is replaced
+        session_id = st.query_params.get("session", "")
+        st.session_state.session_id = session_id if valid_session_id(session_id) else uuid.uuid4().hex
+        st.query_params["session"] = st.session_state.session_id
+    session_id = st.session_state.session_id
+    runner: GameRunner = sessions.get(session_id)
     gs = runner.state
 
     st.title("🗡️ TD-LLM-DND Adventure")
 
+    # LLM work runs in the turn service; poll it instead of blocking the script
+    job = turn_service.get(session_id)
+    if job and not job.finished:
+        job_progress(session_id)
+        return
+    if job and job.status == "error":
+        st.error(job.error)
+        turn_service.clear(session_id)
+
     # Phase: start → new party
-    if gs.phase == "start":
+    if gs.phase == "start" and not runner.party:
         if st.button("Generate Party"):
-            try:
-                runner.new_party()
-            except Exception as e:
-                st.error(e)
+            turn_service.submit(session_id, "party", runner.new_party)
+            st.rerun()
         return  # re-render
 
     # Show party once generated
     if runner.party:
-        display_party(runner.party)
+        display_party(runner.party, gs.rules)
 
     # Phase: ready to start
     if gs.phase == "start" and runner.party:
         if st.button("🐉 Start Adventure"):
-            try:
-                runner.start_adventure()
-            except Exception as e:
-                st.error(e)
+            turn_service.submit(session_id, "intro", runner.start_adventure, streaming=True)
+            st.rerun()
         return
 
     # Phase: intro text
     if gs.phase == "intro":
         st.markdown(f"**Intro:** {gs.intro_text}")
         if st.button("▶️ Continue"):
-            runner.request_options()
+            turn_service.submit(session_id, f"options:{gs.turn}", runner.request_options)
+            st.rerun()
         return
 
     # Phase: choice
@@ -99,21 +188,21 @@ def main():
             choice = st.radio("What will you do?", opts, key=f"choice_{gs.turn}")
             submit = st.form_submit_button("Submit Choice")
         if submit:
-            runner.process_player_choice(opts.index(choice))
-            runner.run_dm_turn()
+            turn_service.submit(session_id, f"turn:{gs.turn}", runner.play_turn, opts.index(choice), streaming=True)
+            st.rerun()
         return
 
     # Phase: DM response shown (and loop back to options)
     if gs.phase == "dm_response":
-        last = gs.story[-1]
-        who, txt = last.split(":",1)
-        st.markdown(f"**{who.strip()}:** {txt.strip()}")
+        last = gs.story.last()
+        st.markdown(f"**{gs.story.speaker(last)}:** {gs.story.text(last)}")
         if st.button("▶️ Next Turn"):
-            runner.request_options()
+            turn_service.submit(session_id, f"options:{gs.turn}", runner.request_options)
+            st.rerun()
         # fall through to log
 
     # Always show log at end
-    display_log(gs.story)
+    display_log(session_id)
 
 if __name__ == "__main__":
     main()